@@ -6,12 +6,117 @@
 #
 # Distributed under terms of the GPL license.
 
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
 from accounts.models import Token, User
+from superlists import metrics
+
+class UserCache:
+    """Cache LRU de usuarios por email, con expiracion. Hay una por proceso
+    (ver 'get_user_cache') y evita consultar la base de datos en cada peticion
+    autenticada.
+
+    Args:
+        maxsize: cantidad maxima de usuarios guardados
+        ttl: segundos que un usuario permanece en la cache
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(email, None)
+                self.misses += 1
+                user = None
+            else:
+                self._entries.move_to_end(email)
+                self.hits += 1
+                user = entry[0]
+        metrics.inc(
+            'user_cache_requests_total', result='miss' if user is None else 'hit'
+        )
+        return user
+
+    def set(self, email, user):
+        with self._lock:
+            self._entries[email] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+def get_user_cache():
+    """Entrega la cache de usuarios del proceso. Se crea al usarla por
+    primera vez, con los valores de USER_CACHE_SIZE y USER_CACHE_TTL de ese
+    momento.
+    """
+    global _user_cache
+    with _user_cache_lock:
+        if _user_cache is None:
+            _user_cache = UserCache(
+                maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL
+            )
+        return _user_cache
+
+def reset_user_cache():
+    """Descarta la cache de usuarios; la siguiente se crea vacia"""
+    global _user_cache
+    with _user_cache_lock:
+        _user_cache = None
+
+@receiver(setting_changed)
+def _user_cache_setting_changed(setting, **kwargs):
+    if setting in ('USER_CACHE_SIZE', 'USER_CACHE_TTL'):
+        reset_user_cache()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidate_cached_user(instance, **kwargs):
+    # La cache no debe entregar un usuario que cambio o que ya no existe
+    get_user_cache().invalidate(instance.email)
 
 class PasswordlessAuthenticationBackend:
     def authenticate(self, uid):
         try:
-            token = Token.objects.get(uid=uid)
+            token = Token.objects.get(
+                uid=uid, used=False, created__gte=Token.expiry_cutoff()
+            )
+            # Solo la primera peticion que marca el token como usado inicia
+            # sesion, aunque lleguen varias con el mismo token a la vez.
+            if not Token.objects.filter(pk=token.pk, used=False).update(used=True):
+                return None
             return User.objects.get(email=token.email)
         except Token.DoesNotExist:
             return None
@@ -19,7 +124,13 @@ class PasswordlessAuthenticationBackend:
             return User.objects.create(email=token.email)
 
     def get_user(self, email):
+        user_cache = get_user_cache()
+        user = user_cache.get(email)
+        if user is not None:
+            return user
         try:
-            return User.objects.get(email=email)
+            user = User.objects.get(email=email)
         except User.DoesNotExist:
             return None
+        user_cache.set(email, user)
+        return user
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Token
+
+
+class Command(BaseCommand):
+    help = 'Elimina los tokens de login usados o expirados, en lotes pequeños'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Cantidad maxima de tokens eliminados por transaccion',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Segundos de espera entre lotes',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        deleted = 0
+        for tokens in Token.stale():
+            while True:
+                # Cada lote es un DELETE corto por clave primaria, para no
+                # tomar locks sobre la tabla completa.
+                pks = list(tokens.values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                Token.objects.filter(pk__in=pks).delete()
+                deleted += len(pks)
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+        self.stdout.write('Deleted %d tokens' % deleted)
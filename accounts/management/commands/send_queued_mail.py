@@ -0,0 +1,44 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import send_queued
+
+
+class Command(BaseCommand):
+    help = 'Envia los emails encolados usando una sola conexion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Cantidad maxima de emails enviados por lote',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='No terminar: seguir revisando la cola cada --interval segundos',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Segundos de espera cuando la cola esta vacia (con --loop)',
+        )
+
+    def handle(self, *args, **options):
+        # Una sola conexion para todos los lotes; 'send_queued' la vuelve a
+        # abrir si el servidor la cierra
+        connection = get_connection()
+        try:
+            while True:
+                sent, failed = send_queued(
+                    batch_size=options['batch_size'], connection=connection
+                )
+                if sent or failed:
+                    self.stdout.write(
+                        'Sent %d emails, %d failed' % (sent, failed)
+                    )
+                if not options['loop']:
+                    break
+                if sent + failed < options['batch_size']:
+                    time.sleep(options['interval'])
+        finally:
+            connection.close()
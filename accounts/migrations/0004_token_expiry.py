@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 09:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import datetime
+import django.utils.timezone
+import uuid
+
+
+def expire_existing_tokens(apps, schema_editor):
+    # Los tokens anteriores no tienen fecha de creacion: el default les
+    # daria la de la migracion y volverian a servir por LOGIN_TOKEN_TTL
+    Token = apps.get_model('accounts', 'Token')
+    Token.objects.using(schema_editor.connection.alias).update(
+        created=datetime.datetime(1970, 1, 1, tzinfo=django.utils.timezone.utc)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_auto_20180404_1808'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(expire_existing_tokens, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='token',
+            name='used',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='token',
+            name='uid',
+            field=models.CharField(default=uuid.uuid4, max_length=40, unique=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 09:53
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_queuedemail_claimed_by'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='token',
+            name='used',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.db import models
 from django.contrib import auth
+from django.utils import timezone
+import datetime
 import uuid
 
 auth.signals.user_logged_in.disconnect(auth.models.update_last_login)
@@ -14,4 +17,64 @@ class User(models.Model):
 
 class Token(models.Model):
     email = models.EmailField()
-    uid = models.CharField(default=uuid.uuid4, max_length=40)
+    uid = models.CharField(default=uuid.uuid4, max_length=40, unique=True)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    used = models.BooleanField(default=False, db_index=True)
+
+    @staticmethod
+    def expiry_cutoff():
+        """Fecha de creacion a partir de la cual un token sigue vigente"""
+        return timezone.now() - datetime.timedelta(
+            seconds=settings.LOGIN_TOKEN_TTL
+        )
+
+    @staticmethod
+    def stale():
+        """Tokens que ya no sirven para iniciar sesion, como dos consultas
+        que usan cada una su indice (un OR de ambas condiciones recorreria
+        la tabla completa).
+
+        Returns:
+            Una tupla (usados, expirados) de QuerySets de 'Token'.
+        """
+        return (
+            Token.objects.filter(used=True),
+            Token.objects.filter(created__lt=Token.expiry_cutoff()),
+        )
+
+class QueuedEmail(models.Model):
+    """Email pendiente de envio. Las vistas solo encolan; el comando
+    'send_queued_mail' los envia fuera del ciclo de la peticion.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.EmailField()
+    to = models.EmailField()
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(default=timezone.now)
+    # Envio que tomo el email (ver accounts.outbox.claim_batch)
+    claimed_by = models.CharField(
+        max_length=32, blank=True, default='', db_index=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt'],
+                name='accounts_qe_status_next',
+            ),
+        ]
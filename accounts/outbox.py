@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Cola de salida de emails. Las vistas encolan con 'enqueue_mail' y el
+# comando 'send_queued_mail' los envia en lotes usando una sola conexion.
+
+import datetime
+import smtplib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from accounts.models import QueuedEmail
+from superlists import metrics
+
+def enqueue_mail(subject, message, from_email, recipient_list):
+    """Encola un email por destinatario. Recibe los mismos argumentos
+    posicionales que 'django.core.mail.send_mail'.
+    """
+    QueuedEmail.objects.bulk_create([
+        QueuedEmail(subject=subject, body=message, from_email=from_email, to=to)
+        for to in recipient_list
+    ])
+
+def retry_delay(attempts):
+    """Espera antes del siguiente intento: crece exponencialmente con la
+    cantidad de intentos fallidos.
+    """
+    return datetime.timedelta(
+        seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+def claim_batch(batch_size):
+    """Reserva hasta 'batch_size' emails pendientes para este envio, con un
+    solo UPDATE: dos envios simultaneos nunca toman el mismo email. La
+    reserva mueve 'next_attempt' EMAIL_OUTBOX_CLAIM_TIMEOUT segundos hacia
+    adelante, de modo que si el envio muere los emails vuelven a la cola.
+
+    Returns:
+        Los emails reservados.
+    """
+    now = timezone.now()
+    claim = uuid.uuid4().hex
+    candidates = (
+        QueuedEmail.objects
+        .filter(status=QueuedEmail.PENDING, next_attempt__lte=now)
+        .order_by('next_attempt', 'id')
+        .values('id')[:batch_size]
+    )
+    QueuedEmail.objects.filter(
+        id__in=candidates, status=QueuedEmail.PENDING, next_attempt__lte=now
+    ).update(
+        claimed_by=claim,
+        next_attempt=now + datetime.timedelta(
+            seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT
+        ),
+    )
+    return list(
+        QueuedEmail.objects.filter(claimed_by=claim).order_by('id')
+    )
+
+def release(emails):
+    """Devuelve a la cola emails reservados que no se alcanzaron a enviar,
+    sin contarlo como un intento
+    """
+    QueuedEmail.objects.filter(id__in=[email.id for email in emails]).update(
+        next_attempt=timezone.now()
+    )
+
+def _attempt_failed(email, error):
+    """Registra un intento fallido: reintento mas tarde o estado 'dead'"""
+    email.last_error = repr(error)
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = QueuedEmail.DEAD
+    else:
+        email.next_attempt = timezone.now() + retry_delay(email.attempts)
+
+def send_queued(batch_size=100, connection=None):
+    """Envia un lote de emails pendientes reutilizando una sola conexion.
+
+    Los envios fallidos se reintentan mas tarde; al llegar a
+    EMAIL_OUTBOX_MAX_ATTEMPTS quedan en estado 'dead'. Si no se puede abrir
+    la conexion, todo el lote cuenta como un intento fallido. Si el servidor
+    la cierra a mitad del lote, solo el email que se estaba enviando cuenta
+    como fallido: el resto se envia con una conexion nueva o, si no se
+    puede abrir, vuelve a la cola.
+
+    Args:
+        batch_size: cantidad maxima de emails enviados
+        connection: conexion de email a usar, que queda abierta para el
+            siguiente lote. Por defecto se abre una con el backend
+            configurado y se cierra al terminar.
+
+    Returns:
+        Una tupla (enviados, fallidos).
+    """
+    queued = claim_batch(batch_size)
+    if not queued:
+        return 0, 0
+
+    own_connection = connection is None
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in queued:
+            email.attempts += 1
+            _attempt_failed(email, e)
+            metrics.inc('emails_total', result='failed')
+            email.save()
+        metrics.registry.maybe_flush()
+        return 0, len(queued)
+
+    sent = failed = 0
+    try:
+        for i, email in enumerate(queued):
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, [email.to],
+                connection=connection,
+            )
+            email.attempts += 1
+            disconnected = False
+            start = time.perf_counter()
+            try:
+                message.send()
+            except Exception as e:
+                failed += 1
+                _attempt_failed(email, e)
+                disconnected = isinstance(e, smtplib.SMTPServerDisconnected)
+            else:
+                sent += 1
+                email.status = QueuedEmail.SENT
+            metrics.observe(
+                'email_send_duration_seconds', time.perf_counter() - start
+            )
+            metrics.inc(
+                'emails_total',
+                result='sent' if email.status == QueuedEmail.SENT else 'failed',
+            )
+            email.save()
+            if disconnected:
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    release(queued[i + 1:])
+                    break
+    finally:
+        if own_connection:
+            connection.close()
+        metrics.registry.maybe_flush()
+    return sent, failed
@@ -0,0 +1,230 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Motor de sesiones con cache y escritura diferida (write-behind) a la base
+# de datos. Se activa con SESSION_ENGINE = 'accounts.sessions'.
+#
+# Las sesiones se leen y escriben en la cache SESSION_CACHE_ALIAS. Crear y
+# eliminar una sesion va de inmediato a la base de datos, para que todos los
+# procesos la vean (o dejen de verla) enseguida, y tambien iniciar o cerrar
+# sesion (un cambio del usuario autenticado), que no se puede perder. Solo
+# las demas modificaciones se difieren: cada proceso las acumula y las
+# guarda en lotes, cuando hay SESSION_WRITE_BEHIND_BATCH pendientes o cada
+# SESSION_WRITE_BEHIND_INTERVAL segundos, desde un hilo del proceso.
+#
+# Una modificacion solo reemplaza a la guardada si no es mas antigua: la
+# fecha de expiracion, que se renueva en cada modificacion, hace de version.
+#
+# Como las modificaciones pendientes solo estan en la cache, con varios
+# workers la cache debe ser compartida: con 'locmem' y WSGI_WORKERS > 1 el
+# motor se niega a cargar.
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import CreateError
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError, connections, router, transaction
+
+KEY_PREFIX = 'accounts.sessions.write_behind'
+
+logger = logging.getLogger(__name__)
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+# Proceso en que corre el hilo que guarda las pendientes (ver _start_flusher)
+_flusher_pid = None
+
+def check_cache():
+    """Lanza ImproperlyConfigured si la cache de sesiones es la memoria de
+    cada proceso y hay varios workers: las modificaciones pendientes de un
+    worker no las veria ningun otro.
+    """
+    if (settings.WSGI_WORKERS > 1 and
+            isinstance(caches[settings.SESSION_CACHE_ALIAS], LocMemCache)):
+        raise ImproperlyConfigured(
+            "accounts.sessions needs a session cache shared by the %d "
+            "workers; set SUPERLISTS_SESSION_CACHE to 'file' or 'shm'"
+            % settings.WSGI_WORKERS
+        )
+
+def queue_write(session):
+    """Encola la modificacion de una sesion (instancia de 'Session'). Si se
+    alcanzo el tamaño de lote o el intervalo, guarda las pendientes.
+    """
+    using = router.db_for_write(type(session), instance=session)
+    interval = settings.SESSION_WRITE_BEHIND_INTERVAL
+    with _pending_lock:
+        _pending[session.session_key] = (using, session)
+        due = len(_pending) >= settings.SESSION_WRITE_BEHIND_BATCH or (
+            interval is not None and time.monotonic() - _last_flush >= interval
+        )
+        if interval is not None:
+            _start_flusher()
+    if due:
+        flush_pending()
+
+def write_through(session):
+    """Guarda de inmediato la modificacion de una sesion (instancia de
+    'Session'), en vez de encolarla, y descarta la que estaba pendiente
+    """
+    discard_write(session.session_key)
+    using = router.db_for_write(type(session), instance=session)
+    _update(using, session)
+
+def discard_write(session_key):
+    with _pending_lock:
+        _pending.pop(session_key, None)
+
+def discard_pending():
+    """Descarta todas las modificaciones pendientes del proceso"""
+    with _pending_lock:
+        _pending.clear()
+
+def flush_pending():
+    """Guarda en la base de datos todas las modificaciones pendientes, en
+    una transaccion por base de datos. Solo actualiza sesiones que existen
+    (una sesion eliminada por otro proceso no vuelve a aparecer) y cuya
+    version guardada no es mas nueva. Si una transaccion falla, sus sesiones
+    vuelven a la cola.
+
+    Returns:
+        La cantidad de sesiones actualizadas.
+    """
+    global _last_flush
+    with _pending_lock:
+        pending = list(_pending.values())
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    by_database = {}
+    for using, session in pending:
+        by_database.setdefault(using, []).append(session)
+    saved = 0
+    for using, sessions in by_database.items():
+        try:
+            with transaction.atomic(using=using):
+                for session in sessions:
+                    saved += _update(using, session)
+        except DatabaseError:
+            with _pending_lock:
+                for session in sessions:
+                    _pending.setdefault(session.session_key, (using, session))
+            raise
+    return saved
+
+def _update(using, session):
+    """UPDATE de la sesion, salvo que otro proceso ya haya guardado una
+    modificacion posterior (con una fecha de expiracion mayor)
+
+    Returns:
+        1 si la sesion se actualizo, 0 si no.
+    """
+    return type(session)._default_manager.using(using).filter(
+        session_key=session.session_key,
+        expire_date__lte=session.expire_date,
+    ).update(
+        session_data=session.session_data,
+        expire_date=session.expire_date,
+    )
+
+def _start_flusher():
+    """Inicia, una vez por proceso, el hilo que guarda las modificaciones
+    pendientes aunque el proceso no reciba mas escrituras. Se llama con
+    '_pending_lock' tomado; el pid distingue a los workers creados con fork,
+    que no heredan el hilo.
+    """
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(
+        target=_flush_periodically, name='session-write-behind', daemon=True
+    ).start()
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.SESSION_WRITE_BEHIND_INTERVAL)
+        try:
+            flush_pending()
+        except DatabaseError:
+            logger.exception('Could not write pending sessions')
+        finally:
+            # Las conexiones son por hilo: se cierran las de este hilo
+            connections.close_all()
+
+check_cache()
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush_pending()
+    except DatabaseError:
+        logger.exception('Could not write pending sessions at exit')
+
+class SessionStore(cached_db.SessionStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def load(self):
+        data = super().load()
+        self._saved(data)
+        return data
+
+    def _saved(self, data):
+        """Recuerda 'data' como lo guardado, para comparar al guardar"""
+        self._saved_data = self.encode(data)
+        self._saved_user = data.get(SESSION_KEY)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        encoded = self.encode(data)
+        if must_create:
+            self._create(data)
+        elif encoded == getattr(self, '_saved_data', None):
+            return
+        else:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+            session = self.create_model_instance(data)
+            if data.get(SESSION_KEY) != getattr(self, '_saved_user', None):
+                write_through(session)
+            else:
+                queue_write(session)
+        self._saved(data)
+
+    def _create(self, data):
+        """Guarda una sesion nueva en la cache y en la base de datos. La
+        unicidad de la llave la garantiza primero la cache, sin consultar la
+        base de datos.
+        """
+        if not self._cache.add(self.cache_key, data, self.get_expiry_age()):
+            raise CreateError
+        session = self.create_model_instance(data)
+        using = router.db_for_write(self.model, instance=session)
+        try:
+            with transaction.atomic(using=using):
+                session.save(force_insert=True, using=using)
+        except IntegrityError:
+            self._cache.delete(self.cache_key)
+            raise CreateError
+
+    def exists(self, session_key):
+        # La llave de una sesion nueva es aleatoria: basta revisar la cache.
+        # Un choque con una sesion que solo esta en la base de datos lo
+        # detecta el INSERT de '_create'.
+        return self.cache_key_prefix + session_key in self._cache
+
+    def delete(self, session_key=None):
+        discard_write(session_key or self.session_key)
+        super().delete(session_key)
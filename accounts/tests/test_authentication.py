@@ -6,14 +6,21 @@
 #
 # Distributed under terms of the GPL license.
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+import unittest.mock
+from django.utils import timezone
+import datetime
 from django.contrib.auth import get_user_model
-from accounts.authentication import PasswordlessAuthenticationBackend
+from accounts.authentication import (
+    PasswordlessAuthenticationBackend, UserCache, get_user_cache
+)
 from accounts.models import Token
 User = get_user_model()
 
 
 class AuthenticateTest(TestCase):
+    def setUp(self):
+        get_user_cache().clear()
 
     def test_returns_None_if_no_such_token(self):
         result = PasswordlessAuthenticationBackend().authenticate(
@@ -35,7 +42,40 @@ class AuthenticateTest(TestCase):
         user = PasswordlessAuthenticationBackend().authenticate(token.uid)
         self.assertEqual(user, existing_user)
 
+    def test_marks_token_as_used(self):
+        token = Token.objects.create(email='edith@example.com')
+        PasswordlessAuthenticationBackend().authenticate(token.uid)
+        token.refresh_from_db()
+        self.assertTrue(token.used)
+
+    def test_returns_None_if_token_was_already_used(self):
+        token = Token.objects.create(email='edith@example.com')
+        PasswordlessAuthenticationBackend().authenticate(token.uid)
+        self.assertIsNone(
+            PasswordlessAuthenticationBackend().authenticate(token.uid)
+        )
+
+    @override_settings(LOGIN_TOKEN_TTL=60)
+    def test_returns_None_if_token_expired(self):
+        token = Token.objects.create(
+            email='edith@example.com',
+            created=timezone.now() - datetime.timedelta(seconds=61)
+        )
+        self.assertIsNone(
+            PasswordlessAuthenticationBackend().authenticate(token.uid)
+        )
+
+    def test_invalidates_cached_user_when_creating_it(self):
+        email = 'edith@example.com'
+        get_user_cache().set(email, User(email=email))
+        token = Token.objects.create(email=email)
+        PasswordlessAuthenticationBackend().authenticate(token.uid)
+        self.assertIsNone(get_user_cache().get(email))
+
 class GetUserTest(TestCase):
+    def setUp(self):
+        get_user_cache().clear()
+
     def test_gets_user_by_email(self):
         User.objects.create(email='another@example.com')
         desired_user = User.objects.create(email='edith@example.com')
@@ -48,3 +88,66 @@ class GetUserTest(TestCase):
         self.assertIsNone(
             PasswordlessAuthenticationBackend().get_user('edith@example.com')
         )
+
+    def test_second_lookup_does_not_query_the_database(self):
+        User.objects.create(email='edith@example.com')
+        backend = PasswordlessAuthenticationBackend()
+        backend.get_user('edith@example.com')
+        with self.assertNumQueries(0):
+            user = backend.get_user('edith@example.com')
+        self.assertEqual(user.email, 'edith@example.com')
+
+    def test_counts_hits_and_misses(self):
+        User.objects.create(email='edith@example.com')
+        backend = PasswordlessAuthenticationBackend()
+        backend.get_user('edith@example.com')
+        backend.get_user('edith@example.com')
+        stats = get_user_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_does_not_cache_missing_users(self):
+        backend = PasswordlessAuthenticationBackend()
+        backend.get_user('edith@example.com')
+        User.objects.create(email='edith@example.com')
+        self.assertIsNotNone(backend.get_user('edith@example.com'))
+
+    def test_invalidates_cached_user_when_it_is_saved(self):
+        user = User.objects.create(email='edith@example.com')
+        PasswordlessAuthenticationBackend().get_user('edith@example.com')
+        user.save()
+        self.assertIsNone(get_user_cache().get('edith@example.com'))
+
+    def test_invalidates_cached_user_when_it_is_deleted(self):
+        user = User.objects.create(email='edith@example.com')
+        backend = PasswordlessAuthenticationBackend()
+        backend.get_user('edith@example.com')
+        user.delete()
+        self.assertIsNone(backend.get_user('edith@example.com'))
+
+class UserCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = UserCache(maxsize=2, ttl=60)
+        cache.set('a', 'user a')
+        cache.set('b', 'user b')
+        cache.get('a')
+        cache.set('c', 'user c')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'user a')
+
+    @unittest.mock.patch('accounts.authentication.time.monotonic')
+    def test_entries_expire_after_ttl(self, monotonic_m):
+        cache = UserCache(maxsize=2, ttl=60)
+        monotonic_m.return_value = 100
+        cache.set('a', 'user a')
+        monotonic_m.return_value = 161
+        self.assertIsNone(cache.get('a'))
+
+    @override_settings(USER_CACHE_SIZE=1, USER_CACHE_TTL=5)
+    def test_process_cache_follows_settings(self):
+        cache = get_user_cache()
+        self.assertEqual((cache.maxsize, cache.ttl), (1, 5))
+
+    def test_process_cache_is_emptied_when_settings_change(self):
+        get_user_cache().set('a', 'user a')
+        with override_settings(USER_CACHE_TTL=5):
+            self.assertIsNone(get_user_cache().get('a'))
@@ -0,0 +1,48 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from io import StringIO
+import datetime
+
+from accounts.models import Token
+
+@override_settings(LOGIN_TOKEN_TTL=60)
+class PurgeTokensCommandTest(TestCase):
+    def create_expired_token(self):
+        return Token.objects.create(
+            email='a@b.com',
+            created=timezone.now() - datetime.timedelta(seconds=61)
+        )
+
+    def test_deletes_used_and_expired_tokens(self):
+        fresh = Token.objects.create(email='a@b.com')
+        Token.objects.create(email='a@b.com', used=True)
+        self.create_expired_token()
+
+        call_command('purge_tokens', stdout=StringIO())
+
+        self.assertEqual(list(Token.objects.all()), [fresh])
+
+    def test_deletes_in_batches(self):
+        for _ in range(5):
+            self.create_expired_token()
+
+        # Ningun token usado (1 consulta); 3 lotes de expirados (2 + 2 + 1)
+        # mas la consulta final que no encuentra nada
+        with self.assertNumQueries(8):
+            call_command('purge_tokens', batch_size=2, stdout=StringIO())
+        self.assertEqual(Token.objects.count(), 0)
+
+    def test_reports_number_of_deleted_tokens(self):
+        self.create_expired_token()
+        out = StringIO()
+        call_command('purge_tokens', stdout=out)
+        self.assertIn('Deleted 1 tokens', out.getvalue())
+
+    def test_used_and_expired_token_is_deleted_once(self):
+        token = self.create_expired_token()
+        token.used = True
+        token.save()
+        out = StringIO()
+        call_command('purge_tokens', stdout=out)
+        self.assertIn('Deleted 1 tokens', out.getvalue())
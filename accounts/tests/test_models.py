@@ -1,12 +1,21 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import datetime
+import unittest
 from django.contrib.auth import get_user_model
 from accounts.models import Token
 
 from django.contrib import auth
+
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 User = auth.get_user_model()
 
 User = get_user_model()
 
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
 class UserModelTest(TestCase):
     def test_user_is_valid_with_email_only(self):
         user = User(email='a@b.com')
@@ -27,3 +36,24 @@ class TokenModelTest(TestCase):
         token1 = Token.objects.create(email='a@b.com')
         token2 = Token.objects.create(email='a@b.com')
         self.assertNotEqual(token1.uid, token2.uid)
+
+    @override_settings(LOGIN_TOKEN_TTL=60)
+    def test_stale_tokens_are_used_or_expired(self):
+        fresh = Token.objects.create(email='a@b.com')
+        used = Token.objects.create(email='a@b.com', used=True)
+        expired = Token.objects.create(
+            email='a@b.com',
+            created=timezone.now() - datetime.timedelta(seconds=61)
+        )
+        used_tokens, expired_tokens = Token.stale()
+        self.assertEqual(set(used_tokens), {used})
+        self.assertEqual(set(expired_tokens), {expired})
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'plan de SQLite')
+    def test_stale_tokens_are_found_through_indexes(self):
+        for tokens in Token.stale():
+            sql, params = tokens.values_list('pk').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertRegex(plan, r'SEARCH .*INDEX')
@@ -0,0 +1,207 @@
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from io import StringIO
+import datetime
+import smtplib
+import unittest.mock
+
+from accounts.models import QueuedEmail
+from accounts.outbox import claim_batch, enqueue_mail, send_queued
+
+class EnqueueMailTest(TestCase):
+    def test_queues_one_email_per_recipient(self):
+        enqueue_mail('subject', 'body', 'noreply@superlists', ['a@b.com', 'c@d.com'])
+        self.assertEqual(
+            sorted(QueuedEmail.objects.values_list('to', flat=True)),
+            ['a@b.com', 'c@d.com']
+        )
+
+    def test_does_not_send_anything(self):
+        enqueue_mail('subject', 'body', 'noreply@superlists', ['a@b.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=10)
+class SendQueuedTest(TestCase):
+    def enqueue(self, to='a@b.com'):
+        enqueue_mail('subject', 'body', 'noreply@superlists', [to])
+        return QueuedEmail.objects.get(to=to)
+
+    def failing_connection(self):
+        connection = unittest.mock.Mock()
+        connection.send_messages.side_effect = OSError('connection refused')
+        return connection
+
+    def test_sends_pending_emails(self):
+        self.enqueue()
+        send_queued()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['a@b.com'])
+        self.assertEqual(mail.outbox[0].subject, 'subject')
+
+    def test_marks_sent_emails(self):
+        email = self.enqueue()
+        send_queued()
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.SENT)
+
+    def test_does_not_send_emails_twice(self):
+        self.enqueue()
+        send_queued()
+        send_queued()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_opens_a_single_connection_per_batch(self):
+        self.enqueue('a@b.com')
+        self.enqueue('c@d.com')
+        connection = unittest.mock.Mock()
+        connection.send_messages.return_value = 1
+
+        self.assertEqual(send_queued(connection=connection), (2, 0))
+        self.assertEqual(connection.open.call_count, 1)
+        self.assertEqual(connection.send_messages.call_count, 2)
+
+    def test_does_not_close_a_connection_it_was_given(self):
+        self.enqueue()
+        connection = unittest.mock.Mock()
+        connection.send_messages.return_value = 1
+        send_queued(connection=connection)
+        self.assertFalse(connection.close.called)
+
+    def test_dropped_connection_fails_only_the_email_being_sent(self):
+        first = self.enqueue('a@b.com')
+        second = self.enqueue('c@d.com')
+        connection = unittest.mock.Mock()
+        connection.send_messages.side_effect = [
+            smtplib.SMTPServerDisconnected('Connection unexpectedly closed'), 1
+        ]
+
+        self.assertEqual(send_queued(connection=connection), (1, 1))
+
+        self.assertEqual(connection.open.call_count, 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, QueuedEmail.PENDING)
+        self.assertEqual(first.attempts, 1)
+        self.assertEqual(second.status, QueuedEmail.SENT)
+
+    def test_emails_go_back_to_the_queue_if_reconnecting_fails(self):
+        self.enqueue('a@b.com')
+        second = self.enqueue('c@d.com')
+        connection = unittest.mock.Mock()
+        connection.open.side_effect = [None, OSError('connection refused')]
+        connection.send_messages.side_effect = smtplib.SMTPServerDisconnected()
+
+        self.assertEqual(send_queued(connection=connection), (0, 1))
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, QueuedEmail.PENDING)
+        self.assertEqual(second.attempts, 0)
+        self.assertLessEqual(second.next_attempt, timezone.now())
+
+    def test_respects_batch_size(self):
+        self.enqueue('a@b.com')
+        self.enqueue('c@d.com')
+        send_queued(batch_size=1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_emails_are_retried_later(self):
+        email = self.enqueue()
+        before = timezone.now()
+
+        self.assertEqual(send_queued(connection=self.failing_connection()), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('connection refused', email.last_error)
+        self.assertGreaterEqual(
+            email.next_attempt, before + datetime.timedelta(seconds=10)
+        )
+
+    def test_emails_are_not_retried_before_next_attempt(self):
+        self.enqueue()
+        send_queued(connection=self.failing_connection())
+        send_queued()
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_emails_are_dead_after_max_attempts(self):
+        email = self.enqueue()
+        for _ in range(2):
+            QueuedEmail.objects.update(next_attempt=timezone.now())
+            send_queued(connection=self.failing_connection())
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.DEAD)
+
+    def test_connection_error_counts_as_a_failed_attempt(self):
+        email = self.enqueue()
+        connection = unittest.mock.Mock()
+        connection.open.side_effect = OSError('TLS handshake failed')
+
+        self.assertEqual(send_queued(connection=connection), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('TLS handshake failed', email.last_error)
+        self.assertGreater(email.next_attempt, timezone.now())
+
+    def test_emails_are_dead_after_max_connection_errors(self):
+        email = self.enqueue()
+        connection = unittest.mock.Mock()
+        connection.open.side_effect = OSError('connection refused')
+        for _ in range(2):
+            QueuedEmail.objects.update(next_attempt=timezone.now())
+            send_queued(connection=connection)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.DEAD)
+
+@override_settings(EMAIL_OUTBOX_CLAIM_TIMEOUT=60)
+class ClaimBatchTest(TestCase):
+    def setUp(self):
+        enqueue_mail('subject', 'body', 'noreply@superlists', ['a@b.com', 'c@d.com'])
+
+    def test_concurrent_senders_never_claim_the_same_email(self):
+        first = claim_batch(1)
+        second = claim_batch(10)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first[0].id, second[0].id)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_claimed_emails_are_not_sent_by_another_sender(self):
+        claim_batch(10)
+        self.assertEqual(send_queued(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_claim_expires_if_the_sender_dies(self):
+        claim_batch(10)
+        QueuedEmail.objects.update(
+            next_attempt=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        self.assertEqual(len(claim_batch(10)), 2)
+
+class SendQueuedMailCommandTest(TestCase):
+    def test_sends_queued_emails(self):
+        enqueue_mail('subject', 'body', 'noreply@superlists', ['a@b.com'])
+        out = StringIO()
+        call_command('send_queued_mail', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Sent 1 emails', out.getvalue())
+
+    @unittest.mock.patch('accounts.management.commands.send_queued_mail.get_connection')
+    @unittest.mock.patch('accounts.management.commands.send_queued_mail.send_queued')
+    def test_loop_reuses_one_connection(self, send_queued_m, get_connection_m):
+        send_queued_m.side_effect = [(1, 0), (1, 0), KeyboardInterrupt]
+        with self.assertRaises(KeyboardInterrupt):
+            call_command(
+                'send_queued_mail', '--loop', '--batch-size=1', stdout=StringIO()
+            )
+        connection = get_connection_m.return_value
+        self.assertEqual(get_connection_m.call_count, 1)
+        for call in send_queued_m.call_args_list:
+            self.assertIs(call[1]['connection'], connection)
+        connection.close.assert_called_once_with()
@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+import datetime
+import unittest
+
+from accounts import sessions
+from accounts.sessions import SessionStore, flush_pending
+
+@override_settings(SESSION_WRITE_BEHIND_BATCH=100, SESSION_WRITE_BEHIND_INTERVAL=None)
+class WriteBehindSessionStoreTest(TestCase):
+    def setUp(self):
+        # Descarta escrituras pendientes de otros tests
+        sessions.discard_pending()
+
+    def tearDown(self):
+        sessions.discard_pending()
+
+    def create_session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.create()
+        session.save()
+        return session
+
+    def modify_session(self, session_key, **data):
+        session = SessionStore(session_key)
+        session.update(data)
+        session.save()
+        return session
+
+    def saved_data(self, session):
+        return Session.objects.get(session_key=session.session_key).get_decoded()
+
+    def test_new_sessions_are_written_to_the_database_immediately(self):
+        session = self.create_session(foo='bar')
+        self.assertEqual(self.saved_data(session), {'foo': 'bar'})
+        self.assertEqual(sessions._pending, {})
+
+    def test_modifications_can_be_read_back_before_reaching_the_database(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        self.assertEqual(self.saved_data(session), {'foo': 'bar'})
+        self.assertEqual(SessionStore(session.session_key)['foo'], 'baz')
+
+    def test_modifications_are_written_to_the_database_on_flush(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        self.assertEqual(flush_pending(), 1)
+        self.assertEqual(self.saved_data(session), {'foo': 'baz'})
+
+    @override_settings(SESSION_WRITE_BEHIND_BATCH=2)
+    def test_flushes_when_batch_is_full(self):
+        first = self.create_session(n=1)
+        second = self.create_session(n=2)
+        self.modify_session(first.session_key, n=3)
+        self.modify_session(second.session_key, n=4)
+        self.assertEqual(self.saved_data(first), {'n': 3})
+        self.assertEqual(self.saved_data(second), {'n': 4})
+
+    def test_skips_save_when_data_did_not_change(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='bar')
+        self.assertEqual(sessions._pending, {})
+
+    def test_delete_removes_the_session_and_its_pending_write(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        session.delete()
+        self.assertEqual(sessions._pending, {})
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(SessionStore(session.session_key).load(), {})
+
+    def test_pending_write_does_not_bring_back_a_deleted_session(self):
+        # Otro proceso elimina la sesion mientras esta tiene una
+        # modificacion pendiente en este
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        Session.objects.filter(session_key=session.session_key).delete()
+        self.assertEqual(flush_pending(), 0)
+        self.assertFalse(Session.objects.exists())
+
+    def test_pending_write_does_not_overwrite_a_newer_one(self):
+        # Otro proceso guarda una modificacion posterior de la sesion antes
+        # de que este guarde la suya
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        Session.objects.filter(session_key=session.session_key).update(
+            session_data=session.encode({'foo': 'qux'}),
+            expire_date=timezone.now() + datetime.timedelta(days=365),
+        )
+        self.assertEqual(flush_pending(), 0)
+        self.assertEqual(self.saved_data(session), {'foo': 'qux'})
+
+    def test_login_is_written_to_the_database_immediately(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        self.modify_session(session.session_key, **{SESSION_KEY: 'a@b.com'})
+        self.assertEqual(
+            self.saved_data(session), {'foo': 'baz', SESSION_KEY: 'a@b.com'}
+        )
+        self.assertEqual(sessions._pending, {})
+
+    def test_logout_is_written_to_the_database_immediately(self):
+        session = self.create_session(**{SESSION_KEY: 'a@b.com'})
+        store = SessionStore(session.session_key)
+        del store[SESSION_KEY]
+        store.save()
+        self.assertEqual(self.saved_data(session), {})
+        self.assertEqual(sessions._pending, {})
+
+    def test_session_cache_does_not_cull_active_sessions(self):
+        cache = caches[settings.SESSION_CACHE_ALIAS]
+        self.assertEqual(cache._max_entries, settings.SESSION_CACHE_MAX_ENTRIES)
+        self.assertGreater(cache._max_entries, 300)
+
+    def test_failed_flush_keeps_sessions_pending(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        with unittest.mock.patch(
+            'accounts.sessions.transaction.atomic', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                flush_pending()
+        self.assertEqual(flush_pending(), 1)
+        self.assertEqual(self.saved_data(session), {'foo': 'baz'})
+
+    @override_settings(SESSION_WRITE_BEHIND_INTERVAL=60)
+    def test_starts_one_flusher_thread_per_process(self):
+        session = self.create_session(foo='bar')
+        with unittest.mock.patch('accounts.sessions.threading.Thread') as Thread, \
+                unittest.mock.patch('accounts.sessions._flusher_pid', None), \
+                unittest.mock.patch('accounts.sessions.os.getpid', return_value=10):
+            self.modify_session(session.session_key, n=1)
+            self.modify_session(session.session_key, n=2)
+            self.assertEqual(Thread.return_value.start.call_count, 1)
+            # Un worker creado con fork no hereda el hilo
+            with unittest.mock.patch('accounts.sessions.os.getpid', return_value=11):
+                self.modify_session(session.session_key, n=3)
+            self.assertEqual(Thread.return_value.start.call_count, 2)
+
+    def test_flusher_thread_writes_pending_sessions(self):
+        session = self.create_session(foo='bar')
+        self.modify_session(session.session_key, foo='baz')
+        with override_settings(SESSION_WRITE_BEHIND_INTERVAL=60), \
+                unittest.mock.patch(
+                    'accounts.sessions.time.sleep',
+                    side_effect=[None, SystemExit],
+                ), \
+                unittest.mock.patch('accounts.sessions.connections'):
+            with self.assertRaises(SystemExit):
+                sessions._flush_periodically()
+        self.assertEqual(self.saved_data(session), {'foo': 'baz'})
+
+class SessionCacheCheckTest(TestCase):
+    @override_settings(WSGI_WORKERS=2)
+    def test_rejects_process_local_cache_with_several_workers(self):
+        with self.assertRaises(ImproperlyConfigured):
+            sessions.check_cache()
+
+    @override_settings(WSGI_WORKERS=2, CACHES={
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/superlists-test-sessions',
+        },
+    })
+    def test_accepts_shared_cache_with_several_workers(self):
+        sessions.check_cache()
+
+    def test_accepts_process_local_cache_with_one_worker(self):
+        sessions.check_cache()
@@ -1,28 +1,34 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 import unittest.mock
 
 from accounts.models import Token
+from superlists.querybudget import QueryBudgetTestMixin
 
-@unittest.mock.patch('accounts.views.send_mail')
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+@unittest.mock.patch('accounts.views.enqueue_mail')
 class SendLoginEmailViewTest(TestCase):
-    def test_redirects_to_home_page(self, mock_send_mail):
+    def test_redirects_to_home_page(self, mock_enqueue_mail):
         response = self.client.post('/accounts/send_login_email', data={
             'email': 'edith@example.com'
         })
         self.assertRedirects(response, '/')
 
-    def test_sends_mail_to_address_from_post(self, mock_send_mail):
+    def test_queues_mail_to_address_from_post(self, mock_enqueue_mail):
         self.client.post('/accounts/send_login_email', data={
             'email': 'edith@example.com'
         })
 
-        self.assertEqual(mock_send_mail.called, True)
-        (subject, body, from_email, to_list), kwargs = mock_send_mail.call_args
+        self.assertEqual(mock_enqueue_mail.called, True)
+        (subject, body, from_email, to_list), kwargs = mock_enqueue_mail.call_args
         self.assertEqual(subject, 'Your login link for Superlists')
         self.assertEqual(from_email, 'noreply@superlists')
         self.assertEqual(to_list, ['edith@example.com'])
 
-    def test_adds_success_message(self, mock_send_mail):
+    def test_adds_success_message(self, mock_enqueue_mail):
         response = self.client.post('/accounts/send_login_email', data={
             'email': 'edith@example.com'
         }, follow=True)
@@ -34,23 +40,24 @@ class SendLoginEmailViewTest(TestCase):
         )
         self.assertEqual(message.tags, "success")
 
-    def test_creates_token_associated_with_email(self, mock_send_mail):
+    def test_creates_token_associated_with_email(self, mock_enqueue_mail):
         self.client.post('/accounts/send_login_email', data={
             'email': 'edith@example.com',
         })
         token = Token.objects.first()
         self.assertEqual(token.email, 'edith@example.com')
 
-    def test_send_link_to_login_using_token_uid(self, mock_send_mail):
+    def test_send_link_to_login_using_token_uid(self, mock_enqueue_mail):
         self.client.post('/accounts/send_login_email', data={
             'email': 'edith@example.com'
         })
 
         token = Token.objects.first()
         exp_url = "http://testserver/accounts/login?token=%s" % token.uid
-        (esubject, ebody, efrom, eto_list), kwargs = mock_send_mail.call_args
+        (esubject, ebody, efrom, eto_list), kwargs = mock_enqueue_mail.call_args
         self.assertIn(exp_url, ebody)
 
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
 @unittest.mock.patch('accounts.views.auth')
 class LoginViewTests(TestCase):
     def test_redirects_to_home_page(self, mock_auth):
@@ -75,3 +82,17 @@ class LoginViewTests(TestCase):
         mock_auth.authenticate.return_value = None
         self.client.get('/accounts/login?token=abcd123')
         self.assertEqual(mock_auth.login.called, False)
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    def test_send_login_email(self):
+        for n in range(2):
+            with self.assertWithinQueryBudget('send_login_email'):
+                self.client.post('/accounts/send_login_email', data={
+                    'email': 'edith@example.com'
+                })
+
+    def test_login(self):
+        for n in range(2):
+            token = Token.objects.create(email='edith@example.com')
+            with self.assertWithinQueryBudget('login'):
+                self.client.get('/accounts/login?token=%s' % token.uid)
@@ -1,9 +1,10 @@
-from django.core.mail import send_mail
 from django.core.urlresolvers import reverse
 from django.shortcuts import render, redirect
 from django.contrib import messages, auth
 
 from accounts.models import Token
+from accounts.outbox import enqueue_mail
+from superlists import metrics
 
 # POST /accounts/send_login_email
 def send_login_email(request):
@@ -15,7 +16,7 @@ def send_login_email(request):
 
     ebody = 'Use this link to log in:\n\n%s' % login_url
 
-    send_mail(
+    enqueue_mail(
         'Your login link for Superlists',
         ebody,
         'noreply@superlists',
@@ -34,4 +35,5 @@ def login(request):
     user = auth.authenticate(uid=uid)
     if user:
         auth.login(request, user)
+    metrics.inc('logins_total', result='success' if user else 'failure')
     return redirect('/')
@@ -6,6 +6,7 @@ from django.core import mail
 from selenium.webdriver.common.keys import Keys
 import re
 
+from accounts.outbox import send_queued
 from .base import FunctionalTest
 
 @tag('functional-test')
@@ -30,6 +31,9 @@ class LoginTest(FunctionalTest):
             self.browser.find_element_by_tag_name('body').text
         ))
 
+        # The mail worker delivers the queued email
+        send_queued()
+
         # She checks her email and finds a message
         email = mail.outbox[0]
         self.assertIn(self.TEST_EMAIL, email.to)
@@ -2,8 +2,13 @@
 # vim:fenc=utf-8
 
 from django import forms
+from lists import transfer
 from lists.models import Item, List
+from superlists.dbretry import retry_on_busy
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, router, transaction
+
+DUPLICATE_ITEM_ERROR = "Este item ya existe en tu lista"
 
 class ItemForm(forms.models.ModelForm):
 
@@ -20,7 +25,7 @@ class ItemForm(forms.models.ModelForm):
         error_messages = {
             'text': {'required': "No puedes crear un item sin texto"},
             'NON_FIELD_ERRORS' : {
-                'unique_together' : "Este item ya existe en tu lista"
+                'unique_together' : DUPLICATE_ITEM_ERROR
             },
         }
 
@@ -30,11 +35,40 @@ class ItemForm(forms.models.ModelForm):
         self.instance.list = lista
 
     def validate_unique(self):
+        # La unicidad la impone la base de datos al guardar (ver save), para
+        # no hacer un SELECT previo a cada INSERT.
+        pass
+
+    @retry_on_busy
+    def save(self, commit=True):
+        """Guarda el item confiando en la restriccion de unicidad de la base
+        de datos. Si el item ya existe en la lista, agrega el error al
+        formulario en vez de guardarlo.
+
+        Args:
+            commit: si es False, entrega el item sin guardarlo, como
+                ModelForm.save; quien lo guarde debe manejar los repetidos
+
+        Returns:
+            El item guardado, o None si ya existia en la lista.
+        """
+        if not commit:
+            return super().save(commit=False)
         try:
-            self.instance.validate_unique()
-        except ValidationError as e:
-            e.error_dict = {'text': self.Meta.error_messages['NON_FIELD_ERRORS'].values()}
-            self._update_errors(e)
+            with transaction.atomic():
+                return super().save()
+        except IntegrityError:
+            # Solo un item con el mismo texto en la lista es un repetido;
+            # cualquier otra restriccion violada es un error
+            if not self._is_duplicate():
+                raise
+            self.add_error('text', DUPLICATE_ITEM_ERROR)
+            return None
+
+    def _is_duplicate(self):
+        return Item.objects.db_manager(router.db_for_write(Item)).filter(
+            list=self.instance.list, text_hash=self.instance.text_hash
+        ).exists()
 
 class NewListForm(ItemForm):
     def save(self, owner):
@@ -47,3 +81,134 @@ class NewListForm(ItemForm):
 
 class ExistingListItemForm(ItemForm):
     pass
+
+class BulkItemForm(forms.Form):
+    """Formulario para agregar muchos items, uno por linea, a una lista
+    existente en una sola peticion.
+    """
+    MAX_ITEMS = 500
+
+    texts = forms.CharField(widget=forms.Textarea, strip=False)
+
+    def __init__(self, *args, **kwargs):
+        self.list = kwargs.pop('for_list')
+        super().__init__(*args, **kwargs)
+
+    def clean_texts(self):
+        lines = self.cleaned_data['texts'].splitlines()
+        if len(lines) > self.MAX_ITEMS:
+            raise ValidationError(
+                "No puedes agregar mas de %d items a la vez" % self.MAX_ITEMS
+            )
+        return lines
+
+    @retry_on_busy
+    def save(self):
+        """Valida cada linea con las reglas de <ItemForm>, descarta los
+        duplicados y guarda el resto con un solo INSERT. Si otra peticion
+        agrega alguno de los items entretanto, el INSERT se repite sin el.
+
+        Returns:
+            Una lista con el resultado de cada linea, en el mismo orden en que
+            fueron enviadas.
+        """
+        text_field = ItemForm().fields['text']
+        results = []
+        for lineno, line in enumerate(self.cleaned_data['texts'], start=1):
+            result = {'line': lineno, 'text': line}
+            try:
+                result['text'] = text_field.clean(line)
+            except ValidationError as e:
+                result.update(status='invalid', error=e.messages[0])
+            results.append(result)
+
+        hashes = {
+            r['text']: Item.hash_text(r['text'])
+            for r in results if 'status' not in r
+        }
+        # Los repetidos se buscan en la base de datos en que se va a
+        # escribir, no en una replica que quiza no tiene los ultimos items
+        items = Item.objects.db_manager(router.db_for_write(Item))
+        existing = set(
+            items.filter(list=self.list, text_hash__in=hashes.values())
+            .values_list('text_hash', flat=True)
+        )
+
+        added = []
+        for result in results:
+            if 'status' in result:
+                continue
+            text_hash = hashes[result['text']]
+            if text_hash in existing:
+                result.update(status='duplicate', error=DUPLICATE_ITEM_ERROR)
+            else:
+                existing.add(text_hash)
+                added.append((result, Item(
+                    list=self.list, text=result['text'], text_hash=text_hash
+                )))
+                result['status'] = 'added'
+
+        while True:
+            new_items = [item for _, item in added]
+            try:
+                with transaction.atomic():
+                    positions = self.list.next_positions(len(new_items))
+                    for item, position in zip(new_items, positions):
+                        item.position = position
+                    Item.objects.bulk_create(new_items)
+                    self.list.items_added([item.text for item in new_items])
+                return results
+            except IntegrityError:
+                # Otra peticion agrego alguno de los items despues de buscar
+                # los repetidos: esos se informan como repetidos y se
+                # guarda el resto
+                taken = set(
+                    items.filter(
+                        list=self.list,
+                        text_hash__in=[item.text_hash for item in new_items],
+                    ).values_list('text_hash', flat=True)
+                )
+                if not taken:
+                    raise
+                for result, item in added:
+                    if item.text_hash in taken:
+                        result.update(
+                            status='duplicate', error=DUPLICATE_ITEM_ERROR
+                        )
+                added = [
+                    (result, item) for result, item in added
+                    if item.text_hash not in taken
+                ]
+
+class ImportListsForm(forms.Form):
+    """Formulario para importar listas exportadas en CSV o JSONL (ver
+    lists.transfer). El formato se deduce de la extension del archivo.
+    """
+    file = forms.FileField()
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        extension = upload.name.rsplit('.', 1)[-1].lower()
+        if extension not in transfer.FORMATS:
+            raise ValidationError("El archivo debe ser .csv o .jsonl")
+        # El archivo se revisa completo antes de importar, porque la
+        # importacion guarda por bloques
+        try:
+            transfer.check_file(upload, extension)
+        except transfer.InvalidFile as e:
+            raise ValidationError(str(e))
+        self.format = extension
+        return upload
+
+    def save(self, owner):
+        """Crea una lista nueva de 'owner' por cada lista del archivo. Los
+        items se validan con las reglas de <ItemForm>.
+
+        Returns:
+            Un diccionario con la cantidad de listas creadas y de items
+            agregados ('added'), repetidos ('duplicate') e invalidos
+            ('invalid').
+        """
+        importer = transfer.Importer(owner, ItemForm().fields['text'].clean)
+        rows = transfer.read_rows(self.cleaned_data['file'], self.format)
+        return importer.run(rows)
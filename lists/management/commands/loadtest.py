@@ -0,0 +1,210 @@
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import resolve
+
+User = get_user_model()
+
+def percentile(values, p):
+    """Percentil 'p' (0-100) de 'values', por rango mas cercano"""
+    ordered = sorted(values)
+    index = max(0, int(round(p / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+class Stats:
+    """Latencias y consultas por endpoint, compartidas entre los usuarios"""
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, queries, ok):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.queries[endpoint].append(queries)
+            if not ok:
+                self.errors[endpoint] += 1
+
+class SyntheticUser:
+    """Usuario que recorre home -> new_list -> view_list (POST) -> my_lists
+    llamando directamente a la aplicacion WSGI.
+
+    Args:
+        application: aplicacion WSGI
+        email: email del usuario, que inicia sesion antes de empezar
+        stats: donde se registra cada peticion
+        host: valor de la cabecera Host
+    """
+    def __init__(self, application, email, stats, host):
+        self.application = application
+        self.email = email
+        self.stats = stats
+        self.host = host
+        self.cookies = SimpleCookie()
+
+    def login(self):
+        user, _ = User.objects.get_or_create(email=self.email)
+        client = Client()
+        client.force_login(user)
+        self.cookies.update(client.cookies)
+
+    def request(self, method, path, data=None):
+        body = urlencode(data or {}).encode()
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'HTTP_HOST': self.host,
+            'HTTP_COOKIE': self.cookies.output(header='', sep=';').strip(),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': BytesIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            response['headers'] = headers
+
+        start = time.perf_counter()
+        result = self.application(environ, start_response)
+        try:
+            b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        latency = time.perf_counter() - start
+
+        # request_started reinicia connection.queries en cada peticion
+        match = resolve(path)
+        self.stats.record(
+            '%s %s' % (method, match.url_name), latency,
+            len(connection.queries), response['status'] < 400,
+        )
+        for name, value in response['headers']:
+            if name == 'Set-Cookie':
+                self.cookies.load(value)
+        return response
+
+    def csrf_data(self, **data):
+        data['csrfmiddlewaretoken'] = self.cookies[settings.CSRF_COOKIE_NAME].value
+        return data
+
+    def location(self, response):
+        return urlsplit(dict(response['headers'])['Location']).path
+
+    def run(self, iterations, items):
+        connection.force_debug_cursor = True
+        try:
+            for n in range(iterations):
+                self.request('GET', '/')
+                response = self.request(
+                    'POST', '/lists/new',
+                    self.csrf_data(text='%s list %d' % (self.email, n)),
+                )
+                if response['status'] != 302:
+                    continue
+                list_url = self.location(response)
+                self.request('GET', list_url)
+                for i in range(items):
+                    self.request(
+                        'POST', list_url, self.csrf_data(text='item %d' % i)
+                    )
+                    self.request('GET', list_url)
+                self.request('GET', '/lists/users/%s/' % self.email)
+        finally:
+            connection.close()
+
+class Command(BaseCommand):
+    help = ('Mide el rendimiento de la aplicacion WSGI con usuarios '
+            'sinteticos concurrentes')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Cantidad de usuarios concurrentes',
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=5,
+            help='Listas que crea cada usuario',
+        )
+        parser.add_argument(
+            '--items', type=int, default=3,
+            help='Items que agrega cada usuario a cada lista',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Cabecera Host de las peticiones (debe estar en ALLOWED_HOSTS)',
+        )
+
+    def handle(self, *args, **options):
+        # La aplicacion de produccion, con su calentamiento y los archivos
+        # estaticos; se importa aqui para no calentar el proceso al importar
+        # este modulo
+        from superlists.wsgi import application
+        stats = Stats()
+        users = [
+            SyntheticUser(application, 'loadtest%d@example.com' % n, stats,
+                          options['host'])
+            for n in range(options['users'])
+        ]
+        for user in users:
+            user.login()
+
+        threads = [
+            threading.Thread(
+                target=user.run, args=(options['iterations'], options['items'])
+            )
+            for user in users
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.report(stats, elapsed)
+
+    def report(self, stats, elapsed):
+        total = sum(len(l) for l in stats.latencies.values())
+        self.stdout.write(
+            '%d requests in %.2fs: %.1f requests/sec'
+            % (total, elapsed, total / elapsed)
+        )
+        self.stdout.write(
+            '%-20s %8s %7s %9s %9s %9s %8s'
+            % ('endpoint', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+               'queries')
+        )
+        for endpoint in sorted(stats.latencies):
+            latencies = stats.latencies[endpoint]
+            queries = stats.queries[endpoint]
+            self.stdout.write(
+                '%-20s %8d %7d %9.2f %9.2f %9.2f %8.1f' % (
+                    endpoint, len(latencies), stats.errors[endpoint],
+                    percentile(latencies, 50) * 1000,
+                    percentile(latencies, 95) * 1000,
+                    percentile(latencies, 99) * 1000,
+                    sum(queries) / len(queries),
+                )
+            )
@@ -0,0 +1,55 @@
+import io
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = ('Agrega los perfiles guardados por ProfilingMiddleware y muestra '
+            'las funciones mas costosas de cada vista')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help='Vistas a incluir, p. ej. lists.views.view_list (por defecto todas)',
+        )
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Cantidad de funciones a mostrar por vista',
+        )
+        parser.add_argument(
+            '--sort', default='cumulative',
+            choices=['cumulative', 'tottime', 'ncalls'],
+            help='Criterio de orden de las funciones',
+        )
+
+    def handle(self, *args, **options):
+        root = settings.PROFILING_DIR
+        views = options['views']
+        if not views and os.path.isdir(root):
+            views = sorted(
+                d for d in os.listdir(root)
+                if os.path.isdir(os.path.join(root, d))
+            )
+        if not views:
+            self.stdout.write('No profiles found in %s' % root)
+            return
+
+        for view in views:
+            directory = os.path.join(root, view)
+            dumps = []
+            if os.path.isdir(directory):
+                dumps = sorted(
+                    os.path.join(directory, f) for f in os.listdir(directory)
+                    if f.endswith('.prof')
+                )
+            if not dumps:
+                self.stdout.write('%s: no profiles' % view)
+                continue
+
+            out = io.StringIO()
+            stats = pstats.Stats(*dumps, stream=out)
+            stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+            self.stdout.write('=== %s (%d requests) ===' % (view, len(dumps)))
+            self.stdout.write(out.getvalue())
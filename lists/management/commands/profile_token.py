@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from superlists.profiling import make_profile_token
+
+class Command(BaseCommand):
+    help = ('Genera un token para perfilar peticiones enviandolo en la '
+            'cabecera X-Profile-Token')
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_profile_token())
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from lists.models import List
+
+
+class Command(BaseCommand):
+    help = (
+        'Renumera las posiciones de los items de las listas donde los '
+        'movimientos dejaron poco espacio entre items'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Cantidad maxima de listas renumeradas',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Segundos de espera entre listas',
+        )
+
+    def handle(self, *args, **options):
+        ids = List.objects.filter(crowded=True).values_list('id', flat=True)
+        if options['limit'] is not None:
+            ids = ids[:options['limit']]
+
+        # Cada lista se renumera en su propia transaccion
+        ids = list(ids)
+        for list_id in ids:
+            List(pk=list_id).rebalance_positions()
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write('Rebalanced %d lists' % len(ids))
@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import RequestFactory
+from django.utils.safestring import mark_safe
+
+from lists.forms import ItemForm
+from lists.models import Item, List
+
+ENGINES = ('django', 'jinja2')
+
+def build_list(size):
+    """Lista con 'size' items, sin guardarla en la base de datos"""
+    list_ = List(id=1, first_item_text='item 1', item_count=size)
+    items = [
+        Item(id=n, list=list_, text='item %d' % n, position=n)
+        for n in range(1, size + 1)
+    ]
+    return list_, items
+
+def timed(function):
+    """Ejecuta 'function' y entrega su resultado y su duracion en segundos"""
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+class Command(BaseCommand):
+    help = (
+        'Compara el tiempo de render de list.html con el motor de templates '
+        'de Django y con Jinja2, para listas de distintos tamannos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+            help='Cantidades de items de las listas renderizadas',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Renders por motor y tamanno; se informa la mediana',
+        )
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/lists/1/')
+        request.user = AnonymousUser()
+
+        self.stdout.write('%-8s %8s %10s %12s' % (
+            'engine', 'items', 'load ms', 'render ms'
+        ))
+        for size in options['sizes']:
+            list_, items = build_list(size)
+            table_context = {
+                'list': list_, 'items': items, 'offset': 0,
+                'previous_cursor': None, 'next_cursor': None,
+            }
+            for name in ENGINES:
+                engine = engines[name]
+                loads, renders = [], []
+                for _ in range(options['repeat']):
+                    # Con el cargador en cache solo la primera carga compila
+                    (table, page), load = timed(lambda: (
+                        engine.get_template('list_table.html'),
+                        engine.get_template('list.html'),
+                    ))
+                    _, render = timed(lambda: page.render({
+                        'list': list_, 'form': ItemForm(),
+                        'table': mark_safe(table.render(table_context)),
+                    }, request))
+                    loads.append(load)
+                    renders.append(render)
+                self.stdout.write('%-8s %8d %10.2f %12.2f' % (
+                    name, size, statistics.median(loads) * 1000,
+                    statistics.median(renders) * 1000,
+                ))
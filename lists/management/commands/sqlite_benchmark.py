@@ -0,0 +1,149 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from lists.models import Item, List
+from superlists.backends.sqlite3.base import DatabaseWrapper, apply_pragmas
+
+User = get_user_model()
+
+def create_schema(path):
+    """Crea en la base de datos SQLite 'path' las tablas de las listas, con
+    el esquema que generan los modelos (columnas, restricciones e indices)
+    """
+    settings_dict = dict(
+        connections['default'].settings_dict, NAME=path, OPTIONS={}
+    )
+    connection = DatabaseWrapper(settings_dict, alias='sqlite_benchmark')
+    try:
+        with connection.schema_editor(atomic=False) as editor:
+            for model in (User, List, Item):
+                editor.create_model(model)
+    finally:
+        connection.close()
+
+class Worker(threading.Thread):
+    """Hilo que repite una operacion hasta 'deadline', contando las
+    exitosas y las que fallaron por la base de datos bloqueada
+    """
+    def __init__(self, path, pragmas, deadline, n):
+        super().__init__()
+        self.path = path
+        self.pragmas = pragmas
+        self.deadline = deadline
+        self.n = n
+        self.done = 0
+        self.locked = 0
+
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        apply_pragmas(conn, self.pragmas)
+        i = 0
+        while time.monotonic() < self.deadline:
+            i += 1
+            try:
+                self.operation(conn, i)
+                self.done += 1
+            except sqlite3.OperationalError:
+                self.locked += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+        conn.close()
+
+class Writer(Worker):
+    """Misma escritura que agregar un item: INSERT del item al final de la
+    lista y UPDATE del resumen de la lista, en una transaccion
+    """
+    def operation(self, conn, i):
+        text = 'worker %d item %d' % (self.n, i)
+        list_id = self.n % 10 + 1
+        conn.execute('BEGIN')
+        conn.execute(
+            'INSERT INTO lists_item (text, text_hash, list_id, position) '
+            'SELECT ?, ?, ?, COALESCE(MAX(position), 0) + ? FROM lists_item '
+            'WHERE list_id = ?',
+            (text, hashlib.sha1(text.encode()).hexdigest(), list_id,
+             Item.POSITION_GAP, list_id),
+        )
+        conn.execute(
+            "UPDATE lists_list SET item_count = item_count + 1, "
+            "modified = datetime('now') WHERE id = ?", (list_id,),
+        )
+        conn.execute('COMMIT')
+
+class Reader(Worker):
+    """Misma lectura que una pagina de 'view_list'"""
+    def operation(self, conn, i):
+        list_id = self.n % 10 + 1
+        conn.execute('SELECT * FROM lists_list WHERE id = ?', (list_id,)).fetchall()
+        conn.execute(
+            'SELECT id, text FROM lists_item WHERE list_id = ? '
+            'ORDER BY position, id LIMIT 50', (list_id,),
+        ).fetchall()
+
+class Command(BaseCommand):
+    help = ('Compara escrituras y lecturas concurrentes sobre SQLite con la '
+            'configuracion por defecto y con SQLITE_PRAGMAS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Duracion de cada medicion',
+        )
+
+    def handle(self, *args, **options):
+        modes = [
+            ('default', {}),
+            ('production', settings.SQLITE_PRAGMAS),
+        ]
+        self.stdout.write('%-12s %12s %12s %14s' % (
+            'mode', 'writes/sec', 'reads/sec', 'locked errors'
+        ))
+        for name, pragmas in modes:
+            writes, reads, locked = self.measure(pragmas, options)
+            self.stdout.write('%-12s %12.1f %12.1f %14d' % (
+                name, writes / options['seconds'], reads / options['seconds'],
+                locked,
+            ))
+
+    def measure(self, pragmas, options):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            create_schema(path)
+            conn = sqlite3.connect(path, isolation_level=None)
+            apply_pragmas(conn, pragmas)
+            conn.executemany(
+                "INSERT INTO lists_list "
+                "(first_item_text, item_count, modified, crowded) "
+                "VALUES ('', 0, datetime('now'), 0)", [()] * 10,
+            )
+            conn.close()
+
+            deadline = time.monotonic() + options['seconds']
+            workers = (
+                [Writer(path, pragmas, deadline, n) for n in range(options['writers'])] +
+                [Reader(path, pragmas, deadline, n) for n in range(options['readers'])]
+            )
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            shutil.rmtree(directory)
+
+        writes = sum(w.done for w in workers if isinstance(w, Writer))
+        reads = sum(w.done for w in workers if isinstance(w, Reader))
+        locked = sum(w.locked for w in workers)
+        return writes, reads, locked
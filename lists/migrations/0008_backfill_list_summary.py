@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_list_summary(apps, schema_editor):
+    List = apps.get_model('lists', 'List')
+    Item = apps.get_model('lists', 'Item')
+    db_alias = schema_editor.connection.alias
+
+    lists = List.objects.using(db_alias).annotate(n_items=Count('item'))
+    for list_ in lists.iterator():
+        first = (Item.objects.using(db_alias).filter(list_id=list_.pk)
+                 .order_by('id').values_list('text', flat=True).first())
+        List.objects.using(db_alias).filter(pk=list_.pk).update(
+            first_item_text=first or '',
+            item_count=list_.n_items,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0007_list_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_list_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Copia del SQL de lists.search al momento de esta migracion, para que los
+# cambios posteriores en ese modulo no cambien lo que hace la migracion.
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lists_item_fts USING fts5("
+    "text, content='lists_item', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 1')",
+    "CREATE TRIGGER IF NOT EXISTS lists_item_fts_insert "
+    "AFTER INSERT ON lists_item BEGIN "
+    "INSERT INTO lists_item_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS lists_item_fts_delete "
+    "AFTER DELETE ON lists_item BEGIN "
+    "INSERT INTO lists_item_fts(lists_item_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS lists_item_fts_update "
+    "AFTER UPDATE OF text ON lists_item BEGIN "
+    "INSERT INTO lists_item_fts(lists_item_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO lists_item_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "INSERT INTO lists_item_fts(lists_item_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS lists_item_fts_insert",
+    "DROP TRIGGER IF EXISTS lists_item_fts_delete",
+    "DROP TRIGGER IF EXISTS lists_item_fts_update",
+    "DROP TABLE IF EXISTS lists_item_fts",
+]
+
+POSTGRESQL_INDEX = [
+    "CREATE INDEX IF NOT EXISTS lists_item_text_fts ON lists_item "
+    "USING GIN (to_tsvector('simple', text))",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS lists_item_text_fts",
+]
+
+
+def run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRESQL_INDEX})
+
+
+def drop_search_index(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0010_item_text_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
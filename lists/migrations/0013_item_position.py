@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 09:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+POSITION_GAP = 2 ** 16
+
+
+def backfill_position(apps, schema_editor):
+    # El orden hasta ahora era el de los ids
+    Item = apps.get_model('lists', 'Item')
+    Item.objects.using(schema_editor.connection.alias).update(
+        position=F('id') * POSITION_GAP
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lists', '0012_list_owner_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='item',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='lists_item_list_id_id',
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='position',
+            field=models.BigIntegerField(blank=True, default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='crowded',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_position, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['list', 'position', 'id'], name='lists_item_list_position'),
+        ),
+    ]
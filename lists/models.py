@@ -1,26 +1,463 @@
-from django.db import models
+import datetime
+import hashlib
+
+from django.db import connections, models, router, transaction
+from django.db.models import (
+    Case, F, Max, OuterRef, Q, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.utils import timezone
+
+from superlists.dbretry import retry_on_busy
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Items por UPDATE al renumerar las posiciones de una lista
+REBALANCE_BATCH_SIZE = 500
 
 class List(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, null=True)
 
+    # Columnas de resumen, mantenidas por las escrituras de <Item>. Evitan
+    # consultar item_set por cada lista al renderizar 'my_lists'.
+    first_item_text = models.TextField(default='', editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    modified = models.DateTimeField(default=timezone.now, editable=False)
+    # Algun movimiento dejo poco espacio entre las posiciones de sus items
+    crowded = models.BooleanField(default=False, editable=False)
+
+    # Ordenes de 'owner_page' y el campo por el que ordena cada uno. Las
+    # listas se crean en orden de id, asi que 'created' ordena por id.
+    SORT_FIELDS = {
+        'created': 'id',
+        'modified': 'modified',
+        'items': 'item_count',
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-id'], name='lists_list_owner_id'),
+            models.Index(
+                fields=['owner', '-modified', '-id'],
+                name='lists_list_owner_modified',
+            ),
+            models.Index(
+                fields=['owner', '-item_count', '-id'],
+                name='lists_list_owner_items',
+            ),
+        ]
+
     def get_absolute_url(self):
         return reverse('view_list', args=[self.id])
 
     @property
     def name(self):
-        return self.item_set.first().text
+        return self.first_item_text
 
     @staticmethod
+    @retry_on_busy
+    @transaction.atomic
     def create_new(first_item_text, owner=None):
         list_ = List.objects.create(owner=owner)
         Item.objects.create(text=first_item_text, list=list_)
         return list_
 
+    def items_page(self, size, after=None, before=None):
+        """Obtiene una pagina de items de la lista, en el orden de sus
+        posiciones, usando paginacion por cursor (keyset) en vez de OFFSET.
+
+        Los cursores (ver 'item_cursor') llevan, ademas del id del item, la
+        cantidad de items anteriores, que solo se usa para numerar los items
+        de la pagina sin contarlos: si hay paginas antes o despues se decide
+        leyendo un item mas que los de la pagina. Si el item del cursor ya no
+        existe se entrega la primera pagina, y si no hay items despues de el,
+        la ultima.
+
+        Args:
+            size: cantidad maxima de items de la pagina
+            after: si se entrega, cursor (item_id, offset) del item tras el
+                cual comienza la pagina; offset es la cantidad de items hasta
+                el, incluido
+            before: si se entrega, cursor (item_id, offset) del item antes
+                del cual termina la pagina; offset es la cantidad de items
+                anteriores a el
+
+        Returns:
+            Una tupla (items, offset, has_previous, has_next), donde offset
+            es la cantidad de items de la lista anteriores al primer item de
+            la pagina.
+        """
+        items = self.item_set.all()
+        cursor = before if before is not None else after
+        key = self._item_key(cursor[0]) if cursor is not None else None
+        if key is None:
+            page = list(items[:size + 1])
+            return page[:size], 0, False, len(page) > size
+
+        if before is not None:
+            page = list(
+                items.filter(self._preceding(*key))
+                .order_by('-position', '-id')[:size + 1]
+            )
+            if len(page) <= size:
+                # La pagina anterior a 'before' es la primera
+                return self.items_page(size)
+            page = page[:size]
+            page.reverse()
+            return page, max(before[1] - size, 0), True, True
+
+        page = list(items.filter(self._following(*key))[:size + 1])
+        if page:
+            return page[:size], after[1], True, len(page) > size
+        # Cursor al final de la lista (p. ej. se eliminaron los items que
+        # seguian): ultima pagina
+        page = list(items.order_by('-position', '-id')[:size + 1])
+        has_previous = len(page) > size
+        page = page[:size]
+        page.reverse()
+        return page, max(self.item_count - len(page), 0), has_previous, False
+
+    @staticmethod
+    def item_cursor(item, offset):
+        """Cursor de 'item' para 'items_page', como texto"""
+        return '%d.%d' % (item.id, offset)
+
+    @staticmethod
+    def parse_item_cursor(text):
+        """Convierte un cursor entregado por 'item_cursor' a una tupla
+        (item_id, offset). Entrega None si el cursor no es valido.
+        """
+        try:
+            item_id, offset = (int(part) for part in text.split('.'))
+        except (AttributeError, ValueError):
+            return None
+        return item_id, max(offset, 0)
+
+    def _item_key(self, item_id):
+        """(posicion, id) del item 'item_id' de la lista, o None si no existe"""
+        if item_id is None:
+            return None
+        position = (
+            self.item_set.filter(id=item_id)
+            .values_list('position', flat=True).first()
+        )
+        return None if position is None else (position, item_id)
+
+    @staticmethod
+    def _preceding(position, item_id):
+        """Condicion de los items que van antes de (position, item_id). La
+        cota sobre la posicion permite buscar en el indice desde ella.
+        """
+        return Q(position__lte=position) & (
+            Q(position__lt=position) | Q(position=position, id__lt=item_id)
+        )
+
+    @staticmethod
+    def _following(position, item_id):
+        """Condicion de los items que van despues de (position, item_id)"""
+        return Q(position__gte=position) & (
+            Q(position__gt=position) | Q(position=position, id__gt=item_id)
+        )
+
+    @staticmethod
+    def owner_page(owner, sort, size, after=None, before=None):
+        """Obtiene una pagina de las listas de 'owner', de mayor a menor
+        segun 'sort', usando paginacion por cursor (keyset). Los empates se
+        ordenan por id.
+
+        Args:
+            owner: duenno de las listas
+            sort: una de las llaves de SORT_FIELDS
+            size: cantidad maxima de listas de la pagina
+            after: si se entrega, cursor (ver 'cursor') de la lista tras la
+                cual comienza la pagina
+            before: si se entrega, cursor de la lista antes de la cual
+                termina la pagina
+
+        Returns:
+            Una tupla (lists, has_previous, has_next).
+        """
+        field = List.SORT_FIELDS[sort]
+        lists = List.objects.filter(owner=owner)
+
+        def beyond(cursor, lookup):
+            # La cota '<campo> <= valor' (o '>=') junto al OR permite que la
+            # base de datos busque en el indice (owner, campo, id) desde el
+            # cursor, en vez de recorrer todas las listas de 'owner'
+            value, id_ = cursor
+            return Q(**{'%s__%se' % (field, lookup): value}) & (
+                Q(**{'%s__%s' % (field, lookup): value}) |
+                Q(**{field: value, 'id__%s' % lookup: id_})
+            )
+
+        if before is not None:
+            page = list(
+                lists.filter(beyond(before, 'gt'))
+                .order_by(field, 'id')[:size + 1]
+            )
+            if len(page) <= size:
+                # La pagina anterior a 'before' es la primera
+                return List.owner_page(owner, sort, size)
+            page = page[:size]
+            page.reverse()
+            return page, True, True
+
+        if after is not None:
+            lists = lists.filter(beyond(after, 'lt'))
+        page = list(lists.order_by('-' + field, '-id')[:size + 1])
+        return page[:size], after is not None, len(page) > size
+
+    def cursor(self, sort):
+        """Cursor de la lista para 'owner_page', como texto"""
+        value = getattr(self, List.SORT_FIELDS[sort])
+        if isinstance(value, datetime.datetime):
+            value = (value - EPOCH) // datetime.timedelta(microseconds=1)
+        return '%d.%d' % (value, self.id)
+
+    @staticmethod
+    def parse_cursor(sort, text):
+        """Convierte un cursor entregado por 'cursor' a una tupla (valor, id)
+        para 'owner_page'. Entrega None si el cursor no es valido.
+        """
+        try:
+            value, id_ = (int(part) for part in text.split('.'))
+        except (AttributeError, ValueError):
+            return None
+        if sort == 'modified':
+            value = EPOCH + datetime.timedelta(microseconds=value)
+        return value, id_
+
+    def next_positions(self, n):
+        """Posiciones para agregar 'n' items al final de la lista. Como se
+        usan para escribir, se leen de la base de datos de escritura: una
+        replica atrasada entregaria posiciones ya ocupadas.
+        """
+        using = router.db_for_write(Item, instance=self)
+        last = Item.objects.using(using).filter(list=self).aggregate(
+            last=Max('position')
+        )['last'] or 0
+        return [last + Item.POSITION_GAP * i for i in range(1, n + 1)]
+
+    @staticmethod
+    def lock(pk):
+        """Bloquea la lista 'pk' hasta el final de la transaccion en curso,
+        para que los movimientos y la renumeracion de sus items no se
+        mezclen. Es un UPDATE sin cambios: en PostgreSQL bloquea la fila como
+        SELECT ... FOR UPDATE, y en SQLite, donde FOR UPDATE no existe, toma
+        el candado de escritura antes de leer las posiciones.
+        """
+        List.objects.filter(pk=pk).update(crowded=F('crowded'))
+
+    @retry_on_busy
+    @transaction.atomic
+    def rebalance_positions(self):
+        """Renumera los items de la lista, manteniendo su orden, para que
+        vuelva a haber POSITION_GAP entre posiciones consecutivas.
+
+        El ultimo item conserva su posicion y el resto queda antes que el:
+        un item que se agrega al final mientras tanto, con una posicion
+        calculada antes de la renumeracion, sigue quedando al final.
+        """
+        List.lock(self.pk)
+        rows = list(self.item_set.values_list('id', 'position'))
+        if rows:
+            last = rows[-1][1] - (len(rows) - 1) * Item.POSITION_GAP
+            ids = [id_ for id_, _ in rows]
+            for start in range(0, len(ids), REBALANCE_BATCH_SIZE):
+                batch = ids[start:start + REBALANCE_BATCH_SIZE]
+                Item.objects.filter(id__in=batch).update(position=Case(
+                    *[When(id=id_, then=Value(last + (start + i) * Item.POSITION_GAP))
+                      for i, id_ in enumerate(batch)],
+                    output_field=models.BigIntegerField()
+                ))
+        List.objects.filter(pk=self.pk).update(crowded=False)
+        self.crowded = False
+
+    def items_added(self, texts):
+        """Actualiza el resumen de la lista luego de insertar items, con un
+        solo UPDATE y sin leer los items de la lista.
+
+        Args:
+            texts: textos de los items recien insertados, en orden de
+                insercion
+        """
+        if not texts:
+            return
+        now = timezone.now()
+        List.objects.filter(pk=self.pk).update(
+            first_item_text=Case(
+                When(item_count=0, then=Value(texts[0])),
+                default=F('first_item_text'),
+            ),
+            item_count=F('item_count') + len(texts),
+            modified=now,
+        )
+        if self.item_count == 0:
+            self.first_item_text = texts[0]
+        self.item_count += len(texts)
+        self.modified = now
+
+    def first_text(self):
+        """Texto del primer item de la lista, en el orden de sus posiciones"""
+        first = (
+            self.item_set.order_by('position', 'id')
+            .values_list('text', flat=True).first()
+        )
+        return first or ''
+
+    def item_deleted(self, text):
+        """Actualiza el resumen de la lista luego de eliminar uno de sus
+        items, con un solo UPDATE. Los textos no se repiten dentro de una
+        lista: solo si 'text' es el del primer item se busca, en una
+        subconsulta, el texto del nuevo primero.
+
+        Args:
+            text: texto del item eliminado
+        """
+        first = (
+            Item.objects.filter(list=OuterRef('pk'))
+            .order_by('position', 'id').values('text')[:1]
+        )
+        List.objects.filter(pk=self.pk).update(
+            first_item_text=Case(
+                When(
+                    first_item_text=text,
+                    then=Coalesce(Subquery(first), Value('')),
+                ),
+                default=F('first_item_text'),
+            ),
+            item_count=F('item_count') - 1,
+            modified=timezone.now(),
+        )
+
 class Item(models.Model):
+    # Separacion entre las posiciones de items consecutivos. Mover un item
+    # entre otros dos le asigna el punto medio, sin tocar al resto; despues
+    # de unos 16 movimientos al mismo lugar ya no queda espacio y la lista
+    # se renumera (ver List.rebalance_positions).
+    POSITION_GAP = 2 ** 16
+    # Si un movimiento deja un espacio menor que este, la lista se marca
+    # para renumerarla con el comando 'rebalance_positions'
+    CROWDED_GAP = 2 ** 6
+
     text = models.TextField(default="")
     list = models.ForeignKey(List, default=None)
+    # Hash del texto. La unicidad se impone sobre este campo de largo fijo
+    # para no tener que indexar el texto completo.
+    text_hash = models.CharField(max_length=40, default='', editable=False)
+    # Orden del item en la lista. Si no se entrega, 'save' agrega el item al
+    # final; quien use bulk_create debe asignarla (ver List.next_positions).
+    position = models.BigIntegerField(blank=True, editable=False)
 
     class Meta:
-        unique_together = ('list', 'text')
+        ordering = ['position', 'id']
+        unique_together = ('list', 'text_hash')
+        indexes = [
+            models.Index(
+                fields=['list', 'position', 'id'],
+                name='lists_item_list_position',
+            ),
+        ]
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def clean(self):
+        self.text_hash = Item.hash_text(self.text)
+
+    def save(self, *args, **kwargs):
+        self.text_hash = Item.hash_text(self.text)
+        if self.position is None:
+            self.position = self.list.next_positions(1)[0]
+        super().save(*args, **kwargs)
+
+    @retry_on_busy
+    @transaction.atomic
+    def move_after(self, other):
+        """Mueve el item para que quede justo despues de 'other', o al
+        comienzo de la lista si 'other' es None. Solo cambia la posicion de
+        este item, salvo que no quede espacio entre sus nuevos vecinos.
+
+        Las posiciones se leen con la lista bloqueada (ver List.lock): las
+        que se cargaron antes pudo cambiarlas una renumeracion.
+
+        Args:
+            other: item de la misma lista, o None
+        """
+        if other is not None and other.pk == self.pk:
+            return
+        List.lock(self.list_id)
+        self.refresh_from_db(fields=['position'])
+        if other is not None:
+            other.refresh_from_db(fields=['position'])
+        new_position, gap = self._position_after(other)
+        if new_position is None:
+            self.list.rebalance_positions()
+            self.refresh_from_db(fields=['position'])
+            if other is not None:
+                other.refresh_from_db(fields=['position'])
+            new_position, gap = self._position_after(other)
+
+        self.position = new_position
+        Item.objects.filter(pk=self.pk).update(position=new_position)
+        # Mover un item puede cambiar cual es el primero, que da el nombre
+        # de la lista
+        List.objects.filter(pk=self.list_id).update(
+            modified=timezone.now(),
+            first_item_text=self.list.first_text(),
+            **({'crowded': True} if gap < Item.CROWDED_GAP else {})
+        )
+
+    def _position_after(self, other):
+        """Calcula la posicion para quedar despues de 'other'.
+
+        Returns:
+            Una tupla (posicion, espacio), con el espacio que queda hacia el
+            vecino mas cercano. La posicion es None si no hay espacio.
+        """
+        others = self.list.item_set.exclude(pk=self.pk)
+        if other is not None:
+            others = others.filter(List._following(other.position, other.id))
+        following = others.values_list('position', flat=True).first()
+
+        if other is None and following is None:
+            return self.position, Item.POSITION_GAP
+        if other is None:
+            return following - Item.POSITION_GAP, Item.POSITION_GAP
+        if following is None:
+            return other.position + Item.POSITION_GAP, Item.POSITION_GAP
+        gap = (following - other.position) // 2
+        if gap == 0:
+            return None, 0
+        return other.position + gap, gap
+
+@receiver(post_save, sender=Item)
+def update_list_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        instance.list.items_added([instance.text])
+    else:
+        # El texto pudo cambiar: la version de la lista debe cambiar tambien
+        List.objects.filter(pk=instance.list_id).update(modified=timezone.now())
+
+@receiver(post_delete, sender=Item)
+def update_list_summary_on_delete(sender, instance, **kwargs):
+    List(pk=instance.list_id).item_deleted(instance.text)
+
+@receiver(post_migrate)
+def ensure_search_index(sender, app_config, using, **kwargs):
+    # Las migraciones que reconstruyen 'lists_item' en SQLite eliminan los
+    # triggers del indice de busqueda; aqui se vuelven a crear. Si la tabla
+    # no existe (p. ej. tras 'migrate lists zero') no hay nada que indexar.
+    if app_config.label != 'lists':
+        return
+    connection = connections[using]
+    if Item._meta.db_table not in connection.introspection.table_names():
+        return
+    from lists import search
+    search.ensure_index(connection)
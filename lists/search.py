@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Busqueda de texto completo en los items de un usuario.
+#
+# En SQLite los textos se indexan en la tabla virtual FTS5 'lists_item_fts',
+# que se mantiene al dia con triggers sobre 'lists_item'. Asi el indice
+# incluye tambien los items insertados con bulk_create o eliminados en bloque.
+# En PostgreSQL se usa un indice GIN sobre to_tsvector(text), que la base de
+# datos actualiza sola. En otras bases de datos no hay indice: se buscan las
+# palabras con 'icontains', sin orden por relevancia.
+
+import re
+
+from django.db import connections, router
+
+from lists.models import Item
+
+SEARCH_RESULTS = 50
+# Configuracion de texto de PostgreSQL. Debe ser la misma del indice.
+TS_CONFIG = 'simple'
+
+FTS_TABLE = 'lists_item_fts'
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lists_item_fts USING fts5("
+    "text, content='lists_item', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 1')",
+]
+
+SQLITE_TRIGGERS = {
+    'lists_item_fts_insert': (
+        "CREATE TRIGGER IF NOT EXISTS lists_item_fts_insert "
+        "AFTER INSERT ON lists_item BEGIN "
+        "INSERT INTO lists_item_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    ),
+    'lists_item_fts_delete': (
+        "CREATE TRIGGER IF NOT EXISTS lists_item_fts_delete "
+        "AFTER DELETE ON lists_item BEGIN "
+        "INSERT INTO lists_item_fts(lists_item_fts, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "END"
+    ),
+    'lists_item_fts_update': (
+        "CREATE TRIGGER IF NOT EXISTS lists_item_fts_update "
+        "AFTER UPDATE OF text ON lists_item BEGIN "
+        "INSERT INTO lists_item_fts(lists_item_fts, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "INSERT INTO lists_item_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    ),
+}
+
+POSTGRESQL_INDEX = [
+    "CREATE INDEX IF NOT EXISTS lists_item_text_fts ON lists_item "
+    "USING GIN (to_tsvector('%s', text))" % TS_CONFIG,
+]
+
+SQLITE_SEARCH = """
+    SELECT item.id, item.text, list.id, list.first_item_text
+    FROM lists_item_fts
+    JOIN lists_item item ON item.id = lists_item_fts.rowid
+    JOIN lists_list list ON list.id = item.list_id
+    WHERE lists_item_fts MATCH %s AND list.owner_id = %s
+    ORDER BY bm25(lists_item_fts), item.id
+    LIMIT %s
+"""
+
+POSTGRESQL_SEARCH = """
+    SELECT item.id, item.text, list.id, list.first_item_text
+    FROM lists_item item
+    JOIN lists_list list ON list.id = item.list_id,
+        plainto_tsquery('{config}', %s) query
+    WHERE to_tsvector('{config}', item.text) @@ query AND list.owner_id = %s
+    ORDER BY ts_rank(to_tsvector('{config}', item.text), query) DESC, item.id
+    LIMIT %s
+""".format(config=TS_CONFIG)
+
+def ensure_index(connection):
+    """Crea el indice de busqueda en la base de datos de 'connection' si no
+    existe. En SQLite, si falta algun trigger (por ejemplo porque una
+    migracion reconstruyo 'lists_item'), los vuelve a crear y reconstruye el
+    indice.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+            existing = {name for name, in cursor.fetchall()}
+            if set(SQLITE_TRIGGERS) <= existing:
+                return
+            for sql in SQLITE_INDEX + list(SQLITE_TRIGGERS.values()):
+                cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO lists_item_fts(lists_item_fts) VALUES ('rebuild')"
+            )
+        elif connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_INDEX:
+                cursor.execute(sql)
+
+def drop_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute('DROP TRIGGER IF EXISTS %s' % name)
+            cursor.execute('DROP TABLE IF EXISTS %s' % FTS_TABLE)
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS lists_item_text_fts')
+
+def fts5_query(text):
+    """Convierte el texto que escribe el usuario en una consulta FTS5: cada
+    palabra entre comillas (para que no se interprete como operador) y la
+    ultima como prefijo. Entrega '' si el texto no tiene palabras.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ''
+    return ' '.join('"%s"' % word for word in words) + '*'
+
+def search_items(owner, text, limit=SEARCH_RESULTS):
+    """Busca 'text' en los items de las listas de 'owner'.
+
+    Args:
+        owner: usuario duenno de las listas
+        text: texto de busqueda, tal como lo escribio el usuario
+        limit: cantidad maxima de resultados
+
+    Returns:
+        Lista de diccionarios con 'item_id', 'text', 'list_id' y
+        'list_name', de mejor a peor coincidencia.
+    """
+    connection = connections[router.db_for_read(Item)]
+    if connection.vendor == 'sqlite':
+        sql, query = SQLITE_SEARCH, fts5_query(text)
+    elif connection.vendor == 'postgresql':
+        sql, query = POSTGRESQL_SEARCH, text.strip()
+    else:
+        return _search_icontains(owner, text, limit)
+    if not query:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, owner.pk, limit])
+        return [
+            {'item_id': item_id, 'text': text, 'list_id': list_id,
+             'list_name': list_name}
+            for item_id, text, list_id, list_name in cursor.fetchall()
+        ]
+
+def _search_icontains(owner, text, limit):
+    """Busqueda sin indice de texto completo, para otras bases de datos:
+    items que contienen todas las palabras de 'text', en el orden en que se
+    crearon.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return []
+    items = Item.objects.filter(list__owner=owner)
+    for word in words:
+        items = items.filter(text__icontains=word)
+    rows = items.order_by('id').values_list(
+        'id', 'text', 'list_id', 'list__first_item_text'
+    )[:limit]
+    return [
+        {'item_id': item_id, 'text': text, 'list_id': list_id,
+         'list_name': list_name}
+        for item_id, text, list_id, list_name in rows
+    ]
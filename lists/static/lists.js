@@ -1,8 +1,46 @@
 window.Superlists = {};
+
+window.Superlists.showError = function($form, message) {
+  $form.find('.has-error').remove();
+  $('<div class="form-group has-error">')
+    .append($('<span class="help-block">').text(message))
+    .appendTo($form);
+};
+
+window.Superlists.appendRow = function($table, item) {
+  $('<tr>')
+    .append($('<td class="item-counter">').text(item.counter))
+    .append($('<td>').text(item.text))
+    .appendTo($table);
+};
+
 window.Superlists.initialize = function() {
   $("input[name='text']").on('keypress', function() {
     $(".has-error").hide();
   });
+
+  // Agregar items sin recargar la pagina. Sin JS (o fuera de la ultima
+  // pagina) el formulario se envia normalmente.
+  var $table = $('#id_list_table');
+  var url = $table.data('add-item-url');
+  if (!url) {
+    return;
+  }
+  $("input[name='text']").closest('form').on('submit', function(event) {
+    event.preventDefault();
+    var $form = $(this);
+    var $input = $form.find("input[name='text']");
+    $.post(url, $form.serialize())
+      .done(function(item) {
+        window.Superlists.appendRow($table, item);
+        $input.val('');
+        $form.find('.has-error').hide();
+      })
+      .fail(function(xhr) {
+        var errors = xhr.responseJSON && xhr.responseJSON.errors;
+        window.Superlists.showError($form, errors ? errors[0] : 'Error');
+      });
+  });
 };
 
 
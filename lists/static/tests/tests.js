@@ -10,5 +10,61 @@ QUnit.test("errors aren't hidden if there is no keypress", function (assert) {
   assert.equal($('.has-error').is(':visible'), true);
 });
 
+QUnit.module("ajax item submission", {
+  beforeEach: function() {
+    this.originalPost = $.post;
+    this.deferred = $.Deferred();
+    this.postCalls = [];
+    var self = this;
+    $.post = function(url, data) {
+      self.postCalls.push([url, data]);
+      return self.deferred;
+    };
+  },
+  afterEach: function() {
+    $.post = this.originalPost;
+  }
+});
+
+QUnit.test("form is submitted normally without an add item url", function (assert) {
+  window.Superlists.initialize();
+  var event = $.Event('submit');
+  $('form').trigger(event);
+  assert.equal(event.isDefaultPrevented(), false);
+  assert.equal(this.postCalls.length, 0);
+});
+
+QUnit.test("form is posted to the add item url", function (assert) {
+  $('#id_list_table').attr('data-add-item-url', '/lists/1/items');
+  window.Superlists.initialize();
+  $('input[name="text"]').val('new item');
+  var event = $.Event('submit');
+  $('form').trigger(event);
+  assert.equal(event.isDefaultPrevented(), true);
+  assert.equal(this.postCalls[0][0], '/lists/1/items');
+  assert.equal(this.postCalls[0][1], 'text=new+item');
+});
+
+QUnit.test("new row is appended to the table", function (assert) {
+  $('#id_list_table').attr('data-add-item-url', '/lists/1/items');
+  window.Superlists.initialize();
+  $('input[name="text"]').val('new item');
+  $('form').trigger('submit');
+  this.deferred.resolve({id: 7, text: '<b>new item</b>', counter: 3});
+  var $cells = $('#id_list_table tr:last td');
+  assert.equal($cells.eq(0).text(), '3');
+  assert.equal($cells.eq(1).text(), '<b>new item</b>');
+  assert.equal($('input[name="text"]').val(), '');
+});
+
+QUnit.test("validation errors are shown", function (assert) {
+  $('#id_list_table').attr('data-add-item-url', '/lists/1/items');
+  window.Superlists.initialize();
+  $('form').trigger('submit');
+  this.deferred.reject({responseJSON: {errors: ['No puedes crear un item sin texto']}});
+  assert.equal($('.has-error').text(), 'No puedes crear un item sin texto');
+  assert.equal($('#id_list_table tr').length, 0);
+});
+
 
 /* vim:set sw=2:et:sts=-1: */
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests de los comandos de la app 'Lists'
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from io import StringIO
+import unittest
+
+from lists.management.commands.loadtest import percentile
+from lists.models import List, Item
+
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class LoadTestCommandTest(TransactionTestCase):
+    def run_loadtest(self):
+        # Un solo usuario: la base de datos SQLite en memoria de los tests no
+        # admite escrituras concurrentes
+        out = StringIO()
+        call_command(
+            'loadtest', users=1, iterations=2, items=1, host='testserver',
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_runs_the_user_flow_against_the_application(self):
+        self.run_loadtest()
+        self.assertEqual(List.objects.count(), 2)
+        self.assertEqual(Item.objects.count(), 4)
+
+    def test_uses_the_project_wsgi_application(self):
+        from superlists import wsgi
+        with unittest.mock.patch.object(
+            wsgi, 'application', wraps=wsgi.application
+        ) as application:
+            self.run_loadtest()
+        self.assertTrue(application.called)
+
+    def test_reports_every_endpoint_without_errors(self):
+        output = self.run_loadtest()
+        self.assertIn('requests/sec', output)
+        for endpoint in ['GET home', 'POST new_list', 'GET view_list',
+                         'POST view_list', 'GET my_lists']:
+            line = next(l for l in output.splitlines() if l.startswith(endpoint))
+            self.assertEqual(line.split()[3], '0', line)
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 95), 3)
+
+class RebalancePositionsCommandTest(TestCase):
+    def test_rebalances_crowded_lists(self):
+        crowded = List.objects.create()
+        first = Item.objects.create(list=crowded, text='a')
+        second = Item.objects.create(list=crowded, text='b')
+        second.move_after(None)
+        List.objects.filter(pk=crowded.pk).update(crowded=True)
+        List.objects.create()
+
+        out = StringIO()
+        call_command('rebalance_positions', stdout=out)
+
+        self.assertIn('Rebalanced 1 lists', out.getvalue())
+        self.assertEqual(
+            list(crowded.item_set.values_list('text', 'position')),
+            [('b', 0), ('a', Item.POSITION_GAP)],
+        )
+        self.assertFalse(List.objects.filter(crowded=True).exists())
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class RenderBenchmarkCommandTest(TestCase):
+    def test_reports_both_engines_for_each_size(self):
+        out = StringIO()
+        call_command('render_benchmark', sizes=[1, 20], repeat=1, stdout=out)
+
+        rows = [line.split() for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual(
+            [row[:2] for row in rows],
+            [['django', '1'], ['jinja2', '1'], ['django', '20'], ['jinja2', '20']],
+        )
@@ -2,11 +2,12 @@
 # vim:fenc=utf-8
 #
 
+from django.db import IntegrityError
 from django.test import TestCase
 import unittest
 
 from lists.models import *
-from lists.forms import ItemForm, NewListForm
+from lists.forms import ItemForm, NewListForm, BulkItemForm
 
 
 class ItemFormTest(TestCase):
@@ -43,13 +44,54 @@ class ExistingListItemFormTest(TestCase):
         self.assertFalse(form.is_valid())
         self.assertEqual(form.errors['text'], [self.EMPTY_ITEM_ERROR])
 
-    def test_form_validation_for_duplicate_items(self):
+    def test_form_save_reports_duplicate_items(self):
         list_ = List.objects.create()
         Item.objects.create(list=list_, text='no twins!')
         form = ItemForm(for_list=list_, data={'text': 'no twins!'})
+        form.is_valid()
+        self.assertIsNone(form.save())
         self.assertFalse(form.is_valid())
         self.assertEqual(form.errors['text'], [self.DUPLICATE_ITEM_ERROR])
 
+    def test_form_save_does_not_check_uniqueness_before_insert(self):
+        list_ = List.objects.create()
+        form = ItemForm(for_list=list_, data={'text': 'new item'})
+        form.is_valid()
+        # Posicion del item, INSERT del item y UPDATE del resumen de la
+        # lista, en un savepoint
+        with self.assertNumQueries(5):
+            form.save()
+        self.assertEqual(list_.item_set.get().text, 'new item')
+
+    def test_form_save_keeps_transaction_usable_after_duplicate(self):
+        list_ = List.objects.create()
+        Item.objects.create(list=list_, text='no twins!')
+        form = ItemForm(for_list=list_, data={'text': 'no twins!'})
+        form.is_valid()
+        form.save()
+        self.assertEqual(list_.item_set.count(), 1)
+
+    def test_form_save_raises_other_integrity_errors(self):
+        list_ = List.objects.create()
+        form = ItemForm(for_list=list_, data={'text': 'new item'})
+        form.is_valid()
+        error = IntegrityError('NOT NULL constraint failed: lists_item.list_id')
+        with unittest.mock.patch(
+            'django.forms.models.BaseModelForm.save', side_effect=error
+        ):
+            with self.assertRaises(IntegrityError):
+                form.save()
+        self.assertNotIn('text', form.errors)
+
+    def test_form_save_without_commit_returns_unsaved_item(self):
+        list_ = List.objects.create()
+        form = ItemForm(for_list=list_, data={'text': 'new item'})
+        form.is_valid()
+        with self.assertNumQueries(0):
+            item = form.save(commit=False)
+        self.assertIsNone(item.pk)
+        self.assertEqual((item.list, item.text), (list_, 'new item'))
+
 class NewListFormTest(unittest.TestCase):
     @unittest.mock.patch('lists.forms.List.create_new')
     def test_save_creates_new_list_from_post_data_if_user_not_authenticated(
@@ -82,3 +124,82 @@ class NewListFormTest(unittest.TestCase):
         form.is_valid()
         save_response = form.save(owner=user)
         self.assertEqual(save_response, List_create_new_m.return_value)
+
+class BulkItemFormTest(TestCase):
+
+    def save_lines(self, list_, *lines):
+        form = BulkItemForm(for_list=list_, data={'texts': '\n'.join(lines)})
+        self.assertTrue(form.is_valid())
+        return form.save()
+
+    def test_saves_one_item_per_line(self):
+        list_ = List.objects.create()
+        self.save_lines(list_, 'first', 'second')
+        self.assertEqual(
+            list(list_.item_set.order_by('id').values_list('text', flat=True)),
+            ['first', 'second']
+        )
+
+    def test_reports_result_for_each_line(self):
+        list_ = List.objects.create()
+        Item.objects.create(list=list_, text='existing')
+        results = self.save_lines(list_, 'new', '', 'existing', 'new')
+        self.assertEqual(
+            [r['status'] for r in results],
+            ['added', 'invalid', 'duplicate', 'duplicate']
+        )
+        self.assertEqual(
+            results[1]['error'],
+            ItemForm.Meta.error_messages['text']['required']
+        )
+
+    def test_checks_duplicates_and_inserts_with_constant_queries(self):
+        list_ = List.objects.create()
+        lines = ['item %d' % i for i in range(100)]
+        form = BulkItemForm(for_list=list_, data={'texts': '\n'.join(lines)})
+        form.is_valid()
+        # SELECT de duplicados; posiciones, INSERT y UPDATE del resumen en
+        # un savepoint
+        with self.assertNumQueries(6):
+            form.save()
+        self.assertEqual(Item.objects.count(), 100)
+
+    def test_reports_item_added_concurrently_as_duplicate(self):
+        list_ = List.objects.create()
+        filter_ = Item.objects.filter
+        checks = []
+        def add_after_duplicate_check(*args, **kwargs):
+            # Otra peticion agrega 'second' justo despues de la consulta de
+            # los repetidos
+            if checks:
+                return filter_(*args, **kwargs)
+            checks.append(kwargs)
+            Item.objects.create(list=list_, text='second')
+            return Item.objects.none()
+
+        with unittest.mock.patch.object(
+            Item.objects, 'filter', side_effect=add_after_duplicate_check
+        ):
+            results = self.save_lines(list_, 'first', 'second', 'third')
+
+        self.assertEqual(
+            [r['status'] for r in results], ['added', 'duplicate', 'added']
+        )
+        self.assertEqual(
+            sorted(list_.item_set.values_list('text', flat=True)),
+            ['first', 'second', 'third']
+        )
+        self.assertEqual(List.objects.get(pk=list_.pk).item_count, 3)
+
+    def test_updates_list_summary(self):
+        list_ = List.objects.create()
+        self.save_lines(list_, 'first', 'second')
+        saved_list = List.objects.get(pk=list_.pk)
+        self.assertEqual(saved_list.name, 'first')
+        self.assertEqual(saved_list.item_count, 2)
+
+    def test_rejects_too_many_lines(self):
+        list_ = List.objects.create()
+        lines = ['item'] * (BulkItemForm.MAX_ITEMS + 1)
+        form = BulkItemForm(for_list=list_, data={'texts': '\n'.join(lines)})
+        self.assertFalse(form.is_valid())
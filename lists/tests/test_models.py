@@ -6,6 +6,9 @@
 from django.test import TestCase
 from lists.models import Item, List
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+import unittest
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
@@ -41,6 +44,17 @@ class ItemModelTest(TestCase):
             item = Item(text='bla', list=list_)
             item.full_clean()
 
+    def test_duplicate_items_are_rejected_by_the_database(self):
+        list_ = List.objects.create()
+        Item.objects.create(text='bla', list=list_)
+
+        with self.assertRaises(IntegrityError):
+            Item.objects.create(text='bla', list=list_)
+
+    def test_text_hash_is_set_on_save(self):
+        item = Item.objects.create(text='bla', list=List.objects.create())
+        self.assertEqual(item.text_hash, Item.hash_text('bla'))
+
     def test_CAN_save_items_to_different_lists(self):
         list1 = List.objects.create()
         list2 = List.objects.create()
@@ -89,3 +103,252 @@ class ListModelTest(TestCase):
         Item.objects.create(list=list_, text='first item')
         Item.objects.create(list=list_, text='second item')
         self.assertEqual(list_.name, 'first item')
+
+    def test_list_name_is_kept_when_first_item_is_saved_through_create_new(self):
+        List.create_new(first_item_text='first item')
+        self.assertEqual(List.objects.first().name, 'first item')
+
+    def test_item_count_is_updated_on_insert(self):
+        list_ = List.objects.create()
+        Item.objects.create(list=list_, text='a')
+        Item.objects.create(list=list_, text='b')
+        self.assertEqual(List.objects.get(pk=list_.pk).item_count, 2)
+
+    def test_modified_is_updated_on_insert(self):
+        list_ = List.objects.create()
+        before = List.objects.get(pk=list_.pk).modified
+        Item.objects.create(list=list_, text='a')
+        self.assertGreater(List.objects.get(pk=list_.pk).modified, before)
+
+    def test_modified_is_updated_when_an_item_is_edited(self):
+        list_ = List.objects.create()
+        item = Item.objects.create(list=list_, text='a')
+        before = List.objects.get(pk=list_.pk).modified
+
+        item.text = 'b'
+        item.save()
+        self.assertGreater(List.objects.get(pk=list_.pk).modified, before)
+
+    def test_summary_is_recomputed_when_items_are_deleted(self):
+        list_ = List.objects.create()
+        first = Item.objects.create(list=list_, text='first item')
+        Item.objects.create(list=list_, text='second item')
+
+        first.delete()
+
+        saved_list = List.objects.get(pk=list_.pk)
+        self.assertEqual(saved_list.name, 'second item')
+        self.assertEqual(saved_list.item_count, 1)
+
+    def test_list_name_is_kept_when_another_item_is_deleted(self):
+        list_ = List.objects.create()
+        Item.objects.create(list=list_, text='first item')
+        second = Item.objects.create(list=list_, text='second item')
+
+        second.delete()
+
+        saved_list = List.objects.get(pk=list_.pk)
+        self.assertEqual(saved_list.name, 'first item')
+        self.assertEqual(saved_list.item_count, 1)
+
+    def test_deleting_an_item_updates_the_summary_with_one_query(self):
+        list_ = List.objects.create()
+        first = Item.objects.create(list=list_, text='first item')
+        Item.objects.create(list=list_, text='second item')
+        # El DELETE del item y el UPDATE del resumen
+        with self.assertNumQueries(2):
+            first.delete()
+
+    def test_summary_is_empty_when_all_items_are_deleted(self):
+        list_ = List.create_new(first_item_text='only item')
+        list_.item_set.all().delete()
+
+        saved_list = List.objects.get(pk=list_.pk)
+        self.assertEqual(saved_list.name, '')
+        self.assertEqual(saved_list.item_count, 0)
+
+class ListOwnerPageTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+        self.lists = []
+        for i, n_items in enumerate([2, 0, 3, 1, 2]):
+            list_ = List.objects.create(owner=self.owner)
+            for j in range(n_items):
+                Item.objects.create(list=list_, text='item %d' % j)
+            self.lists.append(list_)
+        List.objects.create(owner=User.objects.create(email='c@d.com'))
+
+    def page(self, sort, size=2, after=None, before=None):
+        lists, has_previous, has_next = List.owner_page(
+            self.owner, sort, size, after=after, before=before
+        )
+        return [self.lists.index(l) for l in lists], has_previous, has_next
+
+    def cursor(self, index, sort):
+        list_ = List.objects.get(pk=self.lists[index].pk)
+        return List.parse_cursor(sort, list_.cursor(sort))
+
+    def test_first_page_of_newest_lists(self):
+        self.assertEqual(self.page('created'), ([4, 3], False, True))
+
+    def test_sorts_by_item_count_then_newest(self):
+        self.assertEqual(self.page('items', size=5)[0], [2, 4, 0, 3, 1])
+
+    def test_sorts_by_last_activity(self):
+        Item.objects.create(list=self.lists[1], text='new')
+        self.assertEqual(self.page('modified', size=1)[0], [1])
+
+    def test_after_cursor_returns_following_lists(self):
+        after = self.cursor(4, 'items')
+        self.assertEqual(self.page('items', after=after), ([0, 3], True, True))
+
+    def test_last_page_has_no_next(self):
+        after = self.cursor(3, 'items')
+        self.assertEqual(self.page('items', after=after), ([1], True, False))
+
+    def test_before_cursor_returns_preceding_lists(self):
+        before = self.cursor(1, 'items')
+        self.assertEqual(self.page('items', before=before), ([0, 3], True, True))
+
+    def test_before_the_second_page_returns_the_first_page(self):
+        before = self.cursor(0, 'items')
+        self.assertEqual(self.page('items', before=before), ([2, 4], False, True))
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'plan de SQLite')
+    def test_cursor_pages_seek_in_the_sort_index(self):
+        for sort, column in [('modified', 'modified'), ('items', 'item_count')]:
+            for direction in ('after', 'before'):
+                cursor = {direction: self.cursor(2, sort)}
+                with CaptureQueriesContext(connection) as queries:
+                    self.page(sort, **cursor)
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertRegex(plan, r'owner_id=\? AND %s[<>]\?' % column)
+
+    def test_modified_cursor_round_trips(self):
+        list_ = List.objects.get(pk=self.lists[0].pk)
+        self.assertEqual(
+            List.parse_cursor('modified', list_.cursor('modified')),
+            (list_.modified, list_.id),
+        )
+
+    def test_invalid_cursor_is_none(self):
+        self.assertIsNone(List.parse_cursor('items', 'x.1'))
+        self.assertIsNone(List.parse_cursor('items', None))
+
+class ItemPositionTest(TestCase):
+    def setUp(self):
+        self.list_ = List.objects.create()
+        self.items = [
+            Item.objects.create(list=self.list_, text='item %d' % i)
+            for i in range(4)
+        ]
+
+    def order(self):
+        return [item.text for item in self.list_.item_set.all()]
+
+    def test_new_items_go_to_the_end(self):
+        positions = [item.position for item in self.items]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(
+            positions[1] - positions[0], Item.POSITION_GAP
+        )
+
+    def test_positions_are_per_list(self):
+        item = Item.objects.create(list=List.objects.create(), text='a')
+        self.assertEqual(item.position, Item.POSITION_GAP)
+
+    def test_move_after_another_item(self):
+        self.items[3].move_after(self.items[0])
+        self.assertEqual(self.order(), ['item 0', 'item 3', 'item 1', 'item 2'])
+
+    def test_move_to_the_top(self):
+        self.items[2].move_after(None)
+        self.assertEqual(self.order(), ['item 2', 'item 0', 'item 1', 'item 3'])
+
+    def test_move_to_the_end(self):
+        self.items[0].move_after(self.items[3])
+        self.assertEqual(self.order(), ['item 1', 'item 2', 'item 3', 'item 0'])
+
+    def test_move_after_itself_does_nothing(self):
+        self.items[1].move_after(self.items[1])
+        self.assertEqual(self.order(), ['item 0', 'item 1', 'item 2', 'item 3'])
+
+    def test_move_updates_one_item(self):
+        self.items[3].move_after(self.items[0])
+        positions = Item.objects.filter(
+            pk__in=[item.pk for item in self.items[:3]]
+        ).values_list('position', flat=True)
+        self.assertEqual(
+            sorted(positions), [item.position for item in self.items[:3]]
+        )
+
+    def test_move_changes_list_version(self):
+        before = List.objects.get(pk=self.list_.pk).modified
+        self.items[3].move_after(self.items[0])
+        self.assertGreater(List.objects.get(pk=self.list_.pk).modified, before)
+
+    def test_rebalances_when_gaps_run_out(self):
+        # Cada movimiento al mismo lugar divide el espacio a la mitad
+        for i in range(20):
+            mover = self.items[2] if i % 2 == 0 else self.items[3]
+            mover.move_after(self.items[0])
+        self.assertEqual(self.order()[0], 'item 0')
+        self.assertEqual(sorted(self.order()), ['item 0', 'item 1', 'item 2', 'item 3'])
+        positions = list(self.list_.item_set.values_list('position', flat=True))
+        self.assertEqual(len(set(positions)), 4)
+
+    def test_small_gaps_mark_the_list_as_crowded(self):
+        for i in range(12):
+            self.items[3 - i % 2].move_after(self.items[0])
+        self.assertTrue(List.objects.get(pk=self.list_.pk).crowded)
+
+    def test_rebalance_keeps_order_and_restores_gaps(self):
+        self.items[3].move_after(self.items[0])
+        self.list_.rebalance_positions()
+        self.assertEqual(self.order(), ['item 0', 'item 3', 'item 1', 'item 2'])
+        positions = list(self.list_.item_set.values_list('position', flat=True))
+        # El ultimo item conserva su posicion
+        self.assertEqual(
+            positions, [Item.POSITION_GAP * i for i in range(4)]
+        )
+        self.assertFalse(List.objects.get(pk=self.list_.pk).crowded)
+
+    def test_item_appended_during_rebalance_stays_at_the_end(self):
+        # Posicion calculada por un INSERT concurrente antes de renumerar
+        position = self.list_.next_positions(1)[0]
+        self.items[3].move_after(self.items[0])
+        self.list_.rebalance_positions()
+        Item.objects.create(list=self.list_, text='appended', position=position)
+        self.assertEqual(self.order()[-1], 'appended')
+
+    def test_move_reads_positions_inside_its_transaction(self):
+        # Instancias cargadas antes de que otro proceso renumerara la lista
+        stale = list(self.list_.item_set.all())
+        self.items[3].move_after(self.items[0])
+        self.list_.rebalance_positions()
+        stale[2].move_after(stale[3])
+        self.assertEqual(self.order(), ['item 0', 'item 3', 'item 2', 'item 1'])
+
+    def test_moving_an_item_to_the_top_renames_the_list(self):
+        self.items[2].move_after(None)
+        self.assertEqual(List.objects.get(pk=self.list_.pk).name, 'item 2')
+
+    def test_moving_the_first_item_away_renames_the_list(self):
+        self.items[0].move_after(self.items[3])
+        self.assertEqual(List.objects.get(pk=self.list_.pk).name, 'item 1')
+
+    def test_deleting_an_item_keeps_the_first_item_by_position(self):
+        self.items[3].move_after(None)
+        self.items[1].delete()
+        self.assertEqual(List.objects.get(pk=self.list_.pk).name, 'item 3')
+
+    def test_items_page_follows_positions(self):
+        self.items[3].move_after(None)
+        page, offset, has_previous, has_next = self.list_.items_page(
+            2, after=(self.items[0].id, 2)
+        )
+        self.assertEqual(page, [self.items[1], self.items[2]])
+        self.assertEqual(offset, 2)
+        self.assertEqual((has_previous, has_next), (True, False))
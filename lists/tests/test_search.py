@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests de la busqueda de texto completo
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+import unittest.mock
+
+from lists import search
+from lists.models import Item, List, ensure_search_index
+from lists.search import fts5_query, search_items
+
+User = get_user_model()
+
+class Fts5QueryTest(TestCase):
+    def test_quotes_each_word_and_prefixes_the_last(self):
+        self.assertEqual(fts5_query('buy milk'), '"buy" "milk"*')
+
+    def test_ignores_fts_syntax(self):
+        self.assertEqual(fts5_query('milk" OR (NOT x'), '"milk" "OR" "NOT" "x"*')
+
+    def test_no_words_gives_empty_query(self):
+        self.assertEqual(fts5_query(' "*- '), '')
+
+class SearchItemsTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+        self.list_ = List.create_new(first_item_text='shopping', owner=self.owner)
+
+    def add(self, text, list_=None):
+        return Item.objects.create(list=list_ or self.list_, text=text)
+
+    def texts(self, query):
+        return [r['text'] for r in search_items(self.owner, query)]
+
+    def test_finds_matching_items_with_their_list(self):
+        item = self.add('buy peacock feathers')
+        results = search_items(self.owner, 'peacock')
+        self.assertEqual(results, [{
+            'item_id': item.id, 'text': 'buy peacock feathers',
+            'list_id': self.list_.id, 'list_name': 'shopping',
+        }])
+
+    def test_matches_all_words(self):
+        self.add('buy milk')
+        self.add('buy bread')
+        self.assertEqual(self.texts('buy milk'), ['buy milk'])
+
+    def test_matches_word_prefixes(self):
+        self.add('peacock feathers')
+        self.assertEqual(self.texts('feath'), ['peacock feathers'])
+
+    def test_ignores_case_and_accents(self):
+        self.add('Comprar limón')
+        self.assertEqual(self.texts('LIMON'), ['Comprar limón'])
+
+    def test_best_matches_come_first(self):
+        self.add('milk and a very long list of other things to buy today')
+        self.add('milk milk')
+        self.assertEqual(self.texts('milk')[0], 'milk milk')
+
+    def test_only_searches_the_owners_lists(self):
+        List.create_new(
+            first_item_text='milk',
+            owner=User.objects.create(email='c@d.com'),
+        )
+        self.add('milk', list_=List.objects.create())
+        self.assertEqual(self.texts('milk'), [])
+
+    def test_empty_query_returns_nothing(self):
+        self.add('milk')
+        self.assertEqual(self.texts(''), [])
+
+    def test_respects_limit(self):
+        for i in range(5):
+            self.add('milk %d' % i)
+        self.assertEqual(len(search_items(self.owner, 'milk', limit=3)), 3)
+
+    def test_index_follows_bulk_create(self):
+        Item.objects.bulk_create([
+            Item(list=self.list_, text='bulk milk', text_hash='x', position=1),
+        ])
+        self.assertEqual(self.texts('milk'), ['bulk milk'])
+
+    def test_index_follows_updates(self):
+        item = self.add('milk')
+        item.text = 'bread'
+        item.save()
+        self.assertEqual(self.texts('milk'), [])
+        self.assertEqual(self.texts('bread'), ['bread'])
+
+    def test_index_follows_deletes(self):
+        self.add('milk')
+        self.list_.item_set.all().delete()
+        self.assertEqual(self.texts('milk'), [])
+
+    def test_ensure_index_rebuilds_a_dropped_index(self):
+        self.add('milk')
+        search.drop_index(connection)
+        search.ensure_index(connection)
+        self.add('more milk')
+        self.assertEqual(sorted(self.texts('milk')), ['milk', 'more milk'])
+
+    def test_other_databases_search_with_icontains(self):
+        item = self.add('Buy peacock feathers')
+        self.add('buy milk')
+        other = User.objects.create(email='c@d.com')
+        self.add('peacock', List.create_new(first_item_text='x', owner=other))
+        with unittest.mock.patch.object(connection, 'vendor', 'oracle'):
+            results = search_items(self.owner, 'PEACOCK buy')
+        self.assertEqual(results, [{
+            'item_id': item.id, 'text': 'Buy peacock feathers',
+            'list_id': self.list_.id, 'list_name': 'shopping',
+        }])
+
+    def test_post_migrate_skips_a_missing_items_table(self):
+        app_config = apps.get_app_config('lists')
+        with unittest.mock.patch.object(
+            connection.introspection, 'table_names', return_value=[]
+        ), unittest.mock.patch('lists.search.ensure_index') as ensure_index:
+            ensure_search_index(None, app_config, 'default')
+        ensure_index.assert_not_called()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests de la exportacion e importacion de listas
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+import unittest
+
+from lists import transfer
+from lists.forms import ItemForm
+from lists.models import Item, List
+
+User = get_user_model()
+
+def upload(content, name='lists.csv'):
+    return SimpleUploadedFile(name, content.encode('utf-8'))
+
+class ExportRowsTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+        self.list_ = List.create_new(first_item_text='milk', owner=self.owner)
+        Item.objects.create(list=self.list_, text='bread, "white"')
+
+    def test_csv_has_header_and_one_row_per_item(self):
+        content = ''.join(transfer.export_rows(self.owner, 'csv'))
+        self.assertEqual(content, (
+            'list,text\r\n'
+            '%d,milk\r\n'
+            '%d,"bread, ""white"""\r\n'
+        ) % (self.list_.id, self.list_.id))
+
+    def test_jsonl_has_one_object_per_line(self):
+        content = ''.join(transfer.export_rows(self.owner, 'jsonl'))
+        self.assertEqual(content, (
+            '{"list": %d, "text": "milk"}\n'
+            '{"list": %d, "text": "bread, \\"white\\""}\n'
+        ) % (self.list_.id, self.list_.id))
+
+    def test_only_exports_the_owners_lists(self):
+        List.create_new(first_item_text='other', owner=User.objects.create())
+        content = ''.join(transfer.export_rows(self.owner, 'csv'))
+        self.assertNotIn('other', content)
+
+    @unittest.mock.patch('lists.transfer.EXPORT_CHUNK_SIZE', 2)
+    def test_yields_chunks(self):
+        Item.objects.create(list=self.list_, text='eggs')
+        chunks = list(transfer.export_rows(self.owner, 'jsonl'))
+        self.assertEqual(len(chunks), 2)
+
+    @unittest.mock.patch('lists.transfer.EXPORT_CHUNK_SIZE', 2)
+    def test_reads_items_in_bounded_batches_across_lists(self):
+        other = List.create_new(first_item_text='eggs', owner=self.owner)
+        Item.objects.create(list=other, text='ham')
+        self.list_.item_set.get(text='bread, "white"').move_after(None)
+
+        with CaptureQueriesContext(connection) as queries:
+            content = ''.join(transfer.export_rows(self.owner, 'jsonl'))
+
+        # Dos bloques completos y uno vacio, cada consulta con LIMIT
+        self.assertEqual(len(queries), 3)
+        for query in queries:
+            self.assertIn('LIMIT 2', query['sql'])
+        texts = [line.split('"text": ')[1] for line in content.splitlines()]
+        self.assertEqual(texts, [
+            '"bread, \\"white\\""}', '"milk"}', '"eggs"}', '"ham"}',
+        ])
+
+class ReadRowsTest(unittest.TestCase):
+    def read(self, content, fmt='csv'):
+        return list(transfer.read_rows(
+            SimpleUploadedFile('lists.' + fmt, content), fmt
+        ))
+
+    def test_rejects_files_not_in_utf8(self):
+        for fmt in transfer.FORMATS:
+            with self.assertRaises(transfer.InvalidFile):
+                self.read('list,text\n1,caf\xe9\n'.encode('latin-1'), fmt)
+
+    def test_rejects_csv_with_null_bytes(self):
+        with self.assertRaises(transfer.InvalidFile):
+            self.read(b'list,text\n1,mi\x00lk\n')
+
+    def test_check_file_leaves_the_upload_readable(self):
+        file = upload('list,text\n1,milk\n')
+        transfer.check_file(file, 'csv')
+        self.assertEqual(
+            list(transfer.read_rows(file, 'csv')), [(2, '1', 'milk')]
+        )
+
+class ImporterTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+
+    def run_import(self, content, fmt='csv'):
+        importer = transfer.Importer(self.owner, ItemForm().fields['text'].clean)
+        return importer.run(transfer.read_rows(upload(content), fmt))
+
+    def test_creates_a_list_per_list_id(self):
+        counts = self.run_import('list,text\n1,milk\n1,bread\n2,eggs\n')
+        self.assertEqual(counts['lists'], 2)
+        self.assertEqual(counts['added'], 3)
+        names = sorted(l.name for l in self.owner.list_set.all())
+        self.assertEqual(names, ['eggs', 'milk'])
+
+    def test_updates_list_summary(self):
+        self.run_import('list,text\n1,milk\n1,bread\n')
+        list_ = self.owner.list_set.get()
+        self.assertEqual(list_.item_count, 2)
+        self.assertEqual(list_.name, 'milk')
+
+    def test_reads_jsonl(self):
+        counts = self.run_import(
+            '{"list": 1, "text": "milk"}\n\n{"list": 1, "text": "bread"}\n',
+            'jsonl',
+        )
+        self.assertEqual(counts['added'], 2)
+
+    def test_skips_duplicates_in_the_same_list(self):
+        counts = self.run_import('list,text\n1,milk\n1,milk\n2,milk\n')
+        self.assertEqual(counts['added'], 2)
+        self.assertEqual(counts['duplicate'], 1)
+
+    @unittest.mock.patch('lists.transfer.IMPORT_BATCH_SIZE', 2)
+    def test_skips_duplicates_across_batches(self):
+        counts = self.run_import('list,text\n1,milk\n1,bread\n1,milk\n1,eggs\n')
+        self.assertEqual(counts, {
+            'lists': 1, 'added': 3, 'duplicate': 1, 'invalid': 0,
+        })
+        self.assertEqual(self.owner.list_set.get().item_count, 3)
+
+    def test_counts_invalid_rows(self):
+        counts = self.run_import(
+            '{"list": 1, "text": ""}\nnot json\n{"text": "x"}\n', 'jsonl'
+        )
+        self.assertEqual(counts['invalid'], 3)
+        self.assertEqual(Item.objects.count(), 0)
+
+    @unittest.mock.patch('lists.transfer.IMPORT_BATCH_SIZE', 2)
+    def test_inserts_each_batch_with_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self.run_import('list,text\n1,a\n1,b\n1,c\n')
+        inserts = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('INSERT INTO "lists_item"')
+        ]
+        self.assertEqual(len(inserts), 2)
+
+    def test_round_trip(self):
+        list_ = List.create_new(first_item_text='milk', owner=self.owner)
+        Item.objects.create(list=list_, text='línea, con "comillas"')
+        for fmt in transfer.FORMATS:
+            content = ''.join(transfer.export_rows(self.owner, fmt))
+            other = User.objects.create(email='%s@b.com' % fmt)
+            importer = transfer.Importer(other, ItemForm().fields['text'].clean)
+            importer.run(transfer.read_rows(upload(content, 'x.' + fmt), fmt))
+            self.assertEqual(
+                list(other.list_set.get().item_set.values_list('text', flat=True)),
+                ['milk', 'línea, con "comillas"'],
+            )
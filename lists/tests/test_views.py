@@ -4,17 +4,25 @@
 # Tests de las vistas de la app 'List'
 
 import unittest
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from lists.models import Item, List
 from lists.forms import ItemForm
 from django.contrib.auth import get_user_model
 
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpRequest
 from lists.views import new_list
+from superlists.querybudget import QueryBudgetTestMixin
 
 User = get_user_model()
 EMPTY_ITEM_ERROR = ItemForm.Meta.error_messages['text']['required']
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
 class HomePageTest(TestCase):
 
     def test_uses_home_template(self):
@@ -25,6 +33,7 @@ class HomePageTest(TestCase):
         response = self.client.get('/')
         self.assertIsInstance(response.context['form'], ItemForm)
 
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
 class ViewListTest(TestCase):
 
     def test_passes_correct_list_to_template(self):
@@ -125,6 +134,384 @@ class ViewListTest(TestCase):
         self.assertTemplateUsed(response, 'list.html')
         self.assertEqual(Item.objects.all().count(), 1)
 
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+@unittest.mock.patch('lists.views.ITEMS_PER_PAGE', 2)
+class ViewListPaginationTest(TestCase):
+    def setUp(self):
+        self.list_ = List.objects.create()
+        self.items = [
+            Item.objects.create(list=self.list_, text='item %d' % i)
+            for i in range(5)
+        ]
+
+    def get(self, **params):
+        return self.client.get('/lists/%d/' % self.list_.id, data=params)
+
+    def cursor(self, index, offset):
+        return '%d.%d' % (self.items[index].id, offset)
+
+    def test_first_page_shows_only_first_items(self):
+        response = self.get()
+        self.assertEqual(response.context['items'], self.items[:2])
+        self.assertNotContains(response, 'item 2')
+
+    def test_first_page_links_to_next_page(self):
+        response = self.get()
+        self.assertIsNone(response.context['previous_cursor'])
+        self.assertContains(response, '?after=%s' % self.cursor(1, 2))
+
+    def test_after_cursor_returns_following_items(self):
+        response = self.get(after=self.cursor(1, 2))
+        self.assertEqual(response.context['items'], self.items[2:4])
+        self.assertEqual(response.context['offset'], 2)
+        self.assertContains(response, '?before=%s' % self.cursor(2, 2))
+        self.assertContains(response, '?after=%s' % self.cursor(3, 4))
+
+    def test_before_cursor_returns_preceding_items(self):
+        response = self.get(before=self.cursor(4, 4))
+        self.assertEqual(response.context['items'], self.items[2:4])
+        self.assertEqual(response.context['offset'], 2)
+        self.assertContains(response, '?before=%s' % self.cursor(2, 2))
+
+    def test_item_counter_continues_across_pages(self):
+        response = self.get(after=self.cursor(3, 4))
+        self.assertContains(response, '<td class="item-counter">5</td>')
+
+    def test_pages_are_numbered_without_counting_items(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(after=self.cursor(1, 2))
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+
+    def test_last_page_has_no_next_link(self):
+        response = self.get(after=self.cursor(3, 4))
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertNotContains(response, '?after=')
+
+    def test_cursor_past_the_end_shows_last_page(self):
+        response = self.get(after=self.cursor(4, 5))
+        self.assertEqual(response.context['items'], self.items[3:])
+        self.assertEqual(response.context['offset'], 3)
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertContains(response, '?before=%s' % self.cursor(3, 3))
+
+    def test_cursor_after_deleted_items_shows_last_page(self):
+        for item in self.items[2:]:
+            item.delete()
+        response = self.get(after=self.cursor(1, 2))
+        self.assertEqual(response.context['items'], self.items[:2])
+        self.assertEqual(response.context['offset'], 0)
+        self.assertIsNone(response.context['previous_cursor'])
+
+    def test_stale_cursor_offset_keeps_next_link(self):
+        # Offset de un cursor creado antes de que se eliminaran items
+        # anteriores
+        response = self.get(after=self.cursor(1, 4))
+        self.assertEqual(response.context['items'], self.items[2:4])
+        self.assertEqual(
+            response.context['next_cursor'], self.cursor(3, 6)
+        )
+
+    def test_forged_cursor_offset_is_bounded(self):
+        response = self.get(after=self.cursor(1, 1000000))
+        self.assertEqual(response.context['offset'], 5)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.get(after='not-a-number')
+        self.assertEqual(response.context['items'], self.items[:2])
+
+    def test_cursor_of_deleted_item_shows_first_page(self):
+        cursor = self.cursor(2, 3)
+        self.items[2].delete()
+        response = self.get(after=cursor)
+        self.assertEqual(response.context['items'], self.items[:2])
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ViewListConditionalGetTest(TestCase):
+    def setUp(self):
+        self.list_ = List.objects.create()
+        Item.objects.create(list=self.list_, text='item 1')
+        self.url = '/lists/%d/' % self.list_.id
+        # La primera visita entrega la cookie CSRF, que es parte del ETag
+        self.client.get(self.url)
+
+    def test_sends_validators(self):
+        response = self.client.get(self.url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_answers_304_without_loading_items_when_etag_matches(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_answers_304_when_not_modified_since(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_item_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Item.objects.create(list=self.list_, text='item 2')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'item 2')
+
+    def test_each_page_has_its_own_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(
+            self.url, {'after': 1}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(User.objects.create(email='a@b.com'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ViewListStreamingTest(TestCase):
+    def setUp(self):
+        self.list_ = List.objects.create()
+        for i in range(5):
+            Item.objects.create(list=self.list_, text='item %d' % i)
+
+    def get_all(self):
+        return self.client.get('/lists/%d/' % self.list_.id, {'all': ''})
+
+    def test_streams_the_response(self):
+        response = self.get_all()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+    def test_shows_every_item_in_order(self):
+        html = b''.join(self.get_all().streaming_content).decode()
+        positions = [html.index('item %d' % i) for i in range(5)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn('<td class="item-counter">5</td><td>item 4</td>', html)
+
+    def test_rows_are_inside_the_list_table(self):
+        html = b''.join(self.get_all().streaming_content).decode()
+        table = html[html.index('<table id="id_list_table"'):]
+        self.assertLess(table.index('item 4'), table.index('</table>'))
+        self.assertIn('id_text', html)
+
+    def test_escapes_item_text(self):
+        Item.objects.create(list=self.list_, text='<b>bold</b>')
+        html = b''.join(self.get_all().streaming_content).decode()
+        self.assertIn('&lt;b&gt;bold&lt;/b&gt;', html)
+
+    @unittest.mock.patch('lists.views.STREAM_CHUNK_SIZE', 2)
+    def test_sends_rows_in_chunks(self):
+        chunks = list(self.get_all().streaming_content)
+        # cabecera, 3 bloques de filas (2, 2 y 1) y el final de la pagina
+        self.assertEqual(len(chunks), 5)
+
+    @unittest.mock.patch('lists.views.STREAM_CHUNK_SIZE', 2)
+    def test_reads_items_in_bounded_batches(self):
+        response = self.get_all()
+        with CaptureQueriesContext(connection) as queries:
+            html = b''.join(response.streaming_content).decode()
+        # Una consulta por bloque, cada una con LIMIT: nunca toda la lista
+        self.assertEqual(len(queries), 3)
+        for query in queries:
+            self.assertIn('LIMIT 2', query['sql'])
+        self.assertIn('<td class="item-counter">5</td><td>item 4</td>', html)
+
+    @unittest.mock.patch('lists.views.STREAM_CHUNK_SIZE', 2)
+    def test_batches_follow_moved_items_order(self):
+        items = list(self.list_.item_set.all())
+        items[4].move_after(None)
+        html = b''.join(self.get_all().streaming_content).decode()
+        positions = [html.index('item %d' % i) for i in (4, 0, 1, 2, 3)]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_answers_304_when_etag_matches(self):
+        self.get_all()
+        etag = self.get_all()['ETag']
+        response = self.client.get(
+            '/lists/%d/' % self.list_.id, {'all': ''}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @unittest.mock.patch('lists.views.ITEMS_PER_PAGE', 2)
+    def test_paginated_page_links_to_all_items(self):
+        response = self.client.get('/lists/%d/' % self.list_.id)
+        self.assertContains(response, 'href="?all"')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ViewListFragmentCacheTest(TestCase):
+    def setUp(self):
+        self.list_ = List.objects.create()
+        Item.objects.create(list=self.list_, text='item 1')
+        self.url = '/lists/%d/' % self.list_.id
+
+    def test_second_view_reuses_cached_table(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'item 1')
+        self.assertTemplateNotUsed(response, 'list_table.html')
+
+    def test_cached_table_is_shared_between_users(self):
+        self.client.get(self.url)
+        self.client.force_login(User.objects.create(email='a@b.com'))
+        response = self.client.get(self.url)
+        self.assertTemplateNotUsed(response, 'list_table.html')
+
+    def test_new_item_invalidates_cached_table(self):
+        self.client.get(self.url)
+        Item.objects.create(list=self.list_, text='item 2')
+
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, 'list_table.html')
+        self.assertContains(response, 'item 2')
+
+    def test_deleted_item_invalidates_cached_table(self):
+        item = Item.objects.create(list=self.list_, text='item 2')
+        self.client.get(self.url)
+        item.delete()
+
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'item 2')
+
+    def test_each_page_is_cached_separately(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, {'after': '1.1'})
+        self.assertTemplateUsed(response, 'list_table.html')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class AddItemViewTest(TestCase):
+    def post(self, list_, text):
+        return self.client.post('/lists/%d/items' % list_.id, data={'text': text})
+
+    def test_saves_item_to_list(self):
+        list_ = List.create_new('first')
+        self.post(list_, 'second')
+        self.assertEqual(list_.item_set.last().text, 'second')
+
+    def test_returns_new_row_as_json(self):
+        list_ = List.create_new('first')
+        response = self.post(list_, 'second')
+        self.assertEqual(response.status_code, 201)
+        item = list_.item_set.last()
+        self.assertEqual(
+            response.json(), {'id': item.id, 'text': 'second', 'counter': 2}
+        )
+
+    def test_returns_validation_errors_as_json(self):
+        list_ = List.create_new('first')
+        response = self.post(list_, '')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'errors': [EMPTY_ITEM_ERROR]})
+
+    def test_returns_duplicate_error_as_json(self):
+        list_ = List.create_new('first')
+        response = self.post(list_, 'first')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {'errors': ["Este item ya existe en tu lista"]}
+        )
+
+    def test_list_page_links_to_add_item_url_on_last_page(self):
+        list_ = List.create_new('first')
+        response = self.client.get('/lists/%d/' % list_.id)
+        self.assertContains(response, 'data-add-item-url="/lists/%d/items"' % list_.id)
+
+    @unittest.mock.patch('lists.views.ITEMS_PER_PAGE', 1)
+    def test_list_page_has_no_add_item_url_before_last_page(self):
+        list_ = List.create_new('first')
+        Item.objects.create(list=list_, text='second')
+        response = self.client.get('/lists/%d/' % list_.id)
+        self.assertNotContains(response, 'data-add-item-url')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class MoveItemViewTest(TestCase):
+    def setUp(self):
+        self.list_ = List.objects.create()
+        self.items = [
+            Item.objects.create(list=self.list_, text='item %d' % i)
+            for i in range(3)
+        ]
+
+    def move(self, item, after):
+        return self.client.post(
+            '/lists/%d/items/%d/move' % (self.list_.id, item.id),
+            data={'after': after},
+        )
+
+    def test_moves_item_after_another(self):
+        response = self.move(self.items[2], self.items[0].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.items[2].id)
+        texts = [item.text for item in self.list_.item_set.all()]
+        self.assertEqual(texts, ['item 0', 'item 2', 'item 1'])
+
+    def test_empty_after_moves_to_the_top(self):
+        self.move(self.items[1], '')
+        self.assertEqual(self.list_.item_set.first(), self.items[1])
+
+    def test_list_page_shows_new_order(self):
+        self.move(self.items[2], '')
+        response = self.client.get('/lists/%d/' % self.list_.id)
+        self.assertEqual(
+            [item.text for item in response.context['items']],
+            ['item 2', 'item 0', 'item 1'],
+        )
+
+    def test_rejects_items_from_other_lists(self):
+        other = Item.objects.create(list=List.objects.create(), text='x')
+        response = self.move(self.items[0], other.id)
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_accepts_post(self):
+        response = self.client.get(
+            '/lists/%d/items/%d/move' % (self.list_.id, self.items[0].id)
+        )
+        self.assertEqual(response.status_code, 405)
+
+class BulkAddItemsViewTest(TestCase):
+    def test_adds_items_to_list(self):
+        list_ = List.objects.create()
+        self.client.post(
+            '/lists/%d/bulk' % list_.id, data={'texts': 'one\ntwo\nthree'}
+        )
+        self.assertEqual(list_.item_set.count(), 3)
+
+    def test_returns_per_line_results_as_json(self):
+        list_ = List.objects.create()
+        Item.objects.create(list=list_, text='two')
+        response = self.client.post(
+            '/lists/%d/bulk' % list_.id, data={'texts': 'one\ntwo'}
+        )
+        data = response.json()
+        self.assertEqual(data['added'], 1)
+        self.assertEqual(
+            [(r['line'], r['status']) for r in data['results']],
+            [(1, 'added'), (2, 'duplicate')]
+        )
+
+    def test_returns_400_without_texts(self):
+        list_ = List.objects.create()
+        response = self.client.post('/lists/%d/bulk' % list_.id)
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_accepts_POST(self):
+        list_ = List.objects.create()
+        response = self.client.get('/lists/%d/bulk' % list_.id)
+        self.assertEqual(response.status_code, 405)
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
 class NewListViewIntegratedTest(TestCase):
     def test_can_save_a_POST_request(self):
         self.client.post('/lists/new', data={'text': 'A new list item'})
@@ -144,6 +531,7 @@ class NewListViewIntegratedTest(TestCase):
         list_ = List.objects.first()
         self.assertEqual(list_.owner, user)
 
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
 class MyListsTest(TestCase):
     def test_my_lists_url_renders_my_lists_template(self):
         User.objects.create(email='a@b.com')
@@ -157,9 +545,283 @@ class MyListsTest(TestCase):
         response = self.client.get('/lists/users/right@owner.com/')
         self.assertEqual(response.context['owner'], correct_owner)
 
+    def test_number_of_queries_does_not_depend_on_number_of_lists(self):
+        owner = User.objects.create(email='a@b.com')
+        for i in range(10):
+            List.create_new(first_item_text='list %d' % i, owner=owner)
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/lists/users/a@b.com/')
+        self.assertContains(response, 'list 9')
+
+    @unittest.mock.patch('lists.views.LISTS_PER_PAGE', 2)
+    def test_pages_lists_with_cursor_links(self):
+        owner = User.objects.create(email='a@b.com')
+        lists = [
+            List.create_new(first_item_text='list %d' % i, owner=owner)
+            for i in range(3)
+        ]
+        response = self.client.get('/lists/users/a@b.com/', {'sort': 'created'})
+        self.assertEqual(list(response.context['lists']), lists[:0:-1])
+        next_cursor = response.context['next_cursor']
+        self.assertContains(
+            response, '?sort=created&amp;after=%s' % next_cursor
+        )
+
+        response = self.client.get(
+            '/lists/users/a@b.com/', {'sort': 'created', 'after': next_cursor}
+        )
+        self.assertEqual(list(response.context['lists']), lists[:1])
+        self.assertContains(response, '?sort=created&amp;before=')
+
+    def test_sorts_by_item_count(self):
+        owner = User.objects.create(email='a@b.com')
+        small = List.create_new(first_item_text='small', owner=owner)
+        big = List.create_new(first_item_text='big', owner=owner)
+        Item.objects.create(list=big, text='more')
+        Item.objects.create(list=small, text='newest')
+
+        response = self.client.get('/lists/users/a@b.com/', {'sort': 'items'})
+        self.assertEqual(list(response.context['lists']), [big, small])
+
+    def test_defaults_to_last_activity(self):
+        owner = User.objects.create(email='a@b.com')
+        old = List.create_new(first_item_text='old', owner=owner)
+        List.create_new(first_item_text='new', owner=owner)
+        Item.objects.create(list=old, text='touch')
+
+        response = self.client.get('/lists/users/a@b.com/', {'sort': 'bogus'})
+        self.assertEqual(response.context['sort'], 'modified')
+        self.assertEqual(response.context['lists'][0], old)
+
+    def test_new_list_invalidates_cached_lists(self):
+        owner = User.objects.create(email='a@b.com')
+        List.create_new(first_item_text='list 1', owner=owner)
+        self.client.get('/lists/users/a@b.com/')
+
+        List.create_new(first_item_text='list 2', owner=owner)
+        response = self.client.get('/lists/users/a@b.com/')
+        self.assertContains(response, 'list 1')
+        self.assertContains(response, 'list 2')
+
+    def test_second_view_reuses_cached_lists(self):
+        owner = User.objects.create(email='a@b.com')
+        List.create_new(first_item_text='list 1', owner=owner)
+        self.client.get('/lists/users/a@b.com/')
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/lists/users/a@b.com/')
+        self.assertContains(response, 'list 1')
+
+    def test_answers_304_when_etag_matches(self):
+        owner = User.objects.create(email='a@b.com')
+        List.create_new(first_item_text='list 1', owner=owner)
+        self.client.get('/lists/users/a@b.com/')  # entrega la cookie CSRF
+        first = self.client.get('/lists/users/a@b.com/')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/lists/users/a@b.com/', HTTP_IF_NONE_MATCH=first['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_new_list_changes_etag(self):
+        owner = User.objects.create(email='a@b.com')
+        List.create_new(first_item_text='list 1', owner=owner)
+        first = self.client.get('/lists/users/a@b.com/')
+
+        List.create_new(first_item_text='list 2', owner=owner)
+        response = self.client.get(
+            '/lists/users/a@b.com/', HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'list 2')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class SearchItemsViewTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+        self.list_ = List.create_new(first_item_text='shopping', owner=self.owner)
+        Item.objects.create(list=self.list_, text='buy milk')
+
+    def test_uses_search_template(self):
+        response = self.client.get('/lists/users/a@b.com/search', {'q': 'milk'})
+        self.assertTemplateUsed(response, 'search.html')
+
+    def test_shows_results_with_links_to_their_lists(self):
+        response = self.client.get('/lists/users/a@b.com/search', {'q': 'milk'})
+        self.assertContains(response, 'buy milk')
+        self.assertContains(response, 'href="%s"' % self.list_.get_absolute_url())
+
+    def test_says_when_nothing_matches(self):
+        response = self.client.get('/lists/users/a@b.com/search', {'q': 'bread'})
+        self.assertContains(response, 'No items match')
+
+    def test_my_lists_has_search_form(self):
+        response = self.client.get('/lists/users/a@b.com/')
+        self.assertContains(response, 'action="/lists/users/a@b.com/search"')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ExportListsViewTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+        self.list_ = List.create_new(first_item_text='milk', owner=self.owner)
+
+    def test_streams_csv_attachment(self):
+        response = self.client.get('/lists/users/a@b.com/export.csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, 'list,text\r\n%d,milk\r\n' % self.list_.id)
+
+    def test_streams_jsonl(self):
+        response = self.client.get('/lists/users/a@b.com/export.jsonl')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(
+            content, '{"list": %d, "text": "milk"}\n' % self.list_.id
+        )
+
+    def test_my_lists_links_to_exports(self):
+        response = self.client.get('/lists/users/a@b.com/')
+        self.assertContains(response, '/lists/users/a@b.com/export.csv')
+        self.assertContains(response, '/lists/users/a@b.com/export.jsonl')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ImportListsViewTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(email='a@b.com')
+        self.client.force_login(self.owner)
+
+    def post(self, content, name='lists.csv'):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(
+            '/lists/users/a@b.com/import', {'file': upload}, follow=True
+        )
+
+    def test_imports_lists_and_redirects_to_my_lists(self):
+        response = self.post('list,text\n1,milk\n1,bread\n')
+        self.assertRedirects(response, '/lists/users/a@b.com/')
+        self.assertEqual(self.owner.list_set.get().item_count, 2)
+        self.assertContains(response, 'Imported 2 items into 1 lists')
+
+    def test_rejects_unknown_formats(self):
+        response = self.post('milk', name='lists.txt')
+        self.assertContains(response, '.csv o .jsonl')
+        self.assertEqual(List.objects.count(), 0)
+
+    def test_rejects_files_not_in_utf8_before_importing(self):
+        content = 'list,text\n1,milk\n' * 2000 + '2,caf\xe9\n'
+        with unittest.mock.patch('lists.transfer.IMPORT_BATCH_SIZE', 10):
+            response = self.post(content.encode('latin-1'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'no esta en UTF-8')
+        self.assertEqual(List.objects.count(), 0)
+
+    def test_rejects_csv_with_null_bytes(self):
+        response = self.post(b'list,text\n1,milk\n2,bre\x00ad\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'no es un CSV valido')
+        self.assertEqual(List.objects.count(), 0)
+
+    def test_error_is_shown_when_revisiting_a_cached_my_lists(self):
+        # La primera respuesta fija la cookie CSRF, que es parte del ETag
+        self.client.get('/lists/users/a@b.com/')
+        page = self.client.get('/lists/users/a@b.com/')
+        upload = SimpleUploadedFile('lists.txt', b'milk')
+        self.client.post('/lists/users/a@b.com/import', {'file': upload})
+
+        response = self.client.get(
+            '/lists/users/a@b.com/', HTTP_IF_NONE_MATCH=page['ETag']
+        )
+        self.assertContains(response, '.csv o .jsonl')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-store', response['Cache-Control'])
+
+        # Ya mostrado el mensaje, la pagina vuelve a ser revalidable
+        response = self.client.get(
+            '/lists/users/a@b.com/', HTTP_IF_NONE_MATCH=page['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_only_the_owner_can_import(self):
+        User.objects.create(email='c@d.com')
+        upload = SimpleUploadedFile('lists.csv', b'list,text\n1,milk\n')
+        response = self.client.post('/lists/users/c@d.com/import', {'file': upload})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(List.objects.count(), 0)
+
+    def test_my_lists_shows_import_form_to_owner(self):
+        response = self.client.get('/lists/users/a@b.com/')
+        self.assertContains(response, 'id="id_import_file"')
+
+    def test_my_lists_hides_import_form_from_others(self):
+        self.client.logout()
+        response = self.client.get('/lists/users/a@b.com/')
+        self.assertNotContains(response, 'id="id_import_file"')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """Las vistas no deben hacer mas consultas a medida que crecen los datos"""
+
+    def setUp(self):
+        self.user = User.objects.create(email='a@b.com')
+        self.client.force_login(self.user)
+
+    def create_lists(self, n_lists, n_items):
+        for i in range(n_lists):
+            list_ = List.create_new('list %d' % i, owner=self.user)
+            for j in range(1, n_items):
+                Item.objects.create(list=list_, text='item %d' % j)
+        return list_
+
+    def test_home_page(self):
+        for n in (1, 10):
+            self.create_lists(n, 1)
+            with self.assertWithinQueryBudget('home'):
+                self.client.get('/')
+
+    def test_view_list(self):
+        for n in (1, 100):
+            list_ = self.create_lists(1, n)
+            with self.assertWithinQueryBudget('view_list'):
+                self.client.get('/lists/%d/' % list_.id)
+            with self.assertWithinQueryBudget('view_list'):
+                self.client.get('/lists/%d/?after=1.1' % list_.id)
+            with self.assertWithinQueryBudget('view_list'):
+                self.client.post('/lists/%d/' % list_.id, data={'text': 'new'})
+            # Item repetido: el INSERT falla y la pagina se vuelve a mostrar
+            with self.assertWithinQueryBudget('view_list'):
+                self.client.post('/lists/%d/' % list_.id, data={'text': 'new'})
+
+    def test_new_list(self):
+        for n in (1, 10):
+            self.create_lists(n, 1)
+            with self.assertWithinQueryBudget('new_list'):
+                self.client.post('/lists/new', data={'text': 'new %d' % n})
+
+    def test_my_lists(self):
+        for n in (1, 50):
+            self.create_lists(n, 2)
+            with self.assertWithinQueryBudget('my_lists'):
+                self.client.get('/lists/users/a@b.com/')
+
+    def test_search_items(self):
+        for n in (1, 50):
+            self.create_lists(n, 2)
+            with self.assertWithinQueryBudget('search_items'):
+                self.client.get('/lists/users/a@b.com/search', {'q': 'item'})
+
 @unittest.mock.patch('lists.views.NewListForm')
 class NewListViewUnitTest(unittest.TestCase):
     def setUp(self):
+        # override_settings solo decora clases de Django
+        static_storage = override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+        static_storage.enable()
+        self.addCleanup(static_storage.disable)
         self.request = HttpRequest()
         self.request.POST['text'] = 'new list item'
         self.request.user = unittest.mock.Mock()
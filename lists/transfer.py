@@ -0,0 +1,230 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Exportacion e importacion de todas las listas de un usuario, en CSV o JSONL
+# (un objeto JSON por linea). Cada fila es un item con el id de su lista:
+#
+#     list,text                 {"list": 12, "text": "Comprar leche"}
+#     12,Comprar leche
+#
+# Ambas direcciones trabajan por partes, sin cargar el archivo completo en
+# memoria.
+
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import Q
+
+from lists.models import Item, List
+from superlists.dbretry import retry_on_busy
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+# Filas por bloque enviado al exportar
+EXPORT_CHUNK_SIZE = 1000
+# Items por INSERT al importar
+IMPORT_BATCH_SIZE = 1000
+
+class _Line:
+    """Archivo falso para csv.writer: entrega lo escrito en vez de guardarlo"""
+    def write(self, value):
+        return value
+
+def export_rows(owner, fmt):
+    """Genera el contenido del archivo de exportacion de las listas de
+    'owner', en bloques de EXPORT_CHUNK_SIZE filas. Cada bloque es una
+    consulta por cursor (keyset) sobre (lista, posicion, id) que lee solo el
+    id de lista y el texto de cada item, asi que nunca hay mas de un bloque
+    en memoria.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        header, format_row = writer.writerow(('list', 'text')), writer.writerow
+    else:
+        header = None
+        def format_row(row):
+            return json.dumps(
+                {'list': row[0], 'text': row[1]}, ensure_ascii=False
+            ) + '\n'
+
+    items = (
+        Item.objects.filter(list__owner=owner)
+        .order_by('list_id', 'position', 'id')
+        .values_list('list_id', 'text', 'position', 'id')
+    )
+    if header:
+        yield header
+    last = None
+    while True:
+        page = items if last is None else items.filter(_following(*last))
+        rows = list(page[:EXPORT_CHUNK_SIZE])
+        if rows:
+            yield ''.join(format_row(row[:2]) for row in rows)
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        list_id, _, position, item_id = rows[-1]
+        last = list_id, position, item_id
+
+def _following(list_id, position, item_id):
+    """Condicion de los items que van despues de (list_id, position, item_id)
+    en la exportacion. La cota sobre list_id permite buscar en el indice.
+    """
+    return Q(list_id__gte=list_id) & (
+        Q(list_id__gt=list_id) |
+        Q(list_id=list_id) & List._following(position, item_id)
+    )
+
+class InvalidFile(Exception):
+    """El archivo subido no se puede leer: no esta en UTF-8 o no es un CSV"""
+
+def read_rows(upload, fmt):
+    """Lee un archivo subido linea a linea.
+
+    Args:
+        upload: archivo subido (UploadedFile)
+        fmt: 'csv' o 'jsonl'
+
+    Returns:
+        Un iterador de (numero de linea, id de lista, texto). Si una linea no
+        se puede interpretar, id de lista y texto son None. Si el archivo no
+        se puede leer, el iterador lanza InvalidFile.
+    """
+    upload.seek(0)
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        yield from _parse_rows(text, fmt)
+    except UnicodeDecodeError:
+        raise InvalidFile("El archivo no esta en UTF-8")
+    except csv.Error as e:
+        raise InvalidFile("El archivo no es un CSV valido: %s" % e)
+    finally:
+        # Sin esto, al descartar 'text' se cerraria tambien el archivo subido
+        text.detach()
+
+def check_file(upload, fmt):
+    """Lee el archivo subido completo, sin guardar nada, para rechazarlo
+    antes de importar la primera fila.
+
+    Raises:
+        InvalidFile: si el archivo no se puede leer
+    """
+    for _ in read_rows(upload, fmt):
+        pass
+
+def _parse_rows(text, fmt):
+    if fmt == 'csv':
+        reader = csv.reader(text)
+        next(reader, None)  # encabezado
+        for row in reader:
+            if not row:
+                continue
+            if len(row) == 2:
+                yield reader.line_num, row[0], row[1]
+            else:
+                yield reader.line_num, None, None
+    else:
+        for lineno, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                yield lineno, str(data['list']), data['text']
+            except (ValueError, KeyError, TypeError):
+                yield lineno, None, None
+
+class Importer:
+    """Importa filas de 'read_rows' como listas nuevas de 'owner'. Cada id de
+    lista del archivo se convierte en una lista nueva; las filas de una misma
+    lista no necesitan estar juntas.
+
+    Los items se guardan con bulk_create en bloques de IMPORT_BATCH_SIZE.
+    Los repetidos dentro de una lista se descartan antes de insertar, con
+    una sola consulta por bloque, igual que en <BulkItemForm>.
+    """
+    def __init__(self, owner, validate):
+        """
+        Args:
+            owner: usuario duenno de las listas importadas
+            validate: funcion que valida y limpia el texto de un item;
+                lanza ValidationError si no es valido
+        """
+        self.owner = owner
+        self.validate = validate
+        self.lists = {}
+        self.batch = []
+        self.counts = {'lists': 0, 'added': 0, 'duplicate': 0, 'invalid': 0}
+
+    def run(self, rows):
+        """Importa 'rows' y entrega la cantidad de listas creadas y de items
+        agregados, duplicados e invalidos
+        """
+        for lineno, key, text in rows:
+            try:
+                if key is None:
+                    raise ValidationError('Linea %d mal formada' % lineno)
+                text = self.validate(text)
+            except ValidationError:
+                self.counts['invalid'] += 1
+                continue
+            self.batch.append((key, text))
+            if len(self.batch) >= IMPORT_BATCH_SIZE:
+                self.flush()
+        self.flush()
+        return self.counts
+
+    @retry_on_busy
+    def flush(self):
+        if not self.batch:
+            return
+        # Si la transaccion falla no debe quedar rastro de ella en el
+        # importador, para que el reintento empiece desde cero
+        lists = dict(self.lists)
+        with transaction.atomic():
+            for key, _ in self.batch:
+                if key not in lists:
+                    lists[key] = List.objects.create(owner=self.owner)
+
+            new_items, duplicates = self._new_items(lists)
+            added = {}
+            for item in new_items:
+                added.setdefault(item.list, []).append(item)
+            for list_, items in added.items():
+                positions = list_.next_positions(len(items))
+                for item, position in zip(items, positions):
+                    item.position = position
+            Item.objects.bulk_create(new_items)
+            for list_, items in added.items():
+                list_.items_added([item.text for item in items])
+
+        self.counts['lists'] += len(lists) - len(self.lists)
+        self.counts['added'] += len(new_items)
+        self.counts['duplicate'] += duplicates
+        self.lists = lists
+        self.batch = []
+
+    def _new_items(self, lists):
+        hashed = [
+            (lists[key], text, Item.hash_text(text)) for key, text in self.batch
+        ]
+        items = Item.objects.db_manager(router.db_for_write(Item))
+        existing = set(
+            items.filter(
+                list__in={list_.id for list_, _, _ in hashed},
+                text_hash__in={text_hash for _, _, text_hash in hashed},
+            ).values_list('list_id', 'text_hash')
+        )
+        new_items = []
+        for list_, text, text_hash in hashed:
+            if (list_.id, text_hash) not in existing:
+                existing.add((list_.id, text_hash))
+                new_items.append(
+                    Item(list=list_, text=text, text_hash=text_hash)
+                )
+        return new_items, len(hashed) - len(new_items)
@@ -20,5 +20,11 @@ from lists import views
 urlpatterns = [
     url(r'^new$', views.new_list, name='new_list'),
     url(r'^(\d+)/$', views.view_list, name='view_list'),
+    url(r'^(\d+)/items$', views.add_item, name='add_item'),
+    url(r'^(\d+)/items/(\d+)/move$', views.move_item, name='move_item'),
+    url(r'^(\d+)/bulk$', views.bulk_add_items, name='bulk_add_items'),
     url(r'^users/(.+)/$', views.my_lists, name='my_lists'),
+    url(r'^users/(.+)/search$', views.search_items, name='search_items'),
+    url(r'^users/(.+)/export\.(csv|jsonl)$', views.export_lists, name='export_lists'),
+    url(r'^users/(.+)/import$', views.import_lists, name='import_lists'),
 ]
@@ -1,17 +1,190 @@
+import hashlib
+import itertools
+
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.core.urlresolvers import reverse
+from django.contrib import messages
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.html import format_html
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_POST
 from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
 
 from lists.models import Item, List
-from lists.forms import ItemForm, NewListForm, ExistingListItemForm
+from lists import search, transfer
+from lists.forms import (
+    ItemForm, NewListForm, ExistingListItemForm, BulkItemForm, ImportListsForm
+)
+from superlists import fragments
 
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+ITEMS_PER_PAGE = 50
+
+LISTS_PER_PAGE = 50
+DEFAULT_LISTS_SORT = 'modified'
+# Ordenes de my_lists, con el texto de su enlace
+LISTS_SORTS = (
+    ('modified', 'Last activity'),
+    ('created', 'Newest'),
+    ('items', 'Most items'),
+)
+
+# Vista con todos los items (?all): filas por bloque enviado al cliente
+STREAM_CHUNK_SIZE = 500
+STREAM_ROW = '<tr><td class="item-counter">{}</td><td>{}</td></tr>\n'
+STREAM_MARKER = '<!-- superlists:item-rows -->'
+
+def _cursor(request, name, list_):
+    """Cursor 'name' de la query string para 'List.items_page'. El offset lo
+    entrega el cliente y solo numera los items: se acota a la cantidad de
+    items de 'list_', para que cursores inventados no creen una entrada
+    distinta en la cache de fragmentos por cada offset.
+    """
+    cursor = List.parse_item_cursor(request.GET.get(name))
+    if cursor is None:
+        return None
+    item_id, offset = cursor
+    return item_id, min(offset, list_.item_count)
+
+def _etag(request, *version):
+    """ETag de una pagina. Ademas de 'version' depende de quien la ve: el
+    usuario, su token CSRF (incluido en los formularios) y la query string.
+    """
+    user = request.user.pk if request.user.is_authenticated else ''
+    parts = version + (
+        user,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        request.GET.urlencode(),
+    )
+    key = ':'.join(str(part) for part in parts)
+    return '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest()
+
+def _conditional_response(request, etag, last_modified, respond):
+    """Responde 304 si el cliente ya tiene esta version de la pagina; si no,
+    entrega la respuesta de 'respond' con ETag y Last-Modified. Si hay
+    mensajes pendientes para el usuario siempre entrega la respuesta.
+
+    Args:
+        respond: funcion sin argumentos que entrega la respuesta. Solo se
+            llama si el cliente no tiene la pagina.
+    """
+    if len(messages.get_messages(request)):
+        # La pagina muestra mensajes pendientes, que se muestran una sola
+        # vez: no se responde 304 ni se entregan validadores, para que el
+        # navegador no guarde ni reutilice esta version
+        response = respond()
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+    # HTTP solo tiene precision de segundos
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    if response is None:
+        response = respond()
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, private=True, max_age=0)
+    return response
+
+def _conditional_render(request, etag, last_modified, template, context):
+    """Como '_conditional_response', renderizando 'template'.
+
+    Args:
+        context: funcion que entrega el contexto del template. Solo se
+            llama si hay que renderizar.
+    """
+    return _conditional_response(
+        request, etag, last_modified,
+        lambda: render(request, template, context()),
+    )
+
+def _stream_rows(list_):
+    """Genera las filas de la tabla de items de 'list_' en bloques de
+    STREAM_CHUNK_SIZE filas. Cada bloque es una consulta por cursor (keyset)
+    sobre (position, id) que lee solo los textos, sin crear instancias de
+    Item; asi nunca hay mas de un bloque en memoria.
+    """
+    items = list_.item_set.values_list('position', 'id', 'text')
+    counter, last = 0, None
+    while True:
+        page = items if last is None else items.filter(List._following(*last))
+        rows = list(page[:STREAM_CHUNK_SIZE])
+        if not rows:
+            return
+        yield ''.join(
+            format_html(STREAM_ROW, counter + n, text)
+            for n, (_, _, text) in enumerate(rows, 1)
+        )
+        if len(rows) < STREAM_CHUNK_SIZE:
+            return
+        counter += len(rows)
+        last = rows[-1][:2]
+
+def _stream_list_page(request, list_):
+    """Pagina con todos los items de 'list_'. El resto de la pagina se
+    renderiza de inmediato y las filas de la tabla se envian a medida que se
+    leen de la base de datos.
+    """
+    table = format_html(
+        '<table id="id_list_table" class="table" data-add-item-url="{}">'
+        '{}</table>',
+        reverse('add_item', args=[list_.id]), mark_safe(STREAM_MARKER),
+    )
+    page = render_to_string(
+        'list.html', {'list': list_, 'form': ItemForm(), 'table': table},
+        request,
+    )
+    head, tail = page.split(STREAM_MARKER, 1)
+    return StreamingHttpResponse(
+        itertools.chain([head], _stream_rows(list_), [tail])
+    )
+
+def _list_table_context(list_, after, before):
+    items, offset, has_previous, has_next = list_.items_page(
+        ITEMS_PER_PAGE, after=after, before=before
+    )
+    end = offset + len(items)
+    return {
+        'list': list_,
+        'items': items,
+        'offset': offset,
+        'previous_cursor':
+            List.item_cursor(items[0], offset) if has_previous else None,
+        'next_cursor': List.item_cursor(items[-1], end) if has_next else None,
+    }
+
+def _list_page_context(request, list_, form):
+    after = _cursor(request, 'after', list_)
+    before = _cursor(request, 'before', list_)
+    # item_count y modified cambian con cada item que se agrega o elimina
+    key = fragments.fragment_key(
+        'list_table', list_.id, list_.item_count, list_.modified.timestamp(),
+        after, before,
+    )
+    return {
+        'list': list_,
+        'form': form,
+        'table': fragments.render_fragment(
+            'list_table.html', key,
+            lambda: _list_table_context(list_, after, before),
+        ),
+    }
+
 def home_page(request):
     return render(request, 'home.html', {'form': ItemForm()})
 
-# GET /lists/{id}/
+# GET /lists/{id}/[?after={cursor}|?before={cursor}|?all]
 # POST /lists/{id}/
 def view_list(request, list_id):
     list_ = List.objects.get(id=list_id)
@@ -19,11 +192,69 @@ def view_list(request, list_id):
 
     if request.method == 'POST':
         form = ItemForm(data=request.POST, for_list=list_)
-        if form.is_valid():
-            form.save()
+        if form.is_valid() and form.save() is not None:
             return redirect(list_)
 
-    return render(request, 'list.html', {'list': list_, 'form': form})
+        return render(
+            request, 'list.html', _list_page_context(request, list_, form)
+        )
+
+    etag = _etag(
+        request, list_.id, list_.item_count, list_.modified.timestamp()
+    )
+    if 'all' in request.GET:
+        return _conditional_response(
+            request, etag, list_.modified,
+            lambda: _stream_list_page(request, list_),
+        )
+    return _conditional_render(
+        request, etag, list_.modified, 'list.html',
+        lambda: _list_page_context(request, list_, form),
+    )
+
+# POST /lists/{id}/items
+@require_POST
+def add_item(request, list_id):
+    list_ = List.objects.get(id=list_id)
+    form = ItemForm(data=request.POST, for_list=list_)
+    if form.is_valid() and form.save() is not None:
+        item = form.instance
+        return JsonResponse(
+            {'id': item.id, 'text': item.text, 'counter': list_.item_count},
+            status=201,
+        )
+    return JsonResponse({'errors': list(form.errors['text'])}, status=400)
+
+# POST /lists/{id}/items/{item_id}/move
+#   after={item_id}: deja el item despues de ese item; vacio, al comienzo
+@require_POST
+def move_item(request, list_id, item_id):
+    list_ = List.objects.get(id=list_id)
+    item = list_.item_set.get(id=item_id)
+    after = None
+    if request.POST.get('after'):
+        try:
+            after = list_.item_set.get(id=int(request.POST['after']))
+        except (ValueError, Item.DoesNotExist):
+            return JsonResponse(
+                {'errors': ['El item no pertenece a la lista']}, status=400
+            )
+    item.move_after(after)
+    return JsonResponse({'id': item.id, 'position': item.position})
+
+# POST /lists/{id}/bulk
+@require_POST
+def bulk_add_items(request, list_id):
+    list_ = List.objects.get(id=list_id)
+    form = BulkItemForm(data=request.POST, for_list=list_)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    results = form.save()
+    return JsonResponse({
+        'added': sum(1 for r in results if r['status'] == 'added'),
+        'results': results,
+    })
 
 def new_list(request):
     form = NewListForm(data=request.POST)
@@ -33,7 +264,86 @@ def new_list(request):
         return redirect(list_)
     return render(request, 'home.html', {'form': form})
 
-# GET /lists/users/{email}/
+def _my_lists_context(owner, sort, after, before):
+    lists, has_previous, has_next = List.owner_page(
+        owner, sort, LISTS_PER_PAGE, after=after, before=before
+    )
+    return {
+        'lists': lists,
+        'sort': sort,
+        'sorts': LISTS_SORTS,
+        'previous_cursor': lists[0].cursor(sort) if has_previous and lists else None,
+        'next_cursor': lists[-1].cursor(sort) if has_next else None,
+    }
+
+# GET /lists/users/{email}/[?sort={created|modified|items}][&after={cursor}|&before={cursor}]
 def my_lists(request, email):
     owner = User.objects.get(email=email)
-    return render(request, 'my_lists.html', {'owner': owner})
+    summary = owner.list_set.aggregate(
+        last_modified=Max('modified'), count=Count('id')
+    )
+    last_modified = summary['last_modified']
+    version = (
+        owner.pk, summary['count'],
+        last_modified.timestamp() if last_modified else '',
+    )
+    sort = request.GET.get('sort')
+    if sort not in List.SORT_FIELDS:
+        sort = DEFAULT_LISTS_SORT
+    after = List.parse_cursor(sort, request.GET.get('after'))
+    before = List.parse_cursor(sort, request.GET.get('before'))
+    return _conditional_render(
+        request,
+        _etag(request, *version),
+        last_modified,
+        'my_lists.html',
+        lambda: {
+            'owner': owner,
+            'lists': fragments.render_fragment(
+                'my_lists_table.html',
+                fragments.fragment_key('my_lists', *version, sort, after, before),
+                lambda: _my_lists_context(owner, sort, after, before),
+            ),
+        },
+    )
+
+# GET /lists/users/{email}/search?q={texto}
+def search_items(request, email):
+    owner = User.objects.get(email=email)
+    query = request.GET.get('q', '')
+    return render(request, 'search.html', {
+        'owner': owner,
+        'query': query,
+        'results': search.search_items(owner, query),
+    })
+
+# GET /lists/users/{email}/export.{csv|jsonl}
+def export_lists(request, email, fmt):
+    owner = User.objects.get(email=email)
+    response = StreamingHttpResponse(
+        transfer.export_rows(owner, fmt),
+        content_type=transfer.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = (
+        'attachment; filename="superlists.%s"' % fmt
+    )
+    return response
+
+# POST /lists/users/{email}/import
+@require_POST
+def import_lists(request, email):
+    owner = User.objects.get(email=email)
+    if request.user != owner:
+        return HttpResponseForbidden()
+
+    form = ImportListsForm(data=request.POST, files=request.FILES)
+    if form.is_valid():
+        counts = form.save(owner)
+        messages.success(
+            request,
+            "Imported %(added)d items into %(lists)d lists "
+            "(%(duplicate)d duplicated, %(invalid)d invalid)." % counts
+        )
+    else:
+        messages.error(request, form.errors['file'][0])
+    return redirect('my_lists', email)
@@ -0,0 +1,28 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Backend SQLite para produccion: igual al de Django, pero ejecuta los PRAGMA
+# de OPTIONS['pragmas'] en cada conexion nueva (WAL, synchronous=NORMAL,
+# mmap, busy timeout, cache de paginas...). Se usa con
+# ENGINE = 'superlists.backends.sqlite3'.
+
+from django.db.backends.sqlite3 import base
+
+def apply_pragmas(conn, pragmas):
+    """Ejecuta 'PRAGMA nombre = valor' para cada elemento de 'pragmas' en la
+    conexion sqlite3 'conn'
+    """
+    for name, value in pragmas.items():
+        conn.execute('PRAGMA %s = %s' % (name, value))
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Lecturas a replicas, escrituras a la base de datos principal.
+#
+# Los modelos de las apps 'lists' y 'accounts' se leen desde una de las
+# DATABASE_REPLICAS. Luego de una escritura, las lecturas de esa peticion y
+# las de las peticiones del mismo cliente durante REPLICA_PIN_SECONDS van a
+# la principal ('default'), para que el redirect despues de un POST muestre
+# lo recien escrito aunque la replica aun no lo tenga. Las lecturas que deciden
+# una escritura (p. ej. la posicion de un item nuevo) usan db_for_write, que
+# tambien fija la peticion a la principal.
+
+import random
+import threading
+import time
+
+from django.conf import settings
+
+ROUTED_APPS = ('lists', 'accounts')
+PIN_COOKIE = 'pin_primary'
+
+_state = threading.local()
+
+def pin_to_primary():
+    _state.pinned = True
+    _state.wrote = True
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        if getattr(_state, 'pinned', False) or not settings.DATABASE_REPLICAS:
+            return 'default'
+        # Lo relacionado con un objeto leido o guardado en la principal
+        # (p. ej. los items de una lista recien creada) se lee de ella
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == 'default':
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        pin_to_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las replicas son copias de la principal
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+class ReplicaPinningMiddleware:
+    """Envia a la base de datos principal las lecturas de los clientes que
+    escribieron hace menos de REPLICA_PIN_SECONDS
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        _state.pinned = pinned_until > time.time()
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.pinned = _state.wrote = False
+
+        if wrote:
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+            )
+        return response
@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Reintento de escrituras cuando SQLite responde "database is locked".
+
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+def is_busy_error(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+def retry_on_busy(func):
+    """Decorador. Reintenta 'func' hasta DB_BUSY_RETRIES veces, con espera
+    exponencial y aleatoria, si la base de datos esta bloqueada por otro
+    escritor.
+
+    Solo reintenta cuando no hay una transaccion en curso: dentro de un
+    bloque 'atomic' externo el error se propaga, porque la transaccion ya no
+    se puede continuar.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                attempt += 1
+                if (not is_busy_error(e) or connection.in_atomic_block or
+                        attempt > settings.DB_BUSY_RETRIES):
+                    raise
+                delay = settings.DB_BUSY_RETRY_DELAY * 2 ** (attempt - 1)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+    return wrapper
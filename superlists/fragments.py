@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Cache de fragmentos de templates con version.
+#
+# La clave de cada fragmento incluye la version de los datos que muestra (por
+# ejemplo la cantidad de items y la fecha de modificacion de una lista). Las
+# escrituras de items y listas ya mantienen esos datos al dia, asi que un
+# cambio produce una clave nueva y las entradas antiguas simplemente dejan de
+# usarse hasta que el cache las descarta.
+#
+# Para que una lista muy visitada no se renderice muchas veces a la vez
+# cuando cambia, solo quien obtiene el candado del fragmento lo renderiza; el
+# resto espera a que aparezca en el cache.
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from superlists import metrics
+
+def fragment_key(name, *version):
+    """Clave del fragmento 'name' para la version indicada"""
+    raw = ':'.join(str(part) for part in version)
+    return 'fragment:%s:%s' % (name, hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+def get_or_render(key, render):
+    """Entrega el fragmento guardado bajo 'key' o lo genera con 'render'.
+
+    Si otro proceso o hilo ya esta generando el mismo fragmento, espera hasta
+    FRAGMENT_CACHE_LOCK_WAIT segundos a que termine. Si no termina a tiempo,
+    lo genera por su cuenta.
+
+    Args:
+        key: clave del fragmento, ver 'fragment_key'
+        render: funcion sin argumentos que entrega el html del fragmento
+
+    Returns:
+        El html del fragmento, marcado como seguro.
+    """
+    cache = caches[settings.FRAGMENT_CACHE_ALIAS]
+    html = cache.get(key)
+    if html is not None:
+        metrics.inc('fragment_cache_requests_total', result='hit')
+        return mark_safe(html)
+
+    lock = key + ':lock'
+    if not cache.add(lock, 1, settings.FRAGMENT_CACHE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + settings.FRAGMENT_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(settings.FRAGMENT_CACHE_POLL_INTERVAL)
+            html = cache.get(key)
+            if html is not None:
+                metrics.inc('fragment_cache_requests_total', result='wait')
+                return mark_safe(html)
+        metrics.inc('fragment_cache_requests_total', result='timeout')
+        return mark_safe(render())
+
+    metrics.inc('fragment_cache_requests_total', result='miss')
+    try:
+        html = str(render())
+        cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return mark_safe(html)
+
+def render_fragment(template, key, context):
+    """Renderiza 'template' como fragmento cacheado bajo 'key'. El fragmento
+    se renderiza sin la peticion, porque lo comparten todos los usuarios.
+
+    Args:
+        context: funcion que entrega el contexto del template. Solo se
+            llama si el fragmento no esta en el cache.
+    """
+    return get_or_render(key, lambda: render_to_string(template, context()))
@@ -0,0 +1,340 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Metricas de la aplicacion: contadores e histogramas con etiquetas.
+#
+# Cada proceso acumula sus metricas en memoria y, si METRICS_DIR esta
+# definido, las escribe periodicamente en un archivo propio dentro de ese
+# directorio, 'metrics-<pid>-<id del proceso>.json'; el id evita que un
+# proceso nuevo con un pid reutilizado reemplace el archivo de otro. La vista
+# 'metrics_view' suma los archivos de todos los procesos y los expone en
+# formato de texto (el de Prometheus) al scraper que envie el token
+# METRICS_TOKEN.
+#
+# Los archivos de procesos terminados no se acumulan: al salir, cada proceso
+# suma sus metricas a 'metrics-archive.json' y borra su archivo, para que
+# los contadores no retrocedan. Si el proceso murio sin salir (SIGKILL),
+# 'metrics_view' detecta que su pid ya no existe y hace lo mismo por el.
+# Borrar METRICS_DIR con el servidor detenido reinicia todas las metricas.
+
+from collections import defaultdict
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from superlists import querybudget
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Archivos de METRICS_DIR: uno por proceso vivo y el de los terminados
+PROCESS_FILE = re.compile(r'^metrics-(\d+)-\w+\.json$')
+ARCHIVE_FILE = 'metrics-archive.json'
+
+class Registry:
+    """Metricas de un proceso. Si el proceso se bifurca (fork), el hijo
+    empieza con metricas vacias.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.process_id = uuid.uuid4().hex[:12]
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.last_flush = time.monotonic()
+
+    def _check_fork(self):
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self.counters[key] += value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            if key not in self.histograms:
+                self.histograms[key] = {
+                    'buckets': list(buckets),
+                    'counts': [0] * len(buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            histogram = self.histograms[key]
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'counters': [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, dict(labels), dict(histogram)]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def flush(self):
+        """Escribe las metricas del proceso en su archivo, reemplazandolo de
+        forma atomica
+        """
+        self.last_flush = time.monotonic()
+        if not settings.METRICS_DIR:
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        _write(self.path(), self.snapshot())
+
+    def path(self):
+        """Archivo de las metricas del proceso en METRICS_DIR"""
+        with self._lock:
+            self._check_fork()
+            return os.path.join(
+                settings.METRICS_DIR,
+                'metrics-%d-%s.json' % (self.pid, self.process_id),
+            )
+
+    def retire(self):
+        """Pasa las metricas del proceso al archivo de procesos terminados"""
+        if settings.METRICS_DIR:
+            self.flush()
+            archive(self.path())
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+@atexit.register
+def _retire_at_exit():
+    try:
+        registry.retire()
+    except OSError:
+        pass
+
+def _write(path, snapshot):
+    """Escribe 'snapshot' en 'path', reemplazandolo de forma atomica"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+def _read(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def archive(path):
+    """Suma las metricas de 'path' (un proceso terminado) al archivo de
+    procesos terminados y borra 'path'. Un candado sobre METRICS_DIR evita
+    que dos procesos archiven a la vez.
+    """
+    with open(os.path.join(settings.METRICS_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            snapshot = _read(path)
+        except FileNotFoundError:
+            # Otro proceso ya lo archivo
+            return
+        except ValueError:
+            snapshot = None
+        archive_path = os.path.join(settings.METRICS_DIR, ARCHIVE_FILE)
+        if snapshot is not None:
+            snapshots = [snapshot]
+            if os.path.exists(archive_path):
+                snapshots.append(_read(archive_path))
+            _write(archive_path, as_snapshot(*merge(snapshots)))
+        os.remove(path)
+
+def merge(snapshots):
+    """Suma varios 'Registry.snapshot'.
+
+    Returns:
+        Una tupla (contadores, histogramas): diccionarios con llave
+        (nombre, etiquetas).
+    """
+    counters = defaultdict(float)
+    histograms = {}
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            counters[(name, tuple(sorted(labels.items())))] += value
+        for name, labels, histogram in data['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            if key not in histograms:
+                histograms[key] = {
+                    'buckets': histogram['buckets'],
+                    'counts': [0] * len(histogram['buckets']),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            merged = histograms[key]
+            merged['counts'] = [
+                a + b for a, b in zip(merged['counts'], histogram['counts'])
+            ]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms
+
+def as_snapshot(counters, histograms):
+    """Convierte el resultado de 'merge' al formato de 'Registry.snapshot'"""
+    return {
+        'counters': [
+            [name, dict(labels), value]
+            for (name, labels), value in counters.items()
+        ],
+        'histograms': [
+            [name, dict(labels), histogram]
+            for (name, labels), histogram in histograms.items()
+        ],
+    }
+
+def read_snapshots():
+    """Metricas escritas en METRICS_DIR por cada proceso y por los procesos
+    terminados. Antes de leerlas archiva los archivos de procesos que ya no
+    existen.
+    """
+    for filename in os.listdir(settings.METRICS_DIR):
+        match = PROCESS_FILE.match(filename)
+        if match and not _alive(int(match.group(1))):
+            archive(os.path.join(settings.METRICS_DIR, filename))
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not PROCESS_FILE.match(filename) and filename != ARCHIVE_FILE:
+            continue
+        try:
+            yield _read(os.path.join(settings.METRICS_DIR, filename))
+        except (IOError, ValueError):
+            continue
+
+def collect():
+    """Suma las metricas de todos los procesos, o solo las de este proceso si
+    no hay METRICS_DIR
+    """
+    if not settings.METRICS_DIR:
+        return merge([registry.snapshot()])
+    registry.flush()
+    return merge(read_snapshots())
+
+def format_labels(labels, **extra):
+    labels = list(labels) + sorted(extra.items())
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in labels
+    )
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+def render_text():
+    """Metricas de todos los procesos en formato de texto de Prometheus"""
+    counters, histograms = collect()
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append('# TYPE %s counter' % name)
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append('%s%s %s' % (name, format_labels(labels), format_value(value)))
+    for name in sorted({name for name, _ in histograms}):
+        lines.append('# TYPE %s histogram' % name)
+        for (n, labels), histogram in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                lines.append('%s_bucket%s %d' % (
+                    name, format_labels(labels, le=format_value(bound)), count
+                ))
+            lines.append('%s_bucket%s %d' % (
+                name, format_labels(labels, le='+Inf'), histogram['count']
+            ))
+            lines.append('%s_sum%s %s' % (
+                name, format_labels(labels), format_value(histogram['sum'])
+            ))
+            lines.append('%s_count%s %d' % (
+                name, format_labels(labels), histogram['count']
+            ))
+    return '\n'.join(lines) + '\n'
+
+class MetricsMiddleware:
+    """Registra la latencia, el resultado y las consultas de cada peticion,
+    por nombre de url. Las consultas se cuentan desde que se resuelve la
+    vista, en todas las vistas, tengan o no presupuesto en QUERY_BUDGETS.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_query_counters = querybudget.start_counting()
+        return None
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            counters = getattr(request, 'metrics_query_counters', None)
+            if counters is not None:
+                query_count, query_time = querybudget.stop_counting(counters)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.url_name if match is not None else 'unknown'
+        observe('http_request_duration_seconds', duration, view=view)
+        inc('http_requests_total', view=view, status=response.status_code)
+        if counters is not None:
+            inc('db_queries_total', query_count, view=view)
+            inc('db_query_seconds_total', query_time, view=view)
+
+        registry.maybe_flush()
+        return response
+
+def _authorized(request):
+    """La peticion trae el token METRICS_TOKEN como 'Bearer'"""
+    if not settings.METRICS_TOKEN:
+        return False
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode(), settings.METRICS_TOKEN.encode()
+    )
+
+# GET /metrics
+#   Authorization: Bearer {METRICS_TOKEN}
+def metrics_view(request):
+    if not _authorized(request):
+        raise Http404
+    return HttpResponse(
+        render_text(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Perfilado de peticiones en produccion, opcional. Se perfila con cProfile
+# una fraccion PROFILING_SAMPLE_RATE de las peticiones, y toda peticion que
+# traiga la cabecera X-Profile-Token con un token firmado (ver
+# 'make_profile_token' y el comando 'profile_token').
+#
+# Los resultados se guardan en PROFILING_DIR, un directorio por vista, y se
+# conservan los PROFILING_MAX_FILES mas recientes de cada una. El comando
+# 'profile_report' los agrega.
+
+import cProfile
+import os
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'superlists.profiling'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+def make_profile_token():
+    """Token firmado que habilita el perfilado de una peticion durante
+    PROFILING_TOKEN_MAX_AGE segundos
+    """
+    return signing.dumps('profile', salt=TOKEN_SALT)
+
+def has_valid_token(request):
+    token = request.META.get(TOKEN_HEADER)
+    if not token:
+        return False
+    try:
+        signing.loads(
+            token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+def view_name(func):
+    """Nombre con modulo de la funcion de una vista, por ejemplo
+    'lists.views.view_list'. Las vistas que no tienen __qualname__ (p. ej.
+    functools.partial) se nombran por su clase.
+    """
+    if not hasattr(func, '__qualname__'):
+        func = func.__class__
+    return '%s.%s' % (func.__module__, func.__qualname__)
+
+def view_dir(view_path):
+    return os.path.join(settings.PROFILING_DIR, view_path)
+
+def save_profile(profiler, view_path):
+    """Guarda el perfil en el directorio de la vista y elimina los mas
+    antiguos si hay mas de PROFILING_MAX_FILES
+    """
+    directory = view_dir(view_path)
+    os.makedirs(directory, exist_ok=True)
+    name = '%d-%d-%s.prof' % (time.time() * 1000, os.getpid(), uuid.uuid4().hex[:8])
+    profiler.dump_stats(os.path.join(directory, name))
+
+    dumps = sorted(f for f in os.listdir(directory) if f.endswith('.prof'))
+    for old in dumps[:-settings.PROFILING_MAX_FILES]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except FileNotFoundError:
+            pass
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        return (
+            random.random() < settings.PROFILING_SAMPLE_RATE or
+            has_valid_token(request)
+        )
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        match = request.resolver_match
+        if match is not None:
+            save_profile(profiler, view_name(match.func))
+        return response
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Presupuesto de consultas por vista. QUERY_BUDGETS asocia el nombre de una
+# url a la cantidad maxima de consultas SQL que puede hacer su vista.
+#
+# 'QueryBudgetMiddleware' mide las consultas y el tiempo de base de datos de
+# esas vistas y registra las peticiones que se pasan del presupuesto.
+# 'QueryBudgetTestMixin' permite exigir el presupuesto en los tests.
+
+from contextlib import contextmanager
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+class QueryCounter:
+    """Cuenta las consultas de una conexion, y el tiempo que toman, mientras
+    esta activo. Envuelve los cursores que crea la conexion: no depende de
+    'queries_log', que es una cola de largo maximo y solo se llena con
+    force_debug_cursor.
+
+    Args:
+        connection: conexion (DatabaseWrapper) cuyas consultas se cuentan
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.count = 0
+        self.time = 0.0
+
+    def __enter__(self):
+        connection = self.connection
+        # Lo que habia antes en la instancia (p. ej. otro contador activo),
+        # para restaurarlo al salir: los contadores se pueden anidar
+        self._previous = {
+            name: connection.__dict__.get(name)
+            for name in ('make_cursor', 'make_debug_cursor')
+        }
+        make_cursor = connection.make_cursor
+        make_debug_cursor = connection.make_debug_cursor
+        connection.make_cursor = lambda cursor: _CountingCursor(
+            make_cursor(cursor), connection, self
+        )
+        connection.make_debug_cursor = lambda cursor: _CountingCursor(
+            make_debug_cursor(cursor), connection, self
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, previous in self._previous.items():
+            if previous is None:
+                delattr(self.connection, name)
+            else:
+                setattr(self.connection, name, previous)
+
+    def add(self, duration):
+        self.count += 1
+        self.time += duration
+
+class _CountingCursor(CursorWrapper):
+    def __init__(self, cursor, db, counter):
+        super().__init__(cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=None):
+        start = time.monotonic()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self.counter.add(time.monotonic() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.monotonic()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            self.counter.add(time.monotonic() - start)
+
+def start_counting():
+    """Empieza a contar las consultas de todas las conexiones
+
+    Returns:
+        La lista de 'QueryCounter' activos, para 'stop_counting'.
+    """
+    counters = []
+    for connection in connections.all():
+        counter = QueryCounter(connection)
+        counter.__enter__()
+        counters.append(counter)
+    return counters
+
+def stop_counting(counters):
+    """Detiene los contadores de 'start_counting'
+
+    Returns:
+        Una tupla (consultas, segundos de base de datos), sumando todas las
+        conexiones.
+    """
+    count = 0
+    db_time = 0.0
+    for counter in counters:
+        counter.__exit__(None, None, None)
+        count += counter.count
+        db_time += counter.time
+    return count, db_time
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = settings.QUERY_BUDGETS.get(request.resolver_match.url_name)
+        if budget is None:
+            return None
+        request.query_budget = budget
+        request.query_counters = start_counting()
+        return None
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if hasattr(request, 'query_counters'):
+            count, db_time = stop_counting(request.query_counters)
+            request.query_count = count
+            request.query_time = db_time
+            url_name = request.resolver_match.url_name
+            log = logger.warning if count > request.query_budget else logger.debug
+            log(
+                '%s %s (%s): %d queries (budget %d), %.1f ms in database',
+                request.method, request.path, url_name, count,
+                request.query_budget, db_time * 1000,
+            )
+        return response
+
+class QueryBudgetTestMixin:
+    """Mixin para 'TestCase' que verifica que una vista se mantenga dentro de
+    su presupuesto de consultas (QUERY_BUDGETS).
+    """
+
+    @contextmanager
+    def assertWithinQueryBudget(self, url_name, using='default'):
+        budget = settings.QUERY_BUDGETS[url_name]
+        with CaptureQueriesContext(connections[using]) as context:
+            yield
+        self.assertLessEqual(
+            len(context), budget,
+            '%s made %d queries, over its budget of %d:\n%s' % (
+                url_name, len(context), budget,
+                '\n'.join(q['sql'] for q in context.captured_queries),
+            )
+        )
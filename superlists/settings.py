@@ -46,6 +46,10 @@ AUTH_USER_MODEL = 'accounts.User'
 AUTHENTICATION_BACKENDS = ['accounts.authentication.PasswordlessAuthenticationBackend']
 
 MIDDLEWARE = [
+    'superlists.metrics.MetricsMiddleware',
+    'superlists.profiling.ProfilingMiddleware',
+    'superlists.querybudget.QueryBudgetMiddleware',
+    'superlists.db_router.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,23 +61,67 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'superlists.urls'
 
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
+# Motor de templates de las paginas: 'django' o 'jinja2'. Las versiones
+# Jinja2 de los templates estan en <app>/jinja2/; los templates que no
+# tienen version Jinja2 se siguen renderizando con el motor de Django.
+TEMPLATE_ENGINE = os.environ.get('SUPERLISTS_TEMPLATE_ENGINE', 'django')
+# Compilar cada template una sola vez por proceso, en vez de leerlo y
+# compilarlo en cada render. Activo por omision cuando DEBUG esta apagado.
+TEMPLATE_CACHE = os.environ.get(
+    'SUPERLISTS_TEMPLATE_CACHE', '0' if DEBUG else '1'
+) == '1'
+
+DJANGO_TEMPLATES = {
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': [],
+    'APP_DIRS': True,
+    'OPTIONS': {
+        'context_processors': [
+            'django.template.context_processors.debug',
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
     },
-]
+}
+if TEMPLATE_CACHE:
+    DJANGO_TEMPLATES['APP_DIRS'] = False
+    DJANGO_TEMPLATES['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+JINJA2_TEMPLATES = {
+    'BACKEND': 'django.template.backends.jinja2.Jinja2',
+    'DIRS': [],
+    'APP_DIRS': True,
+    'OPTIONS': {
+        'environment': 'superlists.jinja2.environment',
+        'auto_reload': not TEMPLATE_CACHE,
+        'context_processors': [
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
+    },
+}
+
+# Django usa el primer motor que encuentre el template
+if TEMPLATE_ENGINE == 'jinja2':
+    TEMPLATES = [JINJA2_TEMPLATES, DJANGO_TEMPLATES]
+else:
+    TEMPLATES = [DJANGO_TEMPLATES, JINJA2_TEMPLATES]
 
 WSGI_APPLICATION = 'superlists.wsgi.application'
+# Calentar el proceso WSGI antes de crear los workers (ver superlists.warmup)
+WSGI_WARMUP = os.environ.get('SUPERLISTS_WSGI_WARMUP', '1') == '1'
+# Cantidad de workers del servidor WSGI (gunicorn la toma de WEB_CONCURRENCY).
+# Los componentes que guardan estado por proceso la usan para negarse a
+# funcionar con una configuracion que no se comparte entre workers.
+WSGI_WORKERS = int(os.environ.get(
+    'SUPERLISTS_WORKERS', os.environ.get('WEB_CONCURRENCY', '1')
+))
 
 
 # Database
@@ -86,6 +134,135 @@ DATABASES = {
     }
 }
 
+# Replicas de solo lectura, separadas por ':' en SUPERLISTS_REPLICA_DBS (p. ej.
+# archivos SQLite copiados de la principal). Ver superlists.db_router.
+for n, name in enumerate(filter(None, os.environ.get('SUPERLISTS_REPLICA_DBS', '').split(':'))):
+    DATABASES['replica%d' % n] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Modo de produccion de SQLite (ver superlists.backends.sqlite3): WAL,
+# synchronous=NORMAL, mmap, busy timeout y mas cache de paginas.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,           # milisegundos
+    'cache_size': -64 * 1024,       # negativo: en KiB
+    'temp_store': 'MEMORY',
+}
+
+if os.environ.get('SUPERLISTS_SQLITE_PRODUCTION') == '1':
+    for database in DATABASES.values():
+        database['ENGINE'] = 'superlists.backends.sqlite3'
+        database['OPTIONS'] = {'timeout': 5, 'pragmas': SQLITE_PRAGMAS}
+
+# Segundos que un worker reutiliza su conexion a la principal
+# (SUPERLISTS_CONN_MAX_AGE) o a las replicas (SUPERLISTS_REPLICA_CONN_MAX_AGE)
+# entre peticiones. Por defecto 0, como en Django: una conexion por peticion,
+# y superlists.warmup no abre conexiones por adelantado en los workers.
+for alias, database in DATABASES.items():
+    variable = (
+        'SUPERLISTS_CONN_MAX_AGE' if alias == 'default'
+        else 'SUPERLISTS_REPLICA_CONN_MAX_AGE'
+    )
+    if variable in os.environ:
+        database['CONN_MAX_AGE'] = int(os.environ[variable])
+
+# Reintentos de escrituras con la base de datos bloqueada (ver
+# superlists.dbretry)
+DB_BUSY_RETRIES = 5
+DB_BUSY_RETRY_DELAY = 0.05          # segundos, se duplica en cada reintento
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['superlists.db_router.PrimaryReplicaRouter']
+# Segundos que un cliente lee de la principal luego de escribir
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+#
+# SUPERLISTS_SESSION_CACHE elige donde se guardan las sesiones:
+#   'locmem': memoria del proceso, para un solo nodo con un solo proceso
+#             (accounts.sessions la rechaza si WSGI_WORKERS > 1)
+#   'file': directorio compartido por todos los procesos del nodo
+#   'shm': como 'file', pero en memoria compartida (/dev/shm)
+
+#
+# Las modificaciones pendientes de una sesion solo estan en la cache: si la
+# cache descartara la sesion para hacer espacio (por defecto pasadas las 300
+# entradas) se perderian. El limite se fija muy por encima de las sesiones
+# activas esperadas; las sesiones expiradas salen de la cache solas.
+SESSION_CACHE_MAX_ENTRIES = int(
+    os.environ.get('SUPERLISTS_SESSION_CACHE_MAX_ENTRIES', 1000000)
+)
+SESSION_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'superlists-sessions',
+        'OPTIONS': {'MAX_ENTRIES': SESSION_CACHE_MAX_ENTRIES},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.abspath(os.path.join(BASE_DIR, '../cache/sessions')),
+        'OPTIONS': {'MAX_ENTRIES': SESSION_CACHE_MAX_ENTRIES},
+    },
+    'shm': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/dev/shm/superlists-sessions',
+        'OPTIONS': {'MAX_ENTRIES': SESSION_CACHE_MAX_ENTRIES},
+    },
+}
+
+FRAGMENT_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'superlists-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.abspath(os.path.join(BASE_DIR, '../cache/fragments')),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': SESSION_CACHE_BACKENDS[
+        os.environ.get('SUPERLISTS_SESSION_CACHE', 'locmem')
+    ],
+    'fragments': FRAGMENT_CACHE_BACKENDS[
+        os.environ.get('SUPERLISTS_FRAGMENT_CACHE', 'locmem')
+    ],
+}
+
+# Cache de fragmentos de templates (ver superlists.fragments). El backend
+# 'file' lo comparten todos los procesos de la maquina.
+FRAGMENT_CACHE_ALIAS = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60   # segundos
+# Tiempo maximo que un proceso mantiene el candado mientras renderiza un
+# fragmento, y cuanto esperan los demas a que termine.
+FRAGMENT_CACHE_LOCK_TIMEOUT = 10
+FRAGMENT_CACHE_LOCK_WAIT = 2
+FRAGMENT_CACHE_POLL_INTERVAL = 0.02
+
+
+# Sessions
+# https://docs.djangoproject.com/en/1.11/topics/http/sessions/
+
+SESSION_ENGINE = 'accounts.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+# Escritura diferida de sesiones a la base de datos (ver accounts.sessions).
+# Con INTERVAL None no hay hilo que guarde las pendientes cada cierto tiempo.
+SESSION_WRITE_BEHIND_BATCH = 100
+SESSION_WRITE_BEHIND_INTERVAL = 5   # segundos
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -125,6 +302,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.abspath(os.path.join(BASE_DIR, '../static'))
+# Nombres con hash de contenido y variantes .gz, y .br si el paquete opcional
+# 'brotli' esta instalado (ver superlists.staticfiles)
+STATICFILES_STORAGE = 'superlists.staticfiles.CompressedManifestStaticFilesStorage'
+# Servir STATIC_ROOT desde la aplicacion WSGI (ver superlists.wsgi)
+SERVE_STATIC = os.environ.get('SUPERLISTS_SERVE_STATIC') == '1'
 
 # Enviar emails a traves de la app
 LOGGING = {
@@ -140,6 +322,10 @@ LOGGING = {
         'django': {
             'handlers': ['console'],
         },
+        'superlists': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
     },
     'root': {'level': 'INFO'},
 }
@@ -149,3 +335,52 @@ EMAIL_HOST_USER = 'idmconejeros@gmail.com'
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASSWORD')
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
+
+# Maximo de consultas SQL por vista, por nombre de url (ver
+# superlists.querybudget). Las vistas que piden el usuario de la sesion
+# cuentan la consulta que hacen con la cache de usuarios vacia (ver
+# accounts.authentication).
+QUERY_BUDGETS = {
+    'home': 2,
+    # Agregar un item repetido: SAVEPOINT, MAX(position), INSERT fallido,
+    # ROLLBACK, RELEASE, la confirmacion del repetido y la pagina con el
+    # error
+    'view_list': 8,
+    'new_list': 7,
+    'my_lists': 4,
+    'search_items': 3,
+    'send_login_email': 4,
+    # La sesion nueva se inserta en su propia transaccion (un savepoint
+    # dentro de la transaccion de cada test) y el usuario autenticado se
+    # guarda de inmediato, sin esperar al guardado diferido
+    'login': 8,
+}
+
+# Perfilado de peticiones (ver superlists.profiling)
+PROFILING_SAMPLE_RATE = float(os.environ.get('SUPERLISTS_PROFILING_SAMPLE_RATE', 0))
+PROFILING_TOKEN_MAX_AGE = 60 * 60   # segundos
+PROFILING_DIR = os.path.abspath(os.path.join(BASE_DIR, '../profiles'))
+PROFILING_MAX_FILES = 100           # por vista
+
+# Metricas (ver superlists.metrics). Sin METRICS_DIR cada proceso expone
+# solo sus propias metricas.
+METRICS_DIR = os.environ.get('SUPERLISTS_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1   # segundos
+# Token que el scraper envia en 'Authorization: Bearer <token>'. Sin token,
+# /metrics no esta disponible. No se filtra por IP: detras de un proxy en la
+# misma maquina todas las peticiones vienen de 127.0.0.1.
+METRICS_TOKEN = os.environ.get('SUPERLISTS_METRICS_TOKEN')
+
+# Cola de salida de emails (ver accounts.outbox)
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 30   # segundos, se duplica en cada reintento
+# Segundos que un envio se reserva los emails de su lote. Si el proceso muere
+# a medio lote, pasado este tiempo otro envio los vuelve a tomar.
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 300
+
+# Segundos que dura vigente un link de login
+LOGIN_TOKEN_TTL = 60 * 60
+
+# Cache de usuarios por proceso (ver accounts.authentication.UserCache)
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60
@@ -0,0 +1,187 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Archivos estaticos con nombres con hash de contenido y variantes
+# precomprimidas (gzip y, si esta instalado el paquete 'brotli', brotli).
+#
+# Las variantes .br son opcionales: 'brotli' no esta en requirements.txt y,
+# si no se instala aparte ('pip install brotli') antes de 'collectstatic',
+# solo se escriben las variantes .gz.
+#
+# 'collectstatic' escribe los archivos con hash, el manifiesto y las
+# variantes comprimidas en STATIC_ROOT; el tag {% static %} usa el
+# manifiesto para referenciar los nombres con hash. 'PrecompressedStaticFiles'
+# sirve esos archivos desde la aplicacion WSGI.
+
+import gzip
+import io
+import json
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.html', '.txt', '.json', '.eot', '.ttf',
+)
+
+# Variantes en orden de preferencia: (Content-Encoding, extension)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def gzip_compress(data):
+    buf = io.BytesIO()
+    # mtime=0 para que el resultado no cambie entre ejecuciones
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return buf.getvalue()
+
+def compressed_variants(data):
+    """Genera las variantes comprimidas de 'data' que resultan mas pequeñas
+    que el original.
+
+    Yields:
+        Tuplas (extension, datos comprimidos).
+    """
+    variants = [('.gz', gzip_compress(data))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for extension, compressed in variants:
+        if len(compressed) < len(data):
+            yield extension, compressed
+
+def accepted_encodings(header):
+    """Interpreta una cabecera Accept-Encoding.
+
+    Args:
+        header: valor de la cabecera, por ejemplo 'gzip;q=1.0, br;q=0'
+
+    Returns:
+        Un diccionario de codificacion (en minusculas, incluido '*') a su
+        valor q. Un q invalido cuenta como 0.
+    """
+    codings = {}
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+def is_accepted(encoding, codings):
+    """Indica si 'encoding' es aceptable segun 'codings' (ver
+    'accepted_encodings'); '*' vale para las que no se nombran.
+    """
+    return codings.get(encoding, codings.get('*', 0)) > 0
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Storage de 'collectstatic' que ademas de los nombres con hash escribe
+    variantes .gz (y .br, si 'brotli' esta instalado) de cada archivo
+    comprimible.
+    """
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        for hashed_name in self.hashed_files.values():
+            if not hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            with self.open(hashed_name) as f:
+                data = f.read()
+            for extension, compressed in compressed_variants(data):
+                with open(self.path(hashed_name) + extension, 'wb') as f:
+                    f.write(compressed)
+
+class PrecompressedStaticFiles:
+    """Middleware WSGI que sirve los archivos de STATIC_ROOT, eligiendo la
+    variante precomprimida que acepte el cliente.
+
+    Los archivos con hash de contenido (los del manifiesto) se sirven con
+    cabeceras de cache a largo plazo; el resto con 'max_age' corto.
+
+    Args:
+        application: aplicacion WSGI a la que se pasan las demas peticiones
+        max_age: segundos de cache para archivos sin hash
+    """
+    FOREVER = 365 * 24 * 60 * 60
+
+    def __init__(self, application, max_age=60):
+        self.application = application
+        self.max_age = max_age
+        self.prefix = settings.STATIC_URL
+        self.root = os.path.abspath(settings.STATIC_ROOT)
+        self.immutable = self.load_hashed_names()
+
+    def load_hashed_names(self):
+        manifest_path = os.path.join(
+            self.root, CompressedManifestStaticFilesStorage.manifest_name
+        )
+        try:
+            with open(manifest_path) as f:
+                return set(json.load(f)['paths'].values())
+        except (IOError, ValueError, KeyError):
+            return set()
+
+    def file_path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def __call__(self, environ, start_response):
+        path_info = environ.get('PATH_INFO', '')
+        if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD') or \
+                not path_info.startswith(self.prefix):
+            return self.application(environ, start_response)
+
+        name = path_info[len(self.prefix):]
+        path = self.file_path(name)
+        if path is None:
+            return self.application(environ, start_response)
+
+        content_type, _ = mimetypes.guess_type(path)
+        headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if name in self.immutable:
+            headers.append(
+                ('Cache-Control', 'public, max-age=%d, immutable' % self.FOREVER)
+            )
+        else:
+            headers.append(('Cache-Control', 'public, max-age=%d' % self.max_age))
+
+        codings = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, extension in ENCODINGS:
+            if is_accepted(encoding, codings) and \
+                    os.path.isfile(path + extension):
+                path += extension
+                headers.append(('Content-Encoding', encoding))
+                break
+
+        headers.append(('Content-Length', str(os.path.getsize(path))))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return [b'']
+        f = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(f)
+        with f:
+            return [f.read()]
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del router de replicas
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+import os
+import shutil
+import tempfile
+import time
+
+from accounts.models import Token
+from lists.forms import BulkItemForm
+from lists.models import Item, List
+from superlists import db_router
+from superlists.db_router import (
+    PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware
+)
+
+@override_settings(DATABASE_REPLICAS=['replica0', 'replica1'], REPLICA_PIN_SECONDS=5)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        db_router._state.pinned = db_router._state.wrote = False
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.router.db_for_read(List), ['replica0', 'replica1'])
+        self.assertIn(self.router.db_for_read(Token), ['replica0', 'replica1'])
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(List), 'default')
+
+    def test_reads_after_a_write_go_to_primary(self):
+        self.router.db_for_write(List)
+        self.assertEqual(self.router.db_for_read(List), 'default')
+
+    def test_reads_related_to_primary_objects_go_to_primary(self):
+        list_ = List()
+        list_._state.db = 'default'
+        self.assertEqual(
+            self.router.db_for_read(Item, instance=list_), 'default'
+        )
+        list_._state.db = 'replica0'
+        self.assertIn(
+            self.router.db_for_read(Item, instance=list_),
+            ['replica0', 'replica1']
+        )
+
+    def test_other_apps_are_not_routed(self):
+        self.assertIsNone(self.router.db_for_read(Session))
+        self.assertIsNone(self.router.db_for_write(Session))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(List), 'default')
+
+    def test_does_not_migrate_replicas(self):
+        self.assertFalse(self.router.allow_migrate('replica0', 'lists'))
+        self.assertTrue(self.router.allow_migrate('default', 'lists'))
+
+@override_settings(DATABASE_REPLICAS=['replica0'], REPLICA_PIN_SECONDS=5)
+class ReplicaPinningMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def middleware(self, view):
+        return ReplicaPinningMiddleware(view)
+
+    def test_sets_pin_cookie_after_a_write(self):
+        def view(request):
+            self.router.db_for_write(List)
+            return HttpResponse()
+
+        response = self.middleware(view)(self.factory.post('/lists/1/'))
+        pinned_until = float(response.cookies[PIN_COOKIE].value)
+        self.assertAlmostEqual(pinned_until, time.time() + 5, delta=1)
+
+    def test_does_not_set_pin_cookie_without_writes(self):
+        response = self.middleware(lambda request: HttpResponse())(
+            self.factory.get('/lists/1/')
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        def view(request):
+            return HttpResponse(self.router.db_for_read(List))
+
+        request = self.factory.get('/lists/1/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() + 5)
+        response = self.middleware(view)(request)
+        self.assertEqual(response.content, b'default')
+
+    def test_expired_pin_reads_from_replica(self):
+        def view(request):
+            return HttpResponse(self.router.db_for_read(List))
+
+        request = self.factory.get('/lists/1/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        response = self.middleware(view)(request)
+        self.assertEqual(response.content, b'replica0')
+
+    def test_pin_does_not_leak_to_next_request(self):
+        def writing_view(request):
+            self.router.db_for_write(List)
+            return HttpResponse()
+
+        def reading_view(request):
+            return HttpResponse(self.router.db_for_read(List))
+
+        self.middleware(writing_view)(self.factory.post('/lists/1/'))
+        response = self.middleware(reading_view)(self.factory.get('/lists/1/'))
+        self.assertEqual(response.content, b'replica0')
+
+REPLICA = 'replica_test'
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaReadAfterWriteTest(TestCase):
+    """Con una replica real (otro archivo SQLite, fuera de TEST.MIRROR) que
+    no recibe las escrituras: lo que se lee para escribir, y lo que se lee
+    despues de escribir, sale de la principal
+    """
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.databases[REPLICA] = dict(
+            connections['default'].settings_dict,
+            NAME=os.path.join(directory, 'replica.sqlite3'),
+        )
+        self.addCleanup(self.remove_replica)
+        with connections[REPLICA].schema_editor() as editor:
+            for model in (get_user_model(), List, Item):
+                editor.create_model(model)
+
+        self.list_ = List.create_new('first')
+        self.unpin()
+        self.addCleanup(self.unpin)
+
+    def remove_replica(self):
+        connections[REPLICA].close()
+        delattr(connections._connections, REPLICA)
+        del connections.databases[REPLICA]
+
+    def unpin(self):
+        db_router._state.pinned = db_router._state.wrote = False
+
+    def test_reads_without_writes_go_to_the_replica(self):
+        self.assertFalse(List.objects.filter(pk=self.list_.pk).exists())
+
+    def test_new_item_position_is_read_from_primary(self):
+        # Como ModelForm.save: sin 'using', la posicion se calcula antes de
+        # que Model.save elija la base de datos
+        Item(list=self.list_, text='second').save()
+        self.assertEqual(
+            list(self.list_.item_set.values_list('text', 'position')),
+            [('first', Item.POSITION_GAP), ('second', 2 * Item.POSITION_GAP)]
+        )
+
+    def test_bulk_add_checks_duplicates_on_primary(self):
+        form = BulkItemForm(
+            for_list=self.list_, data={'texts': 'first\nsecond'}
+        )
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            results = form.save()
+        self.assertEqual(
+            [r['status'] for r in results], ['duplicate', 'added']
+        )
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_read_after_a_write_sees_the_write(self):
+        Item(list=self.list_, text='second').save()
+        self.assertEqual(List.objects.get(pk=self.list_.pk).item_count, 2)
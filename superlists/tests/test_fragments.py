@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del cache de fragmentos
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+import threading
+
+from superlists.fragments import fragment_key, get_or_render
+
+@override_settings(
+    FRAGMENT_CACHE_LOCK_WAIT=0.5, FRAGMENT_CACHE_POLL_INTERVAL=0.01
+)
+class FragmentCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['fragments']
+        self.cache.clear()
+        self.calls = 0
+
+    def render(self):
+        self.calls += 1
+        return '<p>%d</p>' % self.calls
+
+    def test_key_changes_with_version(self):
+        self.assertNotEqual(fragment_key('t', 1, 2), fragment_key('t', 1, 3))
+        self.assertEqual(fragment_key('t', 1, 2), fragment_key('t', 1, 2))
+
+    def test_renders_once_per_version(self):
+        key = fragment_key('t', 1)
+        self.assertEqual(get_or_render(key, self.render), '<p>1</p>')
+        self.assertEqual(get_or_render(key, self.render), '<p>1</p>')
+        self.assertEqual(self.calls, 1)
+
+    def test_new_version_is_rendered_again(self):
+        get_or_render(fragment_key('t', 1), self.render)
+        html = get_or_render(fragment_key('t', 2), self.render)
+        self.assertEqual(html, '<p>2</p>')
+
+    def test_result_is_safe_html(self):
+        html = get_or_render(fragment_key('t', 1), self.render)
+        self.assertTrue(hasattr(html, '__html__'))
+
+    def test_releases_lock_when_render_fails(self):
+        key = fragment_key('t', 1)
+        def fail():
+            raise ValueError
+        with self.assertRaises(ValueError):
+            get_or_render(key, fail)
+        self.assertEqual(get_or_render(key, self.render), '<p>1</p>')
+
+    def test_waits_for_the_renderer_holding_the_lock(self):
+        key = fragment_key('t', 1)
+        self.cache.add(key + ':lock', 1)
+        timer = threading.Timer(0.05, self.cache.set, (key, '<p>other</p>'))
+        timer.start()
+        try:
+            html = get_or_render(key, self.render)
+        finally:
+            timer.join()
+        self.assertEqual(html, '<p>other</p>')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(FRAGMENT_CACHE_LOCK_WAIT=0.05)
+    def test_renders_itself_if_the_lock_holder_takes_too_long(self):
+        key = fragment_key('t', 1)
+        self.cache.add(key + ':lock', 1)
+        self.assertEqual(get_or_render(key, self.render), '<p>1</p>')
+
+    def test_concurrent_misses_render_once(self):
+        key = fragment_key('t', 1)
+        def slow_render():
+            threading.Event().wait(0.05)
+            return self.render()
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_render(key, slow_render))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['<p>1</p>'] * 5)
+        self.assertEqual(self.calls, 1)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests de los templates Jinja2
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.template import engines
+from django.test import TestCase, override_settings
+
+from lists.models import Item, List
+
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+User = get_user_model()
+
+JINJA2_FIRST = [settings.JINJA2_TEMPLATES, settings.DJANGO_TEMPLATES]
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class EnvironmentTest(TestCase):
+    def test_url_reverses_named_urls(self):
+        template = engines['jinja2'].from_string("{{ url('view_list', 3) }}")
+        self.assertEqual(template.render(), '/lists/3/')
+
+    def test_static_uses_static_url(self):
+        template = engines['jinja2'].from_string("{{ static('base.css') }}")
+        self.assertEqual(template.render(), settings.STATIC_URL + 'base.css')
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+@override_settings(TEMPLATES=JINJA2_FIRST)
+class Jinja2PagesTest(TestCase):
+    def test_home_page_has_item_form(self):
+        response = self.client.get('/')
+        self.assertContains(response, 'id="id_text"')
+        self.assertContains(response, 'action="/lists/new"')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_list_page_shows_items(self):
+        list_ = List.objects.create()
+        Item.objects.create(list=list_, text='first <item>')
+        Item.objects.create(list=list_, text='second item')
+
+        response = self.client.get('/lists/%d/' % list_.id)
+
+        self.assertContains(response, 'id="id_list_table"')
+        self.assertContains(response, '<td class="item-counter">2</td>')
+        self.assertContains(response, 'first &lt;item&gt;')
+        self.assertContains(response, 'action="/lists/%d/"' % list_.id)
+
+    def test_my_lists_page_shows_lists_and_import_form_to_owner(self):
+        user = User.objects.create(email='a@b.com')
+        list_ = List.objects.create(owner=user)
+        Item.objects.create(list=list_, text='my item')
+        self.client.force_login(user)
+
+        response = self.client.get('/lists/users/a@b.com/')
+
+        self.assertContains(response, 'Logeado como a@b.com')
+        self.assertContains(response, 'href="/lists/%d/">my item' % list_.id)
+        self.assertContains(response, 'id="id_import_file"')
+        self.assertContains(response, 'action="/lists/users/a@b.com/search"')
+
+    def test_pages_without_jinja2_version_use_django_templates(self):
+        user = User.objects.create(email='a@b.com')
+        response = self.client.get('/lists/users/a@b.com/search?q=x')
+        self.assertTemplateUsed(response, 'search.html')
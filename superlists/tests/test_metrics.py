@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests de las metricas
+
+from django.test import TestCase, override_settings
+import json
+import os
+import shutil
+import tempfile
+import unittest.mock
+
+from accounts.authentication import get_user_cache
+from accounts.models import Token
+from accounts.outbox import enqueue_mail, send_queued
+from superlists import metrics
+from superlists.metrics import Registry, render_text
+
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        patcher = unittest.mock.patch.object(metrics, 'registry', Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ('inc', 'observe'):
+            patcher = unittest.mock.patch.object(
+                metrics, name, getattr(self.registry, name)
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        return self.registry.counters.get(key, 0)
+
+class RegistryTest(unittest.TestCase):
+    def test_counts_by_labels(self):
+        registry = Registry()
+        registry.inc('requests', view='home')
+        registry.inc('requests', view='home')
+        registry.inc('requests', view='my_lists')
+        self.assertEqual(registry.counters[('requests', (('view', 'home'),))], 2)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        registry.observe('latency', 0.3, buckets=(0.1, 0.5, 1))
+        registry.observe('latency', 0.05, buckets=(0.1, 0.5, 1))
+        histogram = registry.histograms[('latency', ())]
+        self.assertEqual(histogram['counts'], [1, 2, 2])
+        self.assertEqual(histogram['count'], 2)
+
+    @unittest.mock.patch('superlists.metrics.os.getpid')
+    def test_forked_process_starts_empty(self, getpid_m):
+        getpid_m.return_value = 1
+        registry = Registry()
+        registry.inc('requests')
+        getpid_m.return_value = 2
+        registry.inc('requests')
+        self.assertEqual(registry.counters[('requests', ())], 1)
+
+class MultiProcessMetricsTest(MetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_other_process(self, pid, counters, process_id='other'):
+        path = os.path.join(
+            self.metrics_dir, 'metrics-%d-%s.json' % (pid, process_id)
+        )
+        with open(path, 'w') as f:
+            json.dump({'counters': counters, 'histograms': []}, f)
+
+    def test_sums_counters_of_all_processes(self):
+        self.registry.inc('logins_total', result='success')
+        self.write_other_process(os.getppid(), [['logins_total', {'result': 'success'}, 2]])
+        self.assertIn('logins_total{result="success"} 3', render_text())
+
+    def test_flush_writes_process_file(self):
+        self.registry.inc('logins_total', result='success')
+        self.registry.flush()
+        self.assertEqual(os.listdir(self.metrics_dir), [
+            'metrics-%d-%s.json' % (os.getpid(), self.registry.process_id)
+        ])
+
+    @unittest.mock.patch('superlists.metrics.os.getpid', return_value=4242)
+    def test_reused_pid_does_not_overwrite_another_process_file(self, getpid_m):
+        Registry().flush()
+        Registry().flush()
+        self.assertEqual(len(os.listdir(self.metrics_dir)), 2)
+
+    def test_retire_moves_counters_to_the_archive(self):
+        self.registry.inc('logins_total', result='success')
+        self.registry.retire()
+        self.write_other_process(os.getppid(), [['logins_total', {'result': 'success'}, 2]])
+        other = Registry()
+        other.retire()
+
+        self.assertNotIn(
+            os.path.basename(self.registry.path()), os.listdir(self.metrics_dir)
+        )
+        self.assertIn(metrics.ARCHIVE_FILE, os.listdir(self.metrics_dir))
+        self.registry._reset()
+        self.assertIn('logins_total{result="success"} 3', render_text())
+
+    @unittest.mock.patch('superlists.metrics._alive', return_value=False)
+    def test_files_of_killed_processes_are_archived(self, alive_m):
+        self.write_other_process(99999, [['logins_total', {'result': 'success'}, 2]])
+        self.assertIn('logins_total{result="success"} 2', render_text())
+        self.assertNotIn('metrics-99999-other.json', os.listdir(self.metrics_dir))
+        # Sumado una sola vez, aunque se vuelva a leer
+        self.assertIn('logins_total{result="success"} 2', render_text())
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+@override_settings(METRICS_TOKEN='s3cret')
+class MetricsEndpointTest(MetricsTestCase):
+    def get_metrics(self, authorization='Bearer s3cret', **extra):
+        return self.client.get(
+            '/metrics', HTTP_AUTHORIZATION=authorization, **extra
+        )
+
+    def test_serves_text_format(self):
+        self.client.get('/')
+        response = self.get_metrics()
+        self.assertEqual(response['Content-Type'].split(';')[0], 'text/plain')
+        text = response.content.decode()
+        self.assertIn('# TYPE http_requests_total counter', text)
+        self.assertIn('http_requests_total{status="200",view="home"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="home",le="+Inf"} 1', text)
+
+    def test_requires_the_token(self):
+        self.assertEqual(self.get_metrics('Bearer wrong').status_code, 404)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_local_address_is_not_enough(self):
+        # Detras de un proxy local todas las peticiones vienen de 127.0.0.1
+        response = self.get_metrics('', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_is_disabled_without_a_token(self):
+        self.assertEqual(self.get_metrics('Bearer ').status_code, 404)
+
+class ApplicationMetricsTest(MetricsTestCase):
+    def test_counts_queries_per_view(self):
+        self.client.post('/lists/new', data={'text': 'item'})
+        self.assertGreater(self.counter('db_queries_total', view='new_list'), 0)
+
+    @override_settings(QUERY_BUDGETS={})
+    def test_counts_queries_of_views_without_a_budget(self):
+        self.client.post('/lists/new', data={'text': 'item'})
+        self.assertGreater(self.counter('db_queries_total', view='new_list'), 0)
+
+    def test_counts_queries_with_the_budget_counter_active(self):
+        # El contador de QueryBudgetMiddleware se anida dentro del de las
+        # metricas: ambos ven las mismas consultas
+        response = self.client.post('/lists/new', data={'text': 'item'})
+        self.assertEqual(
+            self.counter('db_queries_total', view='new_list'),
+            response.wsgi_request.query_count,
+        )
+
+    def test_counts_login_results(self):
+        token = Token.objects.create(email='edith@example.com')
+        self.client.get('/accounts/login?token=%s' % token.uid)
+        self.client.get('/accounts/login?token=%s' % token.uid)
+        self.assertEqual(self.counter('logins_total', result='success'), 1)
+        self.assertEqual(self.counter('logins_total', result='failure'), 1)
+
+    def test_counts_sent_emails(self):
+        enqueue_mail('subject', 'body', 'noreply@superlists', ['a@b.com'])
+        send_queued()
+        self.assertEqual(self.counter('emails_total', result='sent'), 1)
+        self.assertIn(('email_send_duration_seconds', ()), self.registry.histograms)
+
+    def test_counts_user_cache_hits_and_misses(self):
+        get_user_cache().get('nobody@example.com')
+        self.assertEqual(self.counter('user_cache_requests_total', result='miss'), 1)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del perfilado de peticiones
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from io import StringIO
+import functools
+import os
+import shutil
+import tempfile
+
+from lists import views
+from lists.models import List
+from superlists.profiling import make_profile_token, view_name
+
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.profiling_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiling_dir)
+        settings_override = override_settings(
+            PROFILING_DIR=self.profiling_dir, PROFILING_SAMPLE_RATE=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.list_ = List.create_new('first item')
+
+    def dumps(self, view='lists.views.view_list'):
+        directory = os.path.join(self.profiling_dir, view)
+        if not os.path.isdir(directory):
+            return []
+        return os.listdir(directory)
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ProfilingMiddlewareTest(ProfilingTestCase):
+    def test_does_not_profile_by_default(self):
+        self.client.get('/lists/%d/' % self.list_.id)
+        self.assertEqual(self.dumps(), [])
+
+    def test_profiles_sampled_requests_per_view(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1):
+            self.client.get('/lists/%d/' % self.list_.id)
+        self.assertEqual(len(self.dumps()), 1)
+
+    def test_profiles_requests_with_signed_token(self):
+        self.client.get(
+            '/lists/%d/' % self.list_.id,
+            HTTP_X_PROFILE_TOKEN=make_profile_token()
+        )
+        self.assertEqual(len(self.dumps()), 1)
+
+    def test_ignores_invalid_token(self):
+        self.client.get(
+            '/lists/%d/' % self.list_.id, HTTP_X_PROFILE_TOKEN='profile:forged'
+        )
+        self.assertEqual(self.dumps(), [])
+
+    def test_keeps_only_most_recent_dumps(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1, PROFILING_MAX_FILES=2):
+            for _ in range(3):
+                self.client.get('/lists/%d/' % self.list_.id)
+        self.assertEqual(len(self.dumps()), 2)
+
+    def test_names_views_by_module_and_qualified_name(self):
+        self.assertEqual(view_name(views.view_list), 'lists.views.view_list')
+        self.assertEqual(
+            view_name(functools.partial(views.view_list)), 'functools.partial'
+        )
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class ProfileReportCommandTest(ProfilingTestCase):
+    def test_reports_hot_functions_per_view(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1):
+            self.client.get('/lists/%d/' % self.list_.id)
+            self.client.get('/')
+
+        out = StringIO()
+        call_command('profile_report', top=5, stdout=out)
+
+        self.assertIn('=== lists.views.view_list (1 requests) ===', out.getvalue())
+        self.assertIn('=== lists.views.home_page (1 requests) ===', out.getvalue())
+        self.assertIn('view_list', out.getvalue())
+
+    def test_reports_when_there_are_no_profiles(self):
+        out = StringIO()
+        call_command('profile_report', stdout=out)
+        self.assertIn('No profiles found', out.getvalue())
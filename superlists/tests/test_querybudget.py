@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del presupuesto de consultas por vista
+
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+
+from lists.models import List
+from superlists.querybudget import QueryBudgetTestMixin, QueryCounter
+
+# Los tests corren sin DEBUG y sin el manifiesto de 'collectstatic': los
+# archivos estaticos se referencian sin hash
+STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class QueryBudgetMiddlewareTest(TestCase):
+    def test_records_query_count_for_budgeted_views(self):
+        list_ = List.objects.create()
+        response = self.client.get('/lists/%d/' % list_.id)
+        self.assertGreater(response.wsgi_request.query_count, 0)
+        self.assertGreaterEqual(response.wsgi_request.query_time, 0)
+
+    @override_settings(QUERY_BUDGETS={'view_list': 5})
+    def test_does_not_record_views_without_budget(self):
+        response = self.client.get('/')
+        self.assertFalse(hasattr(response.wsgi_request, 'query_count'))
+
+    @override_settings(QUERY_BUDGETS={'view_list': 0})
+    def test_logs_requests_over_budget(self):
+        list_ = List.objects.create()
+        with self.assertLogs('superlists.querybudget', 'WARNING') as logs:
+            self.client.get('/lists/%d/' % list_.id)
+        self.assertIn('budget 0', logs.output[0])
+
+    @override_settings(QUERY_BUDGETS={'view_list': 0})
+    def test_counts_queries_after_the_query_log_wraps(self):
+        list_ = List.objects.create()
+        connection.force_debug_cursor = True
+        self.addCleanup(setattr, connection, 'force_debug_cursor', False)
+        self.addCleanup(connection.queries_log.clear)
+        # La cola ya esta llena: cada consulta nueva descarta la mas antigua
+        for _ in range(connection.queries_log.maxlen):
+            connection.queries_log.append({'sql': '', 'time': '0.000'})
+        with self.assertLogs('superlists.querybudget', 'WARNING') as logs:
+            response = self.client.get('/lists/%d/' % list_.id)
+        self.assertGreater(response.wsgi_request.query_count, 0)
+        self.assertIn(
+            '%d queries' % response.wsgi_request.query_count, logs.output[0]
+        )
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class QueryCounterTest(TestCase):
+    def setUp(self):
+        # La conexion misma, no el proxy 'connection'
+        self.connection = connections['default']
+
+    def test_counts_queries_of_the_connection(self):
+        with QueryCounter(self.connection) as counter:
+            List.objects.count()
+            List.objects.create()
+        self.assertEqual(counter.count, 2)
+        self.assertGreaterEqual(counter.time, 0)
+
+    def test_counters_can_be_nested(self):
+        with QueryCounter(self.connection) as outer:
+            List.objects.count()
+            with QueryCounter(self.connection) as inner:
+                List.objects.count()
+            List.objects.count()
+        List.objects.count()
+        self.assertEqual((outer.count, inner.count), (3, 1))
+
+    def test_counts_around_a_budgeted_view(self):
+        list_ = List.objects.create()
+        with QueryCounter(self.connection) as counter:
+            response = self.client.get('/lists/%d/' % list_.id)
+        self.assertGreaterEqual(
+            counter.count, response.wsgi_request.query_count
+        )
+        self.assertNotIn('make_cursor', self.connection.__dict__)
+
+    def test_stops_counting_on_exit(self):
+        with QueryCounter(self.connection) as counter:
+            pass
+        List.objects.count()
+        self.assertEqual(counter.count, 0)
+
+@override_settings(STATICFILES_STORAGE=STATIC_STORAGE)
+class QueryBudgetTestMixinTest(QueryBudgetTestMixin, TestCase):
+    @override_settings(QUERY_BUDGETS={'view_list': 0})
+    def test_fails_when_view_goes_over_budget(self):
+        list_ = List.objects.create()
+        with self.assertRaises(AssertionError):
+            with self.assertWithinQueryBudget('view_list'):
+                self.client.get('/lists/%d/' % list_.id)
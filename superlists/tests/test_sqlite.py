@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del modo de produccion de SQLite
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, override_settings
+from io import StringIO
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest.mock
+
+from lists.management.commands.sqlite_benchmark import create_schema
+from superlists.backends.sqlite3.base import DatabaseWrapper
+from superlists.dbretry import retry_on_busy
+
+class ProductionSQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = dict(connection.settings_dict)
+        settings_dict.update(
+            ENGINE='superlists.backends.sqlite3',
+            NAME=os.path.join(directory, 'db.sqlite3'),
+            OPTIONS={'timeout': 5, 'pragmas': {
+                'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+                'busy_timeout': 1234,
+            }},
+        )
+        self.wrapper = DatabaseWrapper(settings_dict, alias='production')
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    def test_applies_pragmas_on_new_connections(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+
+    def test_applies_pragmas_after_reconnecting(self):
+        self.pragma('journal_mode')
+        self.wrapper.close()
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+
+@override_settings(DB_BUSY_RETRIES=2, DB_BUSY_RETRY_DELAY=0)
+class RetryOnBusyTest(SimpleTestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def locked_then_ok(self, failures, message='database is locked'):
+        @retry_on_busy
+        def write():
+            self.calls += 1
+            if self.calls <= failures:
+                raise OperationalError(message)
+            return 'saved'
+        return write
+
+    def test_retries_while_database_is_locked(self):
+        self.assertEqual(self.locked_then_ok(2)(), 'saved')
+        self.assertEqual(self.calls, 3)
+
+    def test_gives_up_after_max_retries(self):
+        with self.assertRaises(OperationalError):
+            self.locked_then_ok(3)()
+
+    def test_does_not_retry_other_errors(self):
+        with self.assertRaises(OperationalError):
+            self.locked_then_ok(1, 'no such table: lists_list')()
+        self.assertEqual(self.calls, 1)
+
+    @unittest.mock.patch('superlists.dbretry.connection')
+    def test_does_not_retry_inside_a_transaction(self, connection_m):
+        connection_m.in_atomic_block = True
+        with self.assertRaises(OperationalError):
+            self.locked_then_ok(1)()
+        self.assertEqual(self.calls, 1)
+
+class SQLiteBenchmarkCommandTest(SimpleTestCase):
+    def test_reports_both_modes(self):
+        out = StringIO()
+        call_command(
+            'sqlite_benchmark', writers=2, readers=2, seconds=0.2, stdout=out
+        )
+        self.assertIn('default', out.getvalue())
+        self.assertIn('production', out.getvalue())
+
+    def test_schema_follows_the_models(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        create_schema(path)
+        conn = sqlite3.connect(path)
+        self.addCleanup(conn.close)
+        columns = {
+            row[1] for row in conn.execute('PRAGMA table_info(lists_item)')
+        }
+        indexes = {
+            row[1] for row in conn.execute('PRAGMA index_list(lists_item)')
+        }
+        self.assertIn('position', columns)
+        self.assertIn('lists_item_list_position', indexes)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del pipeline de archivos estaticos
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from io import StringIO
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest.mock
+
+from superlists.staticfiles import (
+    CompressedManifestStaticFilesStorage, PrecompressedStaticFiles,
+    accepted_encodings
+)
+
+MANIFEST_STORAGE = 'superlists.staticfiles.CompressedManifestStaticFilesStorage'
+
+@override_settings(STATICFILES_STORAGE=MANIFEST_STORAGE)
+class CollectStaticTest(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+
+    def collectstatic(self):
+        with override_settings(STATIC_ROOT=self.static_root):
+            call_command('collectstatic', interactive=False, verbosity=0,
+                         stdout=StringIO())
+            return CompressedManifestStaticFilesStorage()
+
+    def test_writes_content_hashed_names_to_manifest(self):
+        storage = self.collectstatic()
+        hashed = storage.stored_name('base.css')
+        self.assertRegex(hashed, r'^base\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.isfile(os.path.join(self.static_root, hashed)))
+
+    def test_writes_gzip_variant_of_hashed_files(self):
+        storage = self.collectstatic()
+        path = os.path.join(self.static_root, storage.stored_name('jquery.min.js'))
+        with open(path, 'rb') as original, gzip.open(path + '.gz') as compressed:
+            self.assertEqual(original.read(), compressed.read())
+
+    def test_writes_brotli_variant_when_brotli_is_installed(self):
+        brotli = unittest.mock.Mock()
+        brotli.compress.return_value = b'compressed'
+        with unittest.mock.patch('superlists.staticfiles.brotli', brotli):
+            storage = self.collectstatic()
+        path = os.path.join(self.static_root, storage.stored_name('jquery.min.js'))
+        with open(path + '.br', 'rb') as f:
+            self.assertEqual(f.read(), b'compressed')
+
+    def test_skips_brotli_variant_without_brotli(self):
+        with unittest.mock.patch('superlists.staticfiles.brotli', None):
+            storage = self.collectstatic()
+        path = os.path.join(self.static_root, storage.stored_name('jquery.min.js'))
+        self.assertTrue(os.path.isfile(path + '.gz'))
+        self.assertFalse(os.path.exists(path + '.br'))
+
+    @override_settings(DEBUG=True)
+    def test_urls_use_plain_names_in_debug_without_manifest(self):
+        with override_settings(STATIC_ROOT=self.static_root):
+            storage = CompressedManifestStaticFilesStorage()
+        self.assertEqual(storage.url('base.css'), '/static/base.css')
+
+@override_settings(STATICFILES_STORAGE=MANIFEST_STORAGE)
+class TemplateStaticReferencesTest(TestCase):
+    def test_base_template_references_static_files_through_manifest(self):
+        with unittest.mock.patch.object(
+            CompressedManifestStaticFilesStorage, 'stored_name',
+            return_value='base.0123456789ab.css'
+        ):
+            response = self.client.get('/')
+        self.assertContains(response, '/static/base.0123456789ab.css')
+
+class AcceptedEncodingsTest(SimpleTestCase):
+    def test_parses_codings_and_q_values(self):
+        self.assertEqual(
+            accepted_encodings('gzip;q=0.5, BR ; q=0,identity, *;q=x'),
+            {'gzip': 0.5, 'br': 0.0, 'identity': 1.0, '*': 0.0}
+        )
+
+    def test_empty_header_accepts_nothing(self):
+        self.assertEqual(accepted_encodings(''), {})
+
+class PrecompressedStaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        self.write('app.0123456789ab.js', b'plain')
+        self.write('app.0123456789ab.js.gz', b'gzipped')
+        self.write('app.js', b'plain')
+        self.write('staticfiles.json', json.dumps({
+            'version': '1.0', 'paths': {'app.js': 'app.0123456789ab.js'}
+        }).encode())
+        self.app = unittest.mock.Mock(return_value=[b'from app'])
+        with override_settings(STATIC_ROOT=self.static_root):
+            self.handler = PrecompressedStaticFiles(self.app)
+
+    def write(self, name, content):
+        with open(os.path.join(self.static_root, name), 'wb') as f:
+            f.write(content)
+
+    def get(self, path, **environ):
+        environ.update(REQUEST_METHOD='GET', PATH_INFO=path)
+        start_response = unittest.mock.Mock()
+        body = b''.join(self.handler(environ, start_response))
+        if not start_response.called:
+            return None, {}, body
+        status, headers = start_response.call_args[0]
+        return status, dict(headers), body
+
+    def test_serves_gzip_variant_when_accepted(self):
+        status, headers, body = self.get(
+            '/static/app.0123456789ab.js', HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertEqual(body, b'gzipped')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+    def test_serves_original_when_encoding_not_accepted(self):
+        status, headers, body = self.get('/static/app.0123456789ab.js')
+        self.assertEqual(body, b'plain')
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_does_not_serve_gzip_variant_refused_with_q_zero(self):
+        status, headers, body = self.get(
+            '/static/app.0123456789ab.js',
+            HTTP_ACCEPT_ENCODING='gzip;q=0, deflate',
+        )
+        self.assertEqual(body, b'plain')
+        self.assertNotIn('Content-Encoding', headers)
+
+    def test_does_not_match_encoding_names_by_substring(self):
+        status, headers, body = self.get(
+            '/static/app.0123456789ab.js', HTTP_ACCEPT_ENCODING='x-gzip-not'
+        )
+        self.assertEqual(body, b'plain')
+
+    def test_serves_gzip_variant_for_wildcard(self):
+        status, headers, body = self.get(
+            '/static/app.0123456789ab.js', HTTP_ACCEPT_ENCODING='br;q=0, *'
+        )
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+
+    def test_hashed_files_are_cached_forever(self):
+        status, headers, body = self.get('/static/app.0123456789ab.js')
+        self.assertIn('immutable', headers['Cache-Control'])
+
+    def test_unhashed_files_get_short_cache(self):
+        status, headers, body = self.get('/static/app.js')
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+
+    def test_passes_other_paths_to_application(self):
+        status, headers, body = self.get('/lists/1/')
+        self.assertEqual(body, b'from app')
+
+    def test_does_not_serve_files_outside_static_root(self):
+        status, headers, body = self.get('/static/../etc/passwd')
+        self.assertEqual(body, b'from app')
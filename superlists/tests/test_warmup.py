@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Tests del calentamiento del proceso WSGI
+
+from django.apps import apps
+from django.db import connection, connections
+from django.template.backends.django import DjangoTemplates
+from django.template import engines
+from django.test import TestCase
+import os
+import shutil
+import tempfile
+import unittest
+
+from superlists import metrics, warmup
+
+class WarmUpTest(TestCase):
+    def test_reports_every_stage(self):
+        report = warmup.warm_up(import_seconds=0.5)
+        self.assertEqual(
+            list(report), ['import', 'views', 'urls', 'templates', 'forms']
+        )
+        self.assertEqual(report['import'], 0.5)
+        self.assertTrue(all(seconds >= 0 for seconds in report.values()))
+
+    def test_closes_connections_before_fork(self):
+        with unittest.mock.patch('superlists.warmup.connections') as connections:
+            warmup.warm_up()
+        connections.close_all.assert_called_once_with()
+
+    def test_compiles_every_app_template(self):
+        lists_templates = os.path.join(
+            os.path.dirname(warmup.__file__), '..', 'lists', 'templates'
+        )
+        with unittest.mock.patch.object(
+            engines['django'], 'get_template', wraps=engines['django'].get_template
+        ) as get_template:
+            warmup.compile_templates()
+        compiled = {call[0][0] for call in get_template.call_args_list}
+        self.assertTrue(set(os.listdir(lists_templates)) <= compiled)
+
+    def test_finds_app_templates_behind_the_cached_loader(self):
+        engine = DjangoTemplates({
+            'NAME': 'cached', 'DIRS': [], 'APP_DIRS': False,
+            'OPTIONS': {'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ]},
+        })
+        dirs = warmup._template_dirs(engine)
+        self.assertIn(
+            os.path.join(apps.get_app_config('lists').path, 'templates'), dirs
+        )
+
+    def test_compiles_jinja2_templates(self):
+        with unittest.mock.patch.object(
+            engines['jinja2'], 'get_template', wraps=engines['jinja2'].get_template
+        ) as get_template:
+            warmup.compile_templates()
+        compiled = {call[0][0] for call in get_template.call_args_list}
+        self.assertIn('list.html', compiled)
+
+    def test_resolves_named_urls(self):
+        self.assertGreaterEqual(warmup.resolve_urls(), 10)
+
+    def test_after_fork_connects_and_records_timings(self):
+        warmup.report.clear()
+        warmup.report['views'] = 0.25
+        metrics.registry._reset()
+
+        with unittest.mock.patch.dict(
+            connections['default'].settings_dict, CONN_MAX_AGE=60
+        ):
+            warmup.after_fork()
+
+        self.assertIsNotNone(connection.connection)
+        stages = {
+            labels['stage']
+            for name, labels, _ in metrics.registry.snapshot()['histograms']
+            if name == 'warmup_duration_seconds'
+        }
+        self.assertEqual(stages, {'views', 'db_connect'})
+
+    def worker_connection(self, conn_max_age):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        worker_connection = connections['default'].__class__(
+            dict(
+                connection.settings_dict,
+                NAME=os.path.join(directory, 'db'), CONN_MAX_AGE=conn_max_age,
+            ),
+            alias='worker',
+        )
+        self.addCleanup(worker_connection.close)
+        with unittest.mock.patch('superlists.warmup.connections') as patched:
+            patched.all.return_value = [worker_connection]
+            warmup.after_fork()
+        return worker_connection
+
+    def test_worker_connection_survives_the_first_request(self):
+        # El handler de request_started cierra las conexiones vencidas; la
+        # que abre after_fork debe llegar a la primera peticion
+        worker_connection = self.worker_connection(conn_max_age=60)
+        worker_connection.close_if_unusable_or_obsolete()
+        self.assertIsNotNone(worker_connection.connection)
+
+    def test_does_not_open_connections_closed_on_every_request(self):
+        worker_connection = self.worker_connection(conn_max_age=0)
+        self.assertIsNone(worker_connection.connection)
@@ -18,9 +18,11 @@ from django.conf.urls import include, url
 import lists.views
 import lists.urls
 import accounts.urls
+import superlists.metrics
 
 urlpatterns = [
     url(r'^$', lists.views.home_page, name='home'),
     url(r'^lists/', include(lists.urls)),
     url(r'^accounts/', include(accounts.urls)),
+    url(r'^metrics$', superlists.metrics.metrics_view, name='metrics'),
 ]
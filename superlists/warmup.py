@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim:fenc=utf-8
+#
+# Calentamiento del proceso WSGI antes de que el servidor cree sus workers.
+#
+# Django inicializa muchas cosas recien en la primera peticion: importa las
+# vistas al resolver la primera url, compila los templates al usarlos por
+# primera vez y abre la conexion a la base de datos en la primera consulta.
+# 'warm_up' hace ese trabajo en el proceso principal, de modo que los workers
+# creados con fork ya lo tengan hecho. 'after_fork' abre las conexiones a la
+# base de datos en cada worker; nunca antes del fork, porque los workers no
+# pueden compartir una conexion. Solo abre las que tienen CONN_MAX_AGE: con
+# 0, Django cierra la conexion al comenzar la primera peticion.
+#
+# superlists.wsgi ejecuta 'warm_up' al importarse si WSGI_WARMUP esta activo,
+# y registra 'after_fork' con os.register_at_fork cuando existe (Python 3.7+).
+# Con gunicorn, en versiones anteriores, se registra en su configuracion:
+#
+#     def post_fork(server, worker):
+#         from superlists import warmup
+#         warmup.after_fork()
+
+from collections import OrderedDict
+import importlib
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.core.urlresolvers import Resolver404, get_resolver, resolve
+from django.db import connections
+from django.template import engines
+
+from superlists import metrics
+
+logger = logging.getLogger(__name__)
+
+# Duracion de cada etapa del ultimo calentamiento, en segundos
+report = OrderedDict()
+
+def import_views():
+    """Importa los modulos 'views' y 'forms' de cada app y la urlconf"""
+    for app_config in apps.get_app_configs():
+        for name in ('views', 'forms'):
+            module = '%s.%s' % (app_config.name, name)
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                if e.name != module:
+                    raise
+    get_resolver().url_patterns
+
+def resolve_urls():
+    """Construye las tablas de reverse de la urlconf y resuelve una url de
+    ejemplo por cada url con nombre. Entrega la cantidad de urls resueltas.
+    """
+    resolver = get_resolver()
+    resolved = 0
+    for name in list(resolver.reverse_dict):
+        if not isinstance(name, str):
+            continue
+        for possibility in resolver.reverse_dict.getlist(name):
+            for path, params in possibility[0]:
+                try:
+                    resolve('/' + path % {param: '1' for param in params})
+                    resolved += 1
+                except Resolver404:
+                    # El valor de ejemplo no calza con la url (p. ej. una
+                    # alternativa fija); sus expresiones igual se compilaron
+                    pass
+    return resolved
+
+def compile_templates():
+    """Compila todos los templates de todos los motores de templates. Con
+    el cargador de templates en cache quedan listos para los workers; sin
+    el, al menos quedan importadas las librerias de tags y filtros.
+    Entrega la cantidad de templates compilados.
+    """
+    compiled = 0
+    for engine in engines.all():
+        for directory in _template_dirs(engine):
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith('.html'):
+                        continue
+                    path = os.path.join(root, filename)
+                    engine.get_template(os.path.relpath(path, directory))
+                    compiled += 1
+    return compiled
+
+def _template_dirs(engine):
+    """Directorios de templates de 'engine', incluidos los de sus cargadores
+    (con el cargador en cache, APP_DIRS esta apagado y los directorios de las
+    apps solo los conoce su cargador)
+    """
+    dirs = list(engine.template_dirs)
+    for loader in getattr(getattr(engine, 'engine', None), 'template_loaders', []):
+        for inner in getattr(loader, 'loaders', [loader]):
+            dirs.extend(d for d in inner.get_dirs() if d not in dirs)
+    return dirs
+
+def render_forms():
+    """Renderiza los formularios de la pagina de inicio, para cargar los
+    templates de los widgets
+    """
+    from lists.forms import ItemForm
+    str(ItemForm())
+
+STAGES = (
+    ('views', import_views),
+    ('urls', resolve_urls),
+    ('templates', compile_templates),
+    ('forms', render_forms),
+)
+
+def warm_up(import_seconds=None):
+    """Ejecuta todas las etapas del calentamiento y registra su duracion.
+
+    Args:
+        import_seconds: si se entrega, duracion de la carga de Django y de
+            la aplicacion WSGI, para incluirla en el reporte
+
+    Returns:
+        Un diccionario ordenado con la duracion de cada etapa.
+    """
+    report.clear()
+    if import_seconds is not None:
+        report['import'] = import_seconds
+    for stage, function in STAGES:
+        start = time.monotonic()
+        function()
+        report[stage] = time.monotonic() - start
+    # Ninguna conexion abierta aqui debe heredarse a los workers
+    connections.close_all()
+
+    logger.info('Warm-up: %s', ', '.join(
+        '%s %.3fs' % (stage, seconds) for stage, seconds in report.items()
+    ))
+    return report
+
+def after_fork():
+    """Abre las conexiones a la base de datos del worker que se reutilizan
+    entre peticiones y registra en sus metricas la duracion del
+    calentamiento del proceso principal.
+    """
+    start = time.monotonic()
+    for connection in connections.all():
+        if connection.settings_dict['CONN_MAX_AGE'] != 0:
+            connection.ensure_connection()
+    seconds = time.monotonic() - start
+
+    for stage, stage_seconds in report.items():
+        metrics.observe('warmup_duration_seconds', stage_seconds, stage=stage)
+    metrics.observe('warmup_duration_seconds', seconds, stage='db_connect')
+    logger.info('Worker %d connected to the database in %.3fs', os.getpid(), seconds)
@@ -8,9 +8,23 @@ https://docs.djangoproject.com/en/1.11/howto/deployment/wsgi/
 """
 
 import os
+import time
 
+_import_start = time.monotonic()
+
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "superlists.settings")
 
 application = get_wsgi_application()
+
+if settings.WSGI_WARMUP:
+    from superlists import warmup
+    warmup.warm_up(import_seconds=time.monotonic() - _import_start)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=warmup.after_fork)
+
+if settings.SERVE_STATIC:
+    from superlists.staticfiles import PrecompressedStaticFiles
+    application = PrecompressedStaticFiles(application)